@@ -0,0 +1,28 @@
+"""Add is_truncated flag to chat_messages
+
+Revision ID: 005_message_truncated
+Revises: 004_add_rag
+Create Date: 2026-10-16 00:00:00.000000
+
+Marks assistant replies that were cut short because the client
+disconnected mid-stream.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '005_message_truncated'
+down_revision = '004_add_rag'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        'chat_messages',
+        sa.Column('is_truncated', sa.Boolean, nullable=False, server_default=sa.false())
+    )
+
+
+def downgrade() -> None:
+    op.drop_column('chat_messages', 'is_truncated')
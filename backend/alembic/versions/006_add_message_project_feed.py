@@ -0,0 +1,54 @@
+"""Denormalize project_id onto chat_messages for the project activity feed
+
+Revision ID: 006_message_project_id
+Revises: 005_message_truncated
+Create Date: 2026-10-16 00:00:00.000000
+
+This migration:
+1. Adds a nullable project_id column to chat_messages
+2. Backfills it from each message's agent
+3. Creates a partial (project_id, created_at DESC) index so recent shared
+   context is a single index range scan
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '006_message_project_id'
+down_revision = '005_message_truncated'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    # 1. Add column
+    op.add_column(
+        'chat_messages',
+        sa.Column(
+            'project_id',
+            postgresql.UUID(as_uuid=True),
+            sa.ForeignKey('projects.id', ondelete='CASCADE'),
+            nullable=True
+        )
+    )
+
+    # 2. Backfill from agents
+    op.execute('''
+        UPDATE chat_messages AS m
+        SET project_id = a.project_id
+        FROM agents AS a
+        WHERE m.agent_id = a.id AND a.project_id IS NOT NULL
+    ''')
+
+    # 3. Feed index
+    op.execute('''
+        CREATE INDEX ix_chat_messages_project_id_created_at
+        ON chat_messages (project_id, created_at DESC)
+        WHERE project_id IS NOT NULL
+    ''')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_messages_project_id_created_at', table_name='chat_messages')
+    op.drop_column('chat_messages', 'project_id')
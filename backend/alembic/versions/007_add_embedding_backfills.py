@@ -0,0 +1,37 @@
+"""Add embedding_backfills checkpoint table
+
+Revision ID: 007_embedding_backfills
+Revises: 006_message_project_id
+Create Date: 2026-10-16 00:00:00.000000
+
+Tracks the resumable job that embeds a project's existing messages when
+the project switches to RAG context.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '007_embedding_backfills'
+down_revision = '006_message_project_id'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'embedding_backfills',
+        sa.Column('project_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('projects.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('status', sa.String(20), nullable=False, server_default='running'),
+        sa.Column('cursor_created_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('cursor_message_id', postgresql.UUID(as_uuid=True), nullable=True),
+        sa.Column('indexed_count', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('error', sa.Text, nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('embedding_backfills')
@@ -0,0 +1,45 @@
+"""Replace the IVFFlat embedding index with HNSW
+
+Revision ID: 008_hnsw_embedding_index
+Revises: 007_embedding_backfills
+Create Date: 2026-10-16 00:00:00.000000
+
+The IVFFlat index from 004_add_rag was built with lists = 100 on an empty
+table, so its centroids are meaningless and recall degrades as data grows.
+HNSW needs no training data and keeps recall stable as rows are added.
+
+Build parameters come from settings (VECTOR_HNSW_M,
+VECTOR_HNSW_EF_CONSTRUCTION). The index is built CONCURRENTLY so writes
+continue during the build. Requires pgvector >= 0.5.0.
+"""
+from alembic import op
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision = '008_hnsw_embedding_index'
+down_revision = '007_embedding_backfills'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute(f'''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_message_embeddings_embedding_hnsw
+            ON message_embeddings
+            USING hnsw (embedding vector_cosine_ops)
+            WITH (m = {int(settings.VECTOR_HNSW_M)}, ef_construction = {int(settings.VECTOR_HNSW_EF_CONSTRUCTION)})
+        ''')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_message_embeddings_embedding')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute('''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_message_embeddings_embedding
+            ON message_embeddings
+            USING ivfflat (embedding vector_cosine_ops)
+            WITH (lists = 100)
+        ''')
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_message_embeddings_embedding_hnsw')
@@ -0,0 +1,104 @@
+"""Re-encode message embeddings to the configured dimensions / precision
+
+Revision ID: 009_compact_embeddings
+Revises: 008_hnsw_embedding_index
+Create Date: 2026-10-16 00:00:00.000000
+
+Converts message_embeddings.embedding to vector(EMBEDDING_DIMENSION), or
+halfvec(EMBEDDING_DIMENSION) when EMBEDDING_HALF_PRECISION is set. This is
+a no-op when the column already has that type.
+
+Rows are re-encoded into a new column in batches of
+EMBEDDING_REENCODE_BATCH_SIZE, one transaction per batch, then the columns
+are swapped and the HNSW index is rebuilt with the matching operator class.
+Shorter vectors are the leading components re-normalized to unit length.
+For text-embedding-3 models this is what the API returns for the same
+`dimensions` value. Older models need re-embedding instead.
+
+Run it with the embedding indexer stopped (or the workers already on the new
+settings). Rows that fail to index in the meantime are picked up by the
+embedding backfill. Requires pgvector >= 0.7.0 (halfvec, subvector,
+l2_normalize).
+"""
+import re
+
+from alembic import op
+from sqlalchemy import text
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision = '009_compact_embeddings'
+down_revision = '008_hnsw_embedding_index'
+branch_labels = None
+depends_on = None
+
+INDEX_NAME = 'ix_message_embeddings_embedding_hnsw'
+
+
+def _current_type(bind):
+    """('vector' | 'halfvec', dimensions) of message_embeddings.embedding"""
+    column_type = bind.execute(text('''
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = 'message_embeddings'::regclass AND attname = 'embedding'
+    ''')).scalar_one()
+    match = re.fullmatch(r'(vector|halfvec)\((\d+)\)', column_type)
+    if match is None:
+        raise RuntimeError(f'Unexpected embedding column type: {column_type}')
+    return match.group(1), int(match.group(2))
+
+
+def _reencode(kind: str, dimensions: int) -> None:
+    bind = op.get_bind()
+    current_kind, current_dimensions = _current_type(bind)
+    if (current_kind, current_dimensions) == (kind, dimensions):
+        return
+    if dimensions > current_dimensions:
+        raise RuntimeError(
+            f'Cannot widen embeddings from {current_dimensions} to {dimensions} dimensions; '
+            'delete message_embeddings and re-run the embedding backfill instead'
+        )
+
+    target = f'{kind}({dimensions})'
+    source = 'embedding::vector'
+    if dimensions < current_dimensions:
+        source = f'l2_normalize(subvector({source}, 1, {dimensions}))'
+
+    with op.get_context().autocommit_block():
+        bind.execute(text(f'ALTER TABLE message_embeddings ADD COLUMN IF NOT EXISTS embedding_reencoded {target}'))
+        while True:
+            result = bind.execute(text(f'''
+                UPDATE message_embeddings SET embedding_reencoded = ({source})::{target}
+                WHERE id IN (
+                    SELECT id FROM message_embeddings
+                    WHERE embedding_reencoded IS NULL
+                    LIMIT :batch_size
+                )
+            '''), {'batch_size': settings.EMBEDDING_REENCODE_BATCH_SIZE})
+            if result.rowcount == 0:
+                break
+        bind.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS {INDEX_NAME}'))
+
+    # Swap atomically; catches rows inserted after the last batch
+    op.execute(f'UPDATE message_embeddings SET embedding_reencoded = ({source})::{target} WHERE embedding_reencoded IS NULL')
+    op.drop_column('message_embeddings', 'embedding')
+    op.alter_column('message_embeddings', 'embedding_reencoded', new_column_name='embedding', nullable=False)
+
+    with op.get_context().autocommit_block():
+        op.execute(f'''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS {INDEX_NAME}
+            ON message_embeddings
+            USING hnsw (embedding {kind}_cosine_ops)
+            WITH (m = {int(settings.VECTOR_HNSW_M)}, ef_construction = {int(settings.VECTOR_HNSW_EF_CONSTRUCTION)})
+        ''')
+
+
+def upgrade() -> None:
+    kind = 'halfvec' if settings.EMBEDDING_HALF_PRECISION else 'vector'
+    _reencode(kind, settings.EMBEDDING_DIMENSION)
+
+
+def downgrade() -> None:
+    # Back to full precision at the current size; dropped dimensions are not recoverable
+    _, dimensions = _current_type(op.get_bind())
+    _reencode('vector', dimensions)
@@ -0,0 +1,32 @@
+"""Add message_embeddings.content_hash for embedding deduplication
+
+Revision ID: 010_embedding_content_hash
+Revises: 009_compact_embeddings
+Create Date: 2026-10-16 00:00:00.000000
+
+Identical normalized content under the same model and dimensions reuses
+an existing vector instead of calling the embeddings API. Existing rows
+keep a NULL hash and are simply not used as dedup sources.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision = '010_embedding_content_hash'
+down_revision = '009_compact_embeddings'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column('message_embeddings', sa.Column('content_hash', sa.String(64), nullable=True))
+    with op.get_context().autocommit_block():
+        op.execute('''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_message_embeddings_content_hash
+            ON message_embeddings (content_hash)
+        ''')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_message_embeddings_content_hash', table_name='message_embeddings')
+    op.drop_column('message_embeddings', 'content_hash')
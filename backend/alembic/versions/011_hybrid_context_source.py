@@ -0,0 +1,37 @@
+"""Add the hybrid context source and a full-text index on chat_messages
+
+Revision ID: 011_hybrid_context_source
+Revises: 010_embedding_content_hash
+Create Date: 2026-10-16 00:00:00.000000
+
+The GIN index is on the expression to_tsvector(FULLTEXT_CONFIG, content),
+so no column is added and the table is not rewritten. Queries must use the
+same expression (see hybrid_provider.fulltext_vector).
+"""
+from alembic import op
+
+from app.config import settings
+
+# revision identifiers, used by Alembic.
+revision = '011_hybrid_context_source'
+down_revision = '010_embedding_content_hash'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        # ALTER TYPE ... ADD VALUE cannot run inside a transaction before PG 12
+        op.execute("ALTER TYPE context_source_enum ADD VALUE IF NOT EXISTS 'hybrid'")
+        op.execute(f'''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_content_fulltext
+            ON chat_messages
+            USING gin (to_tsvector('{settings.FULLTEXT_CONFIG}'::regconfig, content))
+        ''')
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.execute('DROP INDEX CONCURRENTLY IF EXISTS ix_chat_messages_content_fulltext')
+    # Enum values cannot be dropped; move hybrid projects back to RAG (same vector index)
+    op.execute("UPDATE projects SET context_source = 'rag' WHERE context_source = 'hybrid'")
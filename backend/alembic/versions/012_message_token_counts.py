@@ -0,0 +1,68 @@
+"""Store per-message token counts and index history windows
+
+Revision ID: 012_message_token_counts
+Revises: 011_hybrid_context_source
+Create Date: 2026-10-16 00:00:00.000000
+
+chat_messages.token_count is set when a message is saved, so the history
+window of each turn is budgeted without re-tokenizing. Existing messages
+are counted here in batches of BATCH_SIZE, one transaction per batch;
+rows the migration misses are estimated from their length at read time.
+
+The (agent_id, created_at DESC) and (temp_chat_id, created_at DESC)
+indexes let the windowing query read an agent's newest messages in order
+and stop as soon as the budget is used up.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy import text
+
+from app.services.token_counter import count_tokens
+
+# revision identifiers, used by Alembic.
+revision = '012_message_token_counts'
+down_revision = '011_hybrid_context_source'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 5000
+
+
+def upgrade() -> None:
+    op.add_column('chat_messages', sa.Column('token_count', sa.Integer(), nullable=True))
+
+    bind = op.get_bind()
+    with op.get_context().autocommit_block():
+        last_id = None
+        while True:
+            after = '' if last_id is None else 'AND id > :last_id'
+            rows = bind.execute(text(f'''
+                SELECT id, content FROM chat_messages
+                WHERE token_count IS NULL {after}
+                ORDER BY id
+                LIMIT :batch_size
+            '''), {'last_id': last_id, 'batch_size': BATCH_SIZE}).all()
+            if not rows:
+                break
+            bind.execute(
+                text('UPDATE chat_messages SET token_count = :token_count WHERE id = :id'),
+                [{'id': row.id, 'token_count': count_tokens(row.content)} for row in rows]
+            )
+            last_id = rows[-1].id
+
+        op.execute('''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_agent_id_created_at
+            ON chat_messages (agent_id, created_at DESC)
+            WHERE agent_id IS NOT NULL
+        ''')
+        op.execute('''
+            CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_chat_messages_temp_chat_id_created_at
+            ON chat_messages (temp_chat_id, created_at DESC)
+            WHERE temp_chat_id IS NOT NULL
+        ''')
+
+
+def downgrade() -> None:
+    op.drop_index('ix_chat_messages_temp_chat_id_created_at', table_name='chat_messages')
+    op.drop_index('ix_chat_messages_agent_id_created_at', table_name='chat_messages')
+    op.drop_column('chat_messages', 'token_count')
@@ -0,0 +1,37 @@
+"""Add conversation_summaries for rolling per-agent summaries
+
+Revision ID: 013_conversation_summaries
+Revises: 012_message_token_counts
+Create Date: 2026-10-16 00:00:00.000000
+
+One row per agent: the summary of the messages that have left its history
+window and the keyset cursor of the last message folded in. Maintained by
+the background conversation summarizer.
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision = '013_conversation_summaries'
+down_revision = '012_message_token_counts'
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'conversation_summaries',
+        sa.Column('agent_id', postgresql.UUID(as_uuid=True), sa.ForeignKey('agents.id', ondelete='CASCADE'), primary_key=True),
+        sa.Column('content', sa.Text, nullable=False),
+        sa.Column('token_count', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('cursor_created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.Column('cursor_message_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('summarized_count', sa.Integer, nullable=False, server_default='0'),
+        sa.Column('version', sa.Integer, nullable=False, server_default='1'),
+        sa.Column('updated_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('conversation_summaries')
@@ -7,6 +7,7 @@ from app.database import get_db
 from app.models import User, Agent, Project, AgentType
 from app.schemas.agent import AgentCreate, AgentUpdate, AgentResponse
 from app.api.deps import get_current_user
+from app.core.invalidation import invalidation_bus
 
 router = APIRouter()
 
@@ -83,6 +84,9 @@ async def create_agent(
         **agent_data.dict()
     )
     db.add(agent)
+    if agent.project_id:
+        # The project's agent roster changed
+        invalidation_bus.publish(db, "project", agent.project_id)
     db.commit()
     db.refresh(agent)
     
@@ -144,6 +148,7 @@ async def update_agent(
     for field, value in update_data.items():
         setattr(agent, field, value)
     
+    invalidation_bus.publish(db, "agent", agent.id)
     db.commit()
     db.refresh(agent)
     
@@ -174,5 +179,6 @@ async def delete_agent(
         )
     
     db.delete(agent)
+    invalidation_bus.publish(db, "agent", agent_id)
     db.commit()
     return None
@@ -1,97 +1,209 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request
+from fastapi import APIRouter, Depends, Header, HTTPException, status, Query, Request
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from typing import AsyncGenerator, List, Optional
-from uuid import UUID
-import json
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import AsyncGenerator, Awaitable, Callable, List, Optional
+from uuid import UUID, uuid4
+import anyio
 import asyncio
+import json
+import logging
 
-from app.database import get_db
+from app.database import AsyncSessionLocal, get_async_db
 from app.models import User, Agent, TemporaryChat, MessageRole
+from app.core.security import decode_access_token
 from app.schemas.chat import ChatMessageCreate, ChatMessageResponse, ChatHistoryResponse
 from app.api.deps import get_current_user
 from app.config import settings
+from app.services.chat_context import ChatContext, load_chat_context
 from app.services.context_manager import ContextManager
 from app.services.chat_service import stream_openai_response
+from app.services.stream_coalescer import FlushPolicy, coalesce_tokens
+from app.services.stream_registry import EXPIRED_FRAME, stream_registry, stream_resumes_expired
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
 
 async def create_sse_generator(
-    context_manager: ContextManager,
     agent_id: UUID = None,
     temp_chat_id: UUID = None,
     user_id: UUID = None,
-    message: str = ""
+    message: str = "",
+    session_factory: Optional[Callable[[], AsyncSession]] = None,
+    flush_policy: Optional[FlushPolicy] = None,
+    is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None,
+    chat_context: Optional[ChatContext] = None
 ) -> AsyncGenerator[str, None]:
-    """Generate SSE stream for chat responses"""
+    """
+    Generate SSE stream for chat responses.
+
+    Database work happens in short-lived async sessions so that no pooled
+    connection is held while tokens are streaming from the LLM. Deltas are
+    coalesced into frames according to `flush_policy` (Settings by default).
+
+    For agent chats, the agent/project snapshot (`chat_context`) is loaded
+    once, if the caller has not already done so, and reused by every step of
+    the turn.
+
+    If the client disconnects (detected via `is_disconnected` or by the
+    generator being cancelled/closed), the upstream LLM stream is aborted and
+    the partial reply is saved with is_truncated set.
+    """
+    session_factory = session_factory or AsyncSessionLocal
+    flush_policy = flush_policy or FlushPolicy.from_settings()
     try:
-        # Get chat history
-        if agent_id:
-            history = context_manager.get_agent_history(agent_id, limit=20)
-        else:
-            history = context_manager.get_temp_chat_history(temp_chat_id, limit=20)
-        
-        # Convert history to message format
-        messages = [
-            {"role": msg.role.value, "content": msg.content}
-            for msg in history
-        ]
-        
-        # Add current user message
-        messages.append({"role": "user", "content": message})
-        
-        # Format with context if agent
-        if agent_id:
-            messages = context_manager.format_context_for_llm(agent_id, messages)
-        
-        # Save user message
-        context_manager.save_message(
-            user_id=user_id,
-            role=MessageRole.USER,
-            content=message,
-            agent_id=agent_id,
-            temp_chat_id=temp_chat_id
-        )
-        
-        # Stream AI response
+        async with session_factory() as db:
+            context_manager = ContextManager(db)
+
+            if agent_id and chat_context is None:
+                chat_context = await context_manager.load_chat_context(agent_id)
+
+            # Prompt, shared context (agents) and as much history as fits the token budget
+            messages = await context_manager.build_chat_messages(
+                message, agent_id=agent_id, temp_chat_id=temp_chat_id, chat_context=chat_context
+            )
+
+            # Save user message
+            await context_manager.save_message(
+                user_id=user_id,
+                role=MessageRole.USER,
+                content=message,
+                agent_id=agent_id,
+                temp_chat_id=temp_chat_id,
+                chat_context=chat_context
+            )
+
+        # Stream AI response (no database connection held)
         full_response = ""
-        async for chunk in stream_openai_response(messages):
-            full_response += chunk
-            data = json.dumps({"type": "token", "content": chunk})
-            yield f"data: {data}\n\n"
-            await asyncio.sleep(0.01)  # Small delay for smooth streaming
-        
+        truncated = False
+        frames = coalesce_tokens(stream_openai_response(messages), flush_policy)
+        try:
+            async for chunk in frames:
+                full_response += chunk
+                if is_disconnected is not None and await is_disconnected():
+                    truncated = True
+                    break
+                data = json.dumps({"type": "token", "content": chunk})
+                yield f"data: {data}\n\n"
+        except (asyncio.CancelledError, GeneratorExit):
+            # Client went away: the response task was cancelled or the generator closed
+            truncated = True
+            raise
+        finally:
+            if truncated:
+                # Abort the upstream stream and keep the partial reply
+                with anyio.CancelScope(shield=True):
+                    await frames.aclose()
+                    await _save_truncated_reply(
+                        session_factory, user_id, full_response, agent_id, temp_chat_id,
+                        chat_context
+                    )
+
+        if truncated:
+            return
+
         # Save assistant message
-        context_manager.save_message(
-            user_id=user_id,
-            role=MessageRole.ASSISTANT,
-            content=full_response,
-            agent_id=agent_id,
-            temp_chat_id=temp_chat_id
-        )
-        
+        async with session_factory() as db:
+            await ContextManager(db).save_message(
+                user_id=user_id,
+                role=MessageRole.ASSISTANT,
+                content=full_response,
+                agent_id=agent_id,
+                temp_chat_id=temp_chat_id,
+                chat_context=chat_context
+            )
+
         # Send done signal
         data = json.dumps({"type": "done"})
         yield f"data: {data}\n\n"
-        
+
     except Exception as e:
         error_data = json.dumps({"type": "error", "content": str(e)})
         yield f"data: {error_data}\n\n"
 
 
-@router.get("/agent/{agent_id}/stream")
-async def stream_agent_chat(
+async def _save_truncated_reply(
+    session_factory: Callable[[], AsyncSession],
+    user_id: UUID,
+    content: str,
+    agent_id: Optional[UUID],
+    temp_chat_id: Optional[UUID],
+    chat_context: Optional[ChatContext] = None
+) -> None:
+    """Persist a partial assistant reply; never raises (the client is already gone)."""
+    if not content:
+        return
+    try:
+        async with session_factory() as db:
+            await ContextManager(db).save_message(
+                user_id=user_id,
+                role=MessageRole.ASSISTANT,
+                content=content,
+                agent_id=agent_id,
+                temp_chat_id=temp_chat_id,
+                is_truncated=True,
+                chat_context=chat_context
+            )
+    except Exception:
+        logger.exception("Failed to save truncated assistant reply")
+
+
+def _parse_last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _open_chat_stream(
     request: Request,
-    agent_id: UUID,
-    message: str = Query(..., min_length=1),
-    token: Optional[str] = Query(None),  # Optional: cookie is preferred
-    db: Session = Depends(get_db)
-):
-    """Stream chat response for an agent (auth via cookie or query token)."""
-    from app.core.security import decode_access_token
-    from app.models.user import User as UserModel
+    user_id: UUID,
+    chat_scope: str,
+    message: str,
+    idempotency_key: Optional[str],
+    last_event_id: Optional[str],
+    **generator_kwargs
+) -> StreamingResponse:
+    """
+    Start (or resume) a chat stream through the replay registry.
+
+    With an idempotency key, any request for a known key attaches to the
+    existing stream instead of generating again; without one, every request
+    generates. A reconnect carrying Last-Event-ID never generates: it needs
+    the idempotency key of a stream still in this worker's replay buffer
+    (otherwise the message would be saved and answered twice, and the new
+    reply shown from the middle), and gets a terminal error frame if not.
+    """
+    resume_from = _parse_last_event_id(last_event_id)
 
+    if resume_from is not None:
+        record = stream_registry.get(f"{user_id}:{chat_scope}:{idempotency_key}") if idempotency_key else None
+        if record is None:
+            stream_resumes_expired.inc()
+            logger.info(f"Cannot resume {chat_scope} stream from event {resume_from}: not in the replay buffer")
+            return StreamingResponse(iter([EXPIRED_FRAME]), media_type="text/event-stream")
+    else:
+        # Without a key the stream gets one nobody else can attach to
+        key = f"{user_id}:{chat_scope}:{idempotency_key or uuid4().hex}"
+        record = stream_registry.open_stream(
+            key,
+            lambda: create_sse_generator(user_id=user_id, message=message, **generator_kwargs),
+            reuse=idempotency_key is not None
+        )
+
+    return StreamingResponse(
+        stream_registry.follow(
+            record,
+            last_event_id=resume_from or 0,
+            is_disconnected=request.is_disconnected
+        ),
+        media_type="text/event-stream"
+    )
+
+
+async def _authenticate_stream_user(request: Request, token: Optional[str], db: AsyncSession) -> User:
+    """Resolve the user for a stream request (auth via cookie or query token)."""
     auth_token = token or request.cookies.get(settings.AUTH_COOKIE_NAME)
     if not auth_token:
         raise HTTPException(status_code=401, detail="Authentication required")
@@ -102,36 +214,53 @@ async def stream_agent_chat(
         if not user_id:
             raise HTTPException(status_code=401, detail="Invalid token")
 
-        current_user = db.query(UserModel).filter(UserModel.id == user_id).first()
+        result = await db.execute(select(User).where(User.id == UUID(user_id)))
+        current_user = result.scalars().first()
         if not current_user:
             raise HTTPException(status_code=401, detail="User not found")
     except HTTPException:
         raise
     except Exception:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
-    
-    # Verify agent ownership
-    agent = db.query(Agent).filter(
-        Agent.id == agent_id,
-        Agent.user_id == current_user.id
-    ).first()
-    
-    if not agent:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Agent not found"
-        )
-    
-    context_manager = ContextManager(db)
-    
-    return StreamingResponse(
-        create_sse_generator(
-            context_manager=context_manager,
-            agent_id=agent_id,
-            user_id=current_user.id,
-            message=message
-        ),
-        media_type="text/event-stream"
+
+    return current_user
+
+
+@router.get("/agent/{agent_id}/stream")
+async def stream_agent_chat(
+    request: Request,
+    agent_id: UUID,
+    message: str = Query(..., min_length=1),
+    token: Optional[str] = Query(None),  # Optional: cookie is preferred
+    flush_ms: Optional[int] = Query(None, ge=0, le=1000),
+    flush_bytes: Optional[int] = Query(None, ge=1, le=65536),
+    idempotency_key: Optional[str] = Query(None, min_length=1, max_length=128),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
+):
+    """Stream chat response for an agent (auth via cookie or query token)."""
+    async with AsyncSessionLocal() as db:
+        current_user = await _authenticate_stream_user(request, token, db)
+        user_id = current_user.id
+
+        # Verify agent ownership; the snapshot is reused for the whole turn
+        chat_context = await load_chat_context(db, agent_id)
+
+        if not chat_context or chat_context.user_id != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Agent not found"
+            )
+
+    return _open_chat_stream(
+        request,
+        user_id,
+        chat_scope=f"agent:{agent_id}",
+        message=message,
+        idempotency_key=idempotency_key,
+        last_event_id=last_event_id,
+        agent_id=agent_id,
+        chat_context=chat_context,
+        flush_policy=FlushPolicy.from_settings(flush_ms, flush_bytes)
     )
 
 
@@ -141,52 +270,40 @@ async def stream_temp_chat(
     temp_chat_id: UUID,
     message: str = Query(..., min_length=1),
     token: Optional[str] = Query(None),  # Optional: cookie is preferred
-    db: Session = Depends(get_db)
+    flush_ms: Optional[int] = Query(None, ge=0, le=1000),
+    flush_bytes: Optional[int] = Query(None, ge=1, le=65536),
+    idempotency_key: Optional[str] = Query(None, min_length=1, max_length=128),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID")
 ):
     """Stream chat response for a temporary chat (auth via cookie or query token)."""
-    from app.core.security import decode_access_token
-    from app.models.user import User as UserModel
+    async with AsyncSessionLocal() as db:
+        current_user = await _authenticate_stream_user(request, token, db)
+        user_id = current_user.id
 
-    auth_token = token or request.cookies.get(settings.AUTH_COOKIE_NAME)
-    if not auth_token:
-        raise HTTPException(status_code=401, detail="Authentication required")
+        # Verify temp chat ownership
+        result = await db.execute(
+            select(TemporaryChat).where(
+                TemporaryChat.id == temp_chat_id,
+                TemporaryChat.user_id == user_id
+            )
+        )
+        temp_chat = result.scalars().first()
 
-    try:
-        payload = decode_access_token(auth_token)
-        user_id = payload.get("sub")
-        if not user_id:
-            raise HTTPException(status_code=401, detail="Invalid token")
+        if not temp_chat:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Temporary chat not found"
+            )
 
-        current_user = db.query(UserModel).filter(UserModel.id == user_id).first()
-        if not current_user:
-            raise HTTPException(status_code=401, detail="User not found")
-    except HTTPException:
-        raise
-    except Exception:
-        raise HTTPException(status_code=401, detail="Invalid or expired token")
-    
-    # Verify temp chat ownership
-    temp_chat = db.query(TemporaryChat).filter(
-        TemporaryChat.id == temp_chat_id,
-        TemporaryChat.user_id == current_user.id
-    ).first()
-    
-    if not temp_chat:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Temporary chat not found"
-        )
-    
-    context_manager = ContextManager(db)
-    
-    return StreamingResponse(
-        create_sse_generator(
-            context_manager=context_manager,
-            temp_chat_id=temp_chat_id,
-            user_id=current_user.id,
-            message=message
-        ),
-        media_type="text/event-stream"
+    return _open_chat_stream(
+        request,
+        user_id,
+        chat_scope=f"temp:{temp_chat_id}",
+        message=message,
+        idempotency_key=idempotency_key,
+        last_event_id=last_event_id,
+        temp_chat_id=temp_chat_id,
+        flush_policy=FlushPolicy.from_settings(flush_ms, flush_bytes)
     )
 
 
@@ -195,14 +312,17 @@ async def get_agent_history(
     agent_id: UUID,
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get chat history for an agent"""
-    agent = db.query(Agent).filter(
-        Agent.id == agent_id,
-        Agent.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Agent).where(
+            Agent.id == agent_id,
+            Agent.user_id == current_user.id
+        )
+    )
+    agent = result.scalars().first()
     
     if not agent:
         raise HTTPException(
@@ -211,7 +331,7 @@ async def get_agent_history(
         )
     
     context_manager = ContextManager(db)
-    messages = context_manager.get_agent_history(agent_id, limit, offset)
+    messages = await context_manager.get_agent_history(agent_id, limit, offset)
     
     return ChatHistoryResponse(
         messages=[ChatMessageResponse.from_orm(msg) for msg in messages],
@@ -224,14 +344,17 @@ async def get_temp_chat_history(
     temp_chat_id: UUID,
     limit: int = Query(50, ge=1, le=100),
     offset: int = Query(0, ge=0),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Get chat history for a temporary chat"""
-    temp_chat = db.query(TemporaryChat).filter(
-        TemporaryChat.id == temp_chat_id,
-        TemporaryChat.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(TemporaryChat).where(
+            TemporaryChat.id == temp_chat_id,
+            TemporaryChat.user_id == current_user.id
+        )
+    )
+    temp_chat = result.scalars().first()
     
     if not temp_chat:
         raise HTTPException(
@@ -240,7 +363,7 @@ async def get_temp_chat_history(
         )
     
     context_manager = ContextManager(db)
-    messages = context_manager.get_temp_chat_history(temp_chat_id, limit, offset)
+    messages = await context_manager.get_temp_chat_history(temp_chat_id, limit, offset)
     
     return ChatHistoryResponse(
         messages=[ChatMessageResponse.from_orm(msg) for msg in messages],
@@ -251,14 +374,17 @@ async def get_temp_chat_history(
 @router.delete("/agent/{agent_id}/clear", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_agent_chat(
     agent_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Clear all messages for an agent"""
-    agent = db.query(Agent).filter(
-        Agent.id == agent_id,
-        Agent.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(Agent).where(
+            Agent.id == agent_id,
+            Agent.user_id == current_user.id
+        )
+    )
+    agent = result.scalars().first()
     
     if not agent:
         raise HTTPException(
@@ -267,7 +393,7 @@ async def clear_agent_chat(
         )
     
     context_manager = ContextManager(db)
-    context_manager.clear_agent_history(agent_id)
+    await context_manager.clear_agent_history(agent_id)
     
     return None
 
@@ -275,14 +401,17 @@ async def clear_agent_chat(
 @router.delete("/temp/{temp_chat_id}/clear", status_code=status.HTTP_204_NO_CONTENT)
 async def clear_temp_chat(
     temp_chat_id: UUID,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_async_db),
     current_user: User = Depends(get_current_user)
 ):
     """Clear all messages for a temporary chat"""
-    temp_chat = db.query(TemporaryChat).filter(
-        TemporaryChat.id == temp_chat_id,
-        TemporaryChat.user_id == current_user.id
-    ).first()
+    result = await db.execute(
+        select(TemporaryChat).where(
+            TemporaryChat.id == temp_chat_id,
+            TemporaryChat.user_id == current_user.id
+        )
+    )
+    temp_chat = result.scalars().first()
     
     if not temp_chat:
         raise HTTPException(
@@ -291,6 +420,6 @@ async def clear_temp_chat(
         )
     
     context_manager = ContextManager(db)
-    context_manager.clear_temp_chat_history(temp_chat_id)
+    await context_manager.clear_temp_chat_history(temp_chat_id)
     
     return None
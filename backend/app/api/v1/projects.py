@@ -1,12 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 from uuid import UUID
 
 from app.database import get_db
-from app.models import User, Project, Agent
+from app.models import User, Project, Agent, ContextSource
 from app.schemas.project import ProjectCreate, ProjectUpdate, ProjectResponse
 from app.api.deps import get_current_user
+from app.core.invalidation import invalidation_bus
+from app.services.embedding_backfill import start_backfill
 
 router = APIRouter()
 
@@ -78,10 +80,11 @@ async def get_project(
 async def update_project(
     project_id: UUID,
     project_data: ProjectUpdate,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """Update a project"""
+    """Update a project (switching to RAG context starts the embedding backfill)"""
     project = db.query(Project).filter(
         Project.id == project_id,
         Project.user_id == current_user.id
@@ -94,12 +97,18 @@ async def update_project(
         )
     
     # Update only provided fields
+    previous_source = ContextSource(project.context_source)
     update_data = project_data.dict(exclude_unset=True)
     for field, value in update_data.items():
         setattr(project, field, value)
     
+    invalidation_bus.publish(db, "project", project.id)
     db.commit()
     db.refresh(project)
+
+    # Existing history is not in the vector store yet
+    if not previous_source.uses_embeddings and ContextSource(project.context_source).uses_embeddings:
+        background_tasks.add_task(start_backfill, project.id)
     
     agent_count = db.query(Agent).filter(Agent.project_id == project.id).count()
     project_dict = ProjectResponse.from_orm(project).dict()
@@ -126,6 +135,7 @@ async def delete_project(
         )
     
     db.delete(project)
+    invalidation_bus.publish(db, "project", project_id)
     db.commit()
     return None
 
@@ -181,6 +191,7 @@ async def toggle_context_sharing(
         )
     
     project.enable_context_sharing = enable
+    invalidation_bus.publish(db, "project", project.id)
     db.commit()
     db.refresh(project)
     
@@ -0,0 +1,227 @@
+"""Cross-worker cache invalidation over Postgres LISTEN/NOTIFY"""
+
+import asyncio
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import Callable, List, Optional
+from uuid import UUID, uuid4
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+FLUSH = "*"  # kind of the event that drops every cached entry
+
+_PENDING_KEY = "pending_invalidations"
+
+invalidations_received = metrics.counter(
+    "cache_invalidations_received_total",
+    "Invalidation events received from other workers"
+)
+invalidation_flushes = metrics.counter(
+    "cache_invalidation_flushes_total",
+    "Full cache flushes (listener connected, reconnected or lost)"
+)
+invalidation_latency = metrics.histogram(
+    "cache_invalidation_latency_seconds",
+    "Time from commit of a write to its invalidation arriving in another worker"
+)
+
+
+@dataclass(frozen=True)
+class Invalidation:
+    """One entity whose cached state is stale ("agent", "project", or FLUSH)"""
+    kind: str
+    entity_id: Optional[UUID] = None
+    origin: Optional[str] = None
+    sent_at: float = field(default_factory=time.time)
+
+    def to_payload(self) -> str:
+        return json.dumps({
+            "kind": self.kind,
+            "id": str(self.entity_id) if self.entity_id else None,
+            "origin": self.origin,
+            "sent_at": self.sent_at,
+        })
+
+    @classmethod
+    def from_payload(cls, payload: str) -> "Invalidation":
+        data = json.loads(payload)
+        return cls(
+            kind=data["kind"],
+            entity_id=UUID(data["id"]) if data.get("id") else None,
+            origin=data.get("origin"),
+            sent_at=data.get("sent_at") or time.time(),
+        )
+
+
+Handler = Callable[[Invalidation], None]
+
+
+def listener_dsn(database_url: str) -> Optional[str]:
+    """Plain postgresql:// DSN for asyncpg, or None when the database is not Postgres"""
+    url = make_url(database_url)
+    if url.get_backend_name() not in ("postgresql", "postgres"):
+        return None
+    return url.set(drivername="postgresql").render_as_string(hide_password=False)
+
+
+class InvalidationBus:
+    """
+    Fan-out of cache invalidations to every worker, with no extra infrastructure.
+
+    Write paths call `publish(db, kind, entity_id)` before committing. The
+    event is applied to this worker's caches once the transaction commits
+    (nothing happens on rollback) and, on Postgres, a NOTIFY sent in the same
+    transaction reaches the other workers at commit time.
+
+    Each worker runs one listener connection (`start()`). Notifications sent
+    while it is not listening are lost, so subscribers get a FLUSH event
+    whenever the listener connects, reconnects or loses its connection.
+    """
+
+    def __init__(
+        self,
+        dsn: Optional[str] = None,
+        channel: Optional[str] = None,
+        keepalive_seconds: Optional[float] = None,
+        reconnect_max_seconds: Optional[float] = None
+    ):
+        self.dsn = dsn if dsn is not None else listener_dsn(settings.DATABASE_URL)
+        self.channel = channel or settings.INVALIDATION_CHANNEL
+        self.keepalive_seconds = keepalive_seconds or settings.INVALIDATION_KEEPALIVE_SECONDS
+        self.reconnect_max_seconds = reconnect_max_seconds or settings.INVALIDATION_RECONNECT_MAX_SECONDS
+        self.worker_id = uuid4().hex
+        self.listening = asyncio.Event()
+        self._handlers: List[Handler] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, handler: Handler) -> None:
+        self._handlers.append(handler)
+
+    def unsubscribe(self, handler: Handler) -> None:
+        if handler in self._handlers:
+            self._handlers.remove(handler)
+
+    def dispatch(self, invalidation: Invalidation) -> None:
+        for handler in list(self._handlers):
+            try:
+                handler(invalidation)
+            except Exception:
+                logger.exception("Cache invalidation handler failed for %s", invalidation.kind)
+
+    def flush(self) -> None:
+        invalidation_flushes.inc()
+        self.dispatch(Invalidation(FLUSH, origin=self.worker_id))
+
+    def publish(self, db: Session, kind: str, entity_id: UUID) -> None:
+        """Invalidate `kind`/`entity_id` everywhere once `db`'s transaction commits"""
+        invalidation = Invalidation(kind, entity_id, origin=self.worker_id)
+        connection = db.connection()  # begins the transaction the event is tied to
+        db.info.setdefault(_PENDING_KEY, []).append((self, invalidation))
+        if connection.dialect.name == "postgresql":
+            db.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": invalidation.to_payload()}
+            )
+
+    async def publish_async(self, db: AsyncSession, kind: str, entity_id: UUID) -> None:
+        """`publish` for an AsyncSession"""
+        invalidation = Invalidation(kind, entity_id, origin=self.worker_id)
+        connection = await db.connection()
+        db.sync_session.info.setdefault(_PENDING_KEY, []).append((self, invalidation))
+        if connection.dialect.name == "postgresql":
+            await db.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": invalidation.to_payload()}
+            )
+
+    async def start(self) -> None:
+        """Start listening (no-op when the database is not Postgres)"""
+        if self.dsn is None or self._task is not None:
+            return
+        self._task = asyncio.create_task(self._listen_forever())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def _on_notify(self, connection, pid, channel, payload: str) -> None:
+        try:
+            invalidation = Invalidation.from_payload(payload)
+        except (ValueError, KeyError):
+            logger.warning("Ignoring malformed invalidation payload: %r", payload)
+            return
+        if invalidation.origin == self.worker_id:
+            return  # already applied locally at commit
+        invalidations_received.inc()
+        invalidation_latency.observe(max(0.0, time.time() - invalidation.sent_at))
+        self.dispatch(invalidation)
+
+    async def _listen_forever(self) -> None:
+        import asyncpg
+
+        delay = 0.5
+        while True:
+            try:
+                connection = await asyncpg.connect(self.dsn)
+            except (OSError, asyncio.TimeoutError, asyncpg.PostgresError) as e:
+                logger.warning("Invalidation listener cannot connect (%s); retrying in %.1fs", e, delay)
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, self.reconnect_max_seconds)
+                continue
+
+            lost = asyncio.Event()
+            try:
+                connection.add_termination_listener(lambda _: lost.set())
+                await connection.add_listener(self.channel, self._on_notify)
+                # Whatever was published while we were not listening is gone
+                self.flush()
+                self.listening.set()
+                delay = 0.5
+                while not lost.is_set():
+                    try:
+                        await asyncio.wait_for(lost.wait(), self.keepalive_seconds)
+                    except asyncio.TimeoutError:
+                        await connection.fetchval("SELECT 1")
+                logger.warning("Invalidation listener connection lost")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Invalidation listener failed (%s); reconnecting", e)
+            finally:
+                if self.listening.is_set():
+                    self.listening.clear()
+                    # Caches may miss events until we are back: start from empty
+                    self.flush()
+                connection.terminate()
+            await asyncio.sleep(delay)
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_pending(session: Session) -> None:
+    for bus, invalidation in session.info.pop(_PENDING_KEY, ()):
+        bus.dispatch(invalidation)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session: Session, previous_transaction) -> None:
+    if not session.in_transaction():
+        session.info.pop(_PENDING_KEY, None)
+
+
+invalidation_bus = InvalidationBus()
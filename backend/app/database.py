@@ -1,8 +1,10 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from app.config import settings
 
+# Sync engine: used by Alembic, the CRUD routes and the tests
 engine = create_engine(
     settings.DATABASE_URL,
     pool_pre_ping=True,
@@ -14,6 +16,59 @@ SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
+
+def to_async_database_url(url: str) -> str:
+    """Map a sync database URL onto the matching async driver"""
+    if url.startswith("postgres://"):
+        url = "postgresql://" + url[len("postgres://"):]
+    for prefix in ("postgresql+psycopg2://", "postgresql://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    if url.startswith("sqlite://"):
+        return "sqlite+aiosqlite://" + url[len("sqlite://"):]
+    return url
+
+
+# Async engine: used by the chat hot path so queries never block the event loop
+async_engine = create_async_engine(
+    settings.ASYNC_DATABASE_URL or to_async_database_url(settings.DATABASE_URL),
+    pool_pre_ping=True,
+    pool_size=10,
+    max_overflow=20
+)
+
+AsyncSessionLocal = async_sessionmaker(
+    bind=async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
+
+async def _register_vector_codec(conn) -> None:
+    """Exchange pgvector values as text, matching what pgvector's Vector type binds"""
+    for type_name in ("vector", "halfvec"):
+        try:
+            await conn.set_type_codec(type_name, encoder=str, decoder=str, format="text", schema="public")
+        except ValueError:
+            # Extension not installed yet (e.g. before migrations have run),
+            # or a pgvector version without halfvec
+            pass
+
+
+def register_vector_codec(target_engine) -> None:
+    """Install the pgvector codec on every new asyncpg connection of an async engine"""
+    if target_engine.dialect.driver != "asyncpg":
+        return
+
+    @event.listens_for(target_engine.sync_engine, "connect")
+    def _on_connect(dbapi_connection, connection_record):
+        dbapi_connection.run_async(_register_vector_codec)
+
+
+register_vector_codec(async_engine)
+
+
 def get_db():
     """Dependency for getting database session"""
     db = SessionLocal()
@@ -21,3 +76,9 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    """Dependency for getting an async database session"""
+    async with AsyncSessionLocal() as db:
+        yield db
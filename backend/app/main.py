@@ -1,3 +1,5 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from slowapi import _rate_limit_exceeded_handler
@@ -5,13 +7,38 @@ from slowapi.errors import RateLimitExceeded
 from slowapi.middleware import SlowAPIMiddleware
 
 from app.config import settings
+from app.core.invalidation import invalidation_bus
+from app.core.metrics import metrics
 from app.limiter import limiter
 from app.api.v1 import auth, users, projects, agents, temporary_chats, chat, files
+from app.services.openai_clients import openai_clients
+from app.services.embedding_indexer import embedding_indexer
+from app.services.conversation_summarizer import conversation_summarizer
+from app.services.token_counter import load_encoding
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Keep this worker's in-process caches coherent with writes from other workers
+    await invalidation_bus.start()
+    # One pooled client per LLM provider, with connections opened before traffic arrives
+    await openai_clients.start()
+    # The tokenizer downloads its BPE file on first use: not on the request path
+    await load_encoding()
+    await embedding_indexer.start()
+    await conversation_summarizer.start()
+    yield
+    await conversation_summarizer.stop()
+    await embedding_indexer.stop()
+    await invalidation_bus.stop()
+    await openai_clients.aclose()
+
 
 app = FastAPI(
     title="Chatbot Platform API",
     description="A minimal Chatbot Platform with authentication and LLM integration - Phase 8",
-    version="2.1.0"
+    version="2.1.0",
+    lifespan=lifespan
 )
 
 app.state.limiter = limiter
@@ -47,3 +74,9 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "healthy"}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """In-process counters and histograms for this worker"""
+    return metrics.snapshot()
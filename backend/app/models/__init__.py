@@ -5,6 +5,8 @@ from app.models.temporary_chat import TemporaryChat
 from app.models.chat_message import ChatMessage, MessageRole
 from app.models.project_file import ProjectFile
 from app.models.message_embedding import MessageEmbedding
+from app.models.embedding_backfill import EmbeddingBackfill
+from app.models.conversation_summary import ConversationSummary
 
 __all__ = [
     "User",
@@ -17,4 +19,6 @@ __all__ = [
     "MessageRole",
     "ProjectFile",
     "MessageEmbedding",
+    "EmbeddingBackfill",
+    "ConversationSummary",
 ]
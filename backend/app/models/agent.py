@@ -36,3 +36,4 @@ class Agent(Base):
     user = relationship("User", back_populates="agents")
     project = relationship("Project", back_populates="agents")
     chat_messages = relationship("ChatMessage", back_populates="agent", cascade="all, delete-orphan")
+    summary = relationship("ConversationSummary", uselist=False, passive_deletes=True)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Text, DateTime, ForeignKey, Enum, CheckConstraint
+from sqlalchemy import Column, Text, Boolean, Integer, DateTime, ForeignKey, Enum, CheckConstraint, Index, false, text
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -26,14 +26,39 @@ class ChatMessage(Base):
             '(agent_id IS NOT NULL AND temp_chat_id IS NULL) OR (agent_id IS NULL AND temp_chat_id IS NOT NULL)',
             name='chat_messages_exactly_one_parent'
         ),
+        # Project activity feed: newest messages of a project in one index range scan
+        Index(
+            'ix_chat_messages_project_id_created_at',
+            'project_id',
+            text('created_at DESC'),
+            postgresql_where=text('project_id IS NOT NULL')
+        ),
+        # History windows: an agent's / temporary chat's newest messages first
+        Index(
+            'ix_chat_messages_agent_id_created_at',
+            'agent_id',
+            text('created_at DESC'),
+            postgresql_where=text('agent_id IS NOT NULL')
+        ),
+        Index(
+            'ix_chat_messages_temp_chat_id_created_at',
+            'temp_chat_id',
+            text('created_at DESC'),
+            postgresql_where=text('temp_chat_id IS NOT NULL')
+        ),
     )
+    # Fetch server defaults (created_at) in the INSERT itself instead of a follow-up SELECT
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     agent_id = Column(UUID(as_uuid=True), ForeignKey("agents.id", ondelete="CASCADE"), nullable=True)
     temp_chat_id = Column(UUID(as_uuid=True), ForeignKey("temporary_chats.id", ondelete="CASCADE"), nullable=True)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), nullable=True)  # Denormalized from the agent
     role = Column(Enum(MessageRole, name='message_role_enum', create_constraint=True, native_enum=True, values_callable=lambda x: [str(e.value) for e in x]), nullable=False)
     content = Column(Text, nullable=False)
+    is_truncated = Column(Boolean, default=False, nullable=False, server_default=false())  # Reply cut short by client disconnect
+    token_count = Column(Integer, nullable=True)  # Prompt tokens of content, counted once when saved
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # Relationships
@@ -0,0 +1,33 @@
+"""Rolling summary of an agent's conversation"""
+
+from sqlalchemy import Column, Text, Integer, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class ConversationSummary(Base):
+    """
+    Summary of the messages of an agent that have left its history window.
+
+    The keyset cursor (created_at, message id) marks the newest message
+    folded into the summary: the history window only takes messages after
+    it, and the next update folds in the messages that follow. `version`
+    is bumped on every update so concurrent updaters cannot overwrite each
+    other (compare-and-set).
+    """
+    __tablename__ = "conversation_summaries"
+
+    agent_id = Column(UUID(as_uuid=True), ForeignKey("agents.id", ondelete="CASCADE"), primary_key=True)
+    content = Column(Text, nullable=False)
+    token_count = Column(Integer, nullable=False, default=0)
+    cursor_created_at = Column(DateTime(timezone=True), nullable=False)
+    cursor_message_id = Column(UUID(as_uuid=True), nullable=False)
+    summarized_count = Column(Integer, nullable=False, default=0)  # Messages folded in so far
+    version = Column(Integer, nullable=False, default=1)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+
+    @property
+    def cursor(self):
+        return (self.cursor_created_at, self.cursor_message_id)
@@ -0,0 +1,34 @@
+"""Checkpoint of the embedding backfill job for a project"""
+
+from sqlalchemy import Column, String, Text, Integer, DateTime, ForeignKey
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.sql import func
+
+from app.database import Base
+
+
+class EmbeddingBackfill(Base):
+    """
+    Progress of embedding a project's existing history (one row per project).
+
+    The keyset cursor (created_at, message id) marks the last message the
+    job has handled, so a crashed or interrupted run resumes from there; a
+    run after a completed one starts from the beginning again.
+    updated_at doubles as a lease heartbeat: a running job that has not
+    checkpointed for a while may be taken over by another worker.
+    """
+    __tablename__ = "embedding_backfills"
+
+    STATUS_RUNNING = "running"
+    STATUS_COMPLETED = "completed"
+    STATUS_FAILED = "failed"
+
+    project_id = Column(UUID(as_uuid=True), ForeignKey("projects.id", ondelete="CASCADE"), primary_key=True)
+    status = Column(String(20), nullable=False, default=STATUS_RUNNING)
+    cursor_created_at = Column(DateTime(timezone=True), nullable=True)
+    cursor_message_id = Column(UUID(as_uuid=True), nullable=True)
+    indexed_count = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    started_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
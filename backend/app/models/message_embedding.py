@@ -1,6 +1,6 @@
 """Message embedding model for RAG with pgvector"""
 
-from sqlalchemy import Column, Text, DateTime, ForeignKey, Index
+from sqlalchemy import Column, String, Text, DateTime, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
@@ -11,6 +11,28 @@ from app.database import Base
 from app.config import settings
 
 
+class HalfVector(Vector):
+    """
+    pgvector halfvec column: 16-bit floats, half the storage of `vector`.
+
+    Values use the same text format as Vector and the same distance
+    operators, so queries are unchanged.
+    """
+    cache_ok = True
+
+    def get_col_spec(self, **kw):
+        if self.dim is None:
+            return "HALFVEC"
+        return "HALFVEC(%d)" % self.dim
+
+
+def embedding_type():
+    """Column type for stored embeddings, per EMBEDDING_DIMENSION / EMBEDDING_HALF_PRECISION"""
+    if settings.EMBEDDING_HALF_PRECISION:
+        return HalfVector(settings.EMBEDDING_DIMENSION)
+    return Vector(settings.EMBEDDING_DIMENSION)
+
+
 class MessageEmbedding(Base):
     """
     Message embedding model for RAG-based context retrieval.
@@ -23,7 +45,9 @@ class MessageEmbedding(Base):
     message_id = Column(UUID(as_uuid=True), ForeignKey("chat_messages.id", ondelete="CASCADE"), nullable=False, unique=True)
     agent_id = Column(UUID(as_uuid=True), ForeignKey("agents.id", ondelete="CASCADE"), nullable=False)
     content = Column(Text, nullable=False)  # Original message content for reference
-    embedding = Column(Vector(settings.EMBEDDING_DIMENSION), nullable=False)  # 1536 for text-embedding-3-small
+    embedding = Column(embedding_type(), nullable=False)  # 1536 floats for text-embedding-3-small by default
+    # sha256 of model, dimensions and normalized content; identical content reuses the vector
+    content_hash = Column(String(64), nullable=True, index=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
     # Relationships
@@ -31,5 +55,4 @@ class MessageEmbedding(Base):
     message = relationship("ChatMessage")
     agent = relationship("Agent")
 
-    # Index for similarity search will be added in migration
-    # (ivfflat or hnsw index on embedding column)
+    # HNSW index on the embedding column is managed by migrations 008/009
@@ -12,10 +12,16 @@ class ContextSource(str, enum.Enum):
     """Context source enum - determines how shared context is retrieved"""
     RECENT = "recent"  # Use recency-based context (last N messages)
     RAG = "rag"  # Use RAG-based context (semantic search)
+    HYBRID = "hybrid"  # Full-text + semantic search, rank-fused
     
     def __str__(self):
         return self.value
 
+    @property
+    def uses_embeddings(self) -> bool:
+        """Whether messages of projects with this source are indexed in the vector store"""
+        return self in (ContextSource.RAG, ContextSource.HYBRID)
+
 
 class Project(Base):
     """Project model - represents a folder/container for multiple agents"""
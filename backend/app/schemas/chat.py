@@ -16,6 +16,7 @@ class ChatMessageResponse(BaseModel):
     temp_chat_id: Optional[UUID] = None
     role: MessageRole
     content: str
+    is_truncated: bool = False
     created_at: datetime
 
     class Config:
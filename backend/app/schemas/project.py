@@ -10,7 +10,7 @@ class ProjectBase(BaseModel):
     has_prompt: bool = False
     prompt_content: Optional[str] = None
     enable_context_sharing: bool = True
-    context_source: Literal["recent", "rag"] = "recent"
+    context_source: Literal["recent", "rag", "hybrid"] = "recent"
 
 
 class ProjectCreate(ProjectBase):
@@ -23,7 +23,7 @@ class ProjectUpdate(BaseModel):
     has_prompt: Optional[bool] = None
     prompt_content: Optional[str] = None
     enable_context_sharing: Optional[bool] = None
-    context_source: Optional[Literal["recent", "rag"]] = None
+    context_source: Optional[Literal["recent", "rag", "hybrid"]] = None
 
 
 class ProjectResponse(BaseModel):
@@ -34,7 +34,7 @@ class ProjectResponse(BaseModel):
     has_prompt: bool = False
     prompt_content: Optional[str] = None
     enable_context_sharing: bool = True
-    context_source: Literal["recent", "rag"] = "recent"
+    context_source: Literal["recent", "rag", "hybrid"] = "recent"
     created_at: datetime
     updated_at: datetime
     agent_count: Optional[int] = 0
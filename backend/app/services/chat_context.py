@@ -0,0 +1,92 @@
+"""Per-request snapshot of everything a chat turn needs about an agent and its project"""
+
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from app.models import Agent, Project, ContextSource
+
+
+@dataclass(frozen=True)
+class ChatContext:
+    """
+    Detached snapshot of an agent, its conversation summary, its project
+    and the project's other agents.
+
+    Loaded once per chat turn with a single joined query and passed to every
+    step that needs it (system prompt, shared context providers, RAG
+    indexing), so no step has to look the same rows up again. It holds no
+    ORM state and can safely outlive the session it was loaded in.
+    """
+    agent_id: UUID
+    user_id: UUID
+    agent_name: str
+    agent_prompt: Optional[str] = None
+    agent_updated_at: Optional[datetime] = None
+    project_id: Optional[UUID] = None
+    project_prompt: Optional[str] = None
+    project_updated_at: Optional[datetime] = None
+    enable_context_sharing: bool = False
+    context_source: ContextSource = ContextSource.RECENT
+    other_agents: Dict[UUID, str] = field(default_factory=dict)  # id -> name, same project
+    summary: Optional[str] = None  # Rolling summary of messages older than summary_cursor
+    summary_cursor: Optional[Tuple[datetime, UUID]] = None  # (created_at, id) of the last summarized message
+
+    @property
+    def system_prompt(self) -> Optional[str]:
+        """Combined project and agent prompt, or None if neither has one"""
+        prompt_parts = []
+        if self.project_prompt:
+            prompt_parts.append(f"PROJECT CONTEXT:\n{self.project_prompt}")
+        if self.agent_prompt:
+            prompt_parts.append(f"AGENT ROLE:\n{self.agent_prompt}")
+        if not prompt_parts:
+            return None
+        return "\n\n".join(prompt_parts)
+
+    @property
+    def shares_context(self) -> bool:
+        """Whether the agent is in a project with context sharing enabled"""
+        return self.project_id is not None and self.enable_context_sharing
+
+    @classmethod
+    def from_agent(cls, agent: Agent) -> "ChatContext":
+        """Build a snapshot from an Agent with its project (and project agents) loaded"""
+        project: Optional[Project] = agent.project
+        values = dict(
+            agent_id=agent.id,
+            user_id=agent.user_id,
+            agent_name=agent.name,
+            agent_prompt=agent.prompt_content if agent.has_prompt and agent.prompt_content else None,
+            agent_updated_at=agent.updated_at,
+        )
+        if agent.summary is not None:
+            values.update(summary=agent.summary.content, summary_cursor=agent.summary.cursor)
+        if project is not None:
+            values.update(
+                project_id=project.id,
+                project_prompt=project.prompt_content if project.has_prompt and project.prompt_content else None,
+                project_updated_at=project.updated_at,
+                enable_context_sharing=project.enable_context_sharing,
+                context_source=project.context_source or ContextSource.RECENT,
+                other_agents={a.id: a.name for a in project.agents if a.id != agent.id},
+            )
+        return cls(**values)
+
+
+async def load_chat_context(db: AsyncSession, agent_id: UUID) -> Optional[ChatContext]:
+    """Load the ChatContext for an agent in one round trip (agent JOIN summary JOIN project JOIN project agents)"""
+    result = await db.execute(
+        select(Agent)
+        .options(joinedload(Agent.summary), joinedload(Agent.project).joinedload(Project.agents))
+        .where(Agent.id == agent_id)
+    )
+    agent = result.unique().scalars().first()
+    if not agent:
+        return None
+    return ChatContext.from_agent(agent)
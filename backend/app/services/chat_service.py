@@ -4,17 +4,54 @@ from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from openai import AsyncOpenAI
 from app.config import settings
+from app.core.metrics import metrics
 from app.models.chat_message import ChatMessage
 from app.models.project import Project
+from app.services.llm_router import LLMRouter, llm_router
+from app.services.openai_clients import Provider, openai_clients
+from app.services.prompt_layout import record_prompt_usage
+from app.services.token_counter import count_tokens
+import anyio
+import asyncio
 import logging
 
 logger = logging.getLogger(__name__)
 
+streams_aborted = metrics.counter(
+    "chat_streams_aborted_total",
+    "LLM streams aborted because the SSE client went away"
+)
+tokens_saved = metrics.counter(
+    "chat_stream_tokens_saved_total",
+    "Completion tokens not paid for thanks to aborted streams (upper bound: unused max_tokens budget)"
+)
+
 class ChatService:
     """Service for handling chat operations with OpenAI integration"""
     
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
+    def __init__(self, client: Optional[AsyncOpenAI] = None, router: Optional[LLMRouter] = None):
+        self._client = client
+        self._router = router
+
+    @property
+    def client(self) -> Optional[AsyncOpenAI]:
+        """The process-wide OpenAI client unless one was given"""
+        return self._client if self._client is not None else openai_clients.get()
+
+    @client.setter
+    def client(self, client: Optional[AsyncOpenAI]) -> None:
+        self._client = client
+
+    @property
+    def router(self) -> LLMRouter:
+        """Provider routing for chat replies: the shared router unless a client or router was given"""
+        if self._router is not None:
+            return self._router
+        if self._client is not None:
+            client = self._client
+            config = {"openai": Provider("openai", None, stream_usage=True)}
+            return LLMRouter(["openai"], clients=lambda name: client, provider_configs=lambda: config, hedge_after_ms=0)
+        return llm_router
     
     async def get_project_context(
         self,
@@ -79,38 +116,58 @@ class ChatService:
     async def stream_chat_response(
         self,
         messages: List[Dict[str, str]],
-        model: str = "gpt-4o-mini"
+        model: Optional[str] = None
     ) -> AsyncGenerator[str, None]:
         """
-        Stream chat response from OpenAI
+        Stream chat response from the fastest LLM provider (see LLMRouter)
         
         Args:
             messages: List of message dicts with role and content
-            model: OpenAI model to use
+            model: Model to use (LLM_MODEL by default, mapped per provider)
             
         Yields:
-            Content chunks as they arrive from OpenAI
+            Content chunks as they arrive from the provider
+
+        Prompt-cache usage of each completed stream is recorded (see
+        prompt_layout.record_prompt_usage).
+
+        If the consumer stops early (client disconnect), the upstream HTTP
+        response is closed so the provider stops generating.
         """
-        if not self.client:
-            raise ValueError("OpenAI API key not configured")
-        
         try:
-            stream = await self.client.chat.completions.create(
+            max_tokens = settings.LLM_MAX_TOKENS
+            stream = await self.router.open_stream(
+                messages,
                 model=model,
-                messages=messages,
-                stream=True,
                 temperature=0.7,
-                max_tokens=2000
+                max_tokens=max_tokens,
+                # Final chunk carries usage, incl. prompt tokens served from cache
+                include_usage=True
             )
             
-            async for chunk in stream:
-                if chunk.choices and len(chunk.choices) > 0:
-                    delta = chunk.choices[0].delta
-                    if delta.content:
-                        yield delta.content
+            received = []
+            try:
+                async for chunk in stream:
+                    if chunk.choices and len(chunk.choices) > 0:
+                        delta = chunk.choices[0].delta
+                        if delta.content:
+                            received.append(delta.content)
+                            yield delta.content
+                    usage = getattr(chunk, "usage", None)
+                    if usage:
+                        record_prompt_usage(usage)
+            except (asyncio.CancelledError, GeneratorExit):
+                with anyio.CancelScope(shield=True):
+                    await stream.aclose()
+                streams_aborted.inc()
+                # A delta may hold several tokens: count what was actually generated
+                received_tokens = count_tokens("".join(received))
+                tokens_saved.inc(max(max_tokens - received_tokens, 0))
+                logger.info(f"Aborted {stream.provider} stream after {received_tokens} tokens")
+                raise
                         
         except Exception as e:
-            logger.error(f"Error streaming from OpenAI: {str(e)}")
+            logger.error(f"Error streaming from LLM provider: {str(e)}")
             raise
     
     def save_message(
@@ -237,7 +294,12 @@ class ChatService:
 chat_service = ChatService()
 
 # Alias for backward compatibility
-async def stream_openai_response(messages: List[Dict[str, str]], model: str = "gpt-4o-mini") -> AsyncGenerator[str, None]:
+async def stream_openai_response(messages: List[Dict[str, str]], model: Optional[str] = None) -> AsyncGenerator[str, None]:
     """Alias for chat_service.stream_chat_response"""
-    async for chunk in chat_service.stream_chat_response(messages, model):
-        yield chunk
+    stream = chat_service.stream_chat_response(messages, model)
+    try:
+        async for chunk in stream:
+            yield chunk
+    finally:
+        # Propagate early close so the upstream request is aborted promptly
+        await stream.aclose()
@@ -0,0 +1,96 @@
+"""Token budget for the conversation history sent with each chat turn"""
+
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import func, select, tuple_
+from sqlalchemy.sql import ColumnElement, Select
+
+from app.config import settings
+from app.models import ChatMessage
+from app.services.token_counter import CHARS_PER_TOKEN, count_tokens
+
+Cursor = Tuple[datetime, UUID]  # (created_at, id) of a chat message
+
+# Context windows (prompt + completion tokens) of the chat models we use
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o": 128000,
+    "gpt-4o-mini": 128000,
+    "gpt-4-turbo": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+}
+DEFAULT_CONTEXT_WINDOW = 8192  # Unknown models get a conservative window
+MESSAGE_OVERHEAD_TOKENS = 4  # Role and delimiters around each chat message
+REPLY_PRIMING_TOKENS = 3  # The assistant turn the model replies in
+
+
+def context_window(model: str) -> int:
+    """Context window of `model`; dated snapshots (gpt-4o-2024-08-06) match their family"""
+    for name in sorted(MODEL_CONTEXT_WINDOWS, key=len, reverse=True):
+        if model == name or model.startswith(f"{name}-"):
+            return MODEL_CONTEXT_WINDOWS[name]
+    return DEFAULT_CONTEXT_WINDOW
+
+
+def history_token_budget(
+    prompt_messages: List[Dict[str, str]],
+    model: Optional[str] = None,
+    max_tokens: Optional[int] = None
+) -> int:
+    """
+    Tokens left for history after the rest of the prompt and the reply.
+
+    `prompt_messages` are the messages sent regardless of history (system
+    prompt, shared context, the new user message). The result is also
+    capped at HISTORY_TOKEN_BUDGET, which bounds cost and time to first
+    token well below large context windows.
+    """
+    model = model or settings.LLM_MODEL
+    max_tokens = settings.LLM_MAX_TOKENS if max_tokens is None else max_tokens
+    reserved = max_tokens + REPLY_PRIMING_TOKENS + sum(
+        count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS for message in prompt_messages
+    )
+    return max(0, min(settings.HISTORY_TOKEN_BUDGET, context_window(model) - reserved))
+
+
+def stored_message_tokens() -> ColumnElement:
+    """Prompt tokens of a chat_messages row: the stored count (or a length estimate) plus overhead"""
+    return func.coalesce(
+        ChatMessage.token_count,
+        (func.length(ChatMessage.content) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    ) + MESSAGE_OVERHEAD_TOKENS
+
+
+def history_window_query(
+    token_budget: int,
+    owner: ColumnElement,
+    after: Optional[Cursor] = None,
+    max_messages: Optional[int] = None
+) -> Select:
+    """
+    The newest messages matching `owner` (and newer than `after`) whose
+    tokens add up to at most `token_budget`, chronologically.
+
+    The running total is a window function over the newest-first scan, so
+    the database stops after HISTORY_MAX_MESSAGES rows and only the rows
+    that fit are returned.
+    """
+    conditions = [owner]
+    if after is not None:
+        conditions.append(tuple_(ChatMessage.created_at, ChatMessage.id) > tuple_(*after))
+    newest_first = (ChatMessage.created_at.desc(), ChatMessage.id.desc())
+    recent = (
+        select(ChatMessage.id, func.sum(stored_message_tokens()).over(order_by=newest_first).label("running_tokens"))
+        .where(*conditions)
+        .order_by(*newest_first)
+        .limit(max_messages or settings.HISTORY_MAX_MESSAGES)
+        .subquery()
+    )
+    return (
+        select(ChatMessage)
+        .join(recent, ChatMessage.id == recent.c.id)
+        .where(recent.c.running_tokens <= token_budget)
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+    )
@@ -1,13 +1,22 @@
 """Context management service for handling prompts and shared context between agents"""
 
 import logging
-from typing import List, Dict, Optional
-from sqlalchemy.orm import Session
+from typing import List, Dict, Optional, Tuple
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
 
-from app.models import Agent, Project, ChatMessage, MessageRole, ContextSource
-from app.services.context_providers import RecencyProvider, RAGProvider, SharedContextProvider
-from app.services.context_providers.rag_provider import EmbeddingService
+from app.models import Project, ChatMessage, ConversationSummary, MessageRole, ContextSource
+from app.services.chat_context import ChatContext, load_chat_context
+from app.services.context_budget import Cursor, history_token_budget, history_window_query
+from app.services.conversation_summarizer import SUMMARY_HEADER, conversation_summarizer
+from app.core.invalidation import invalidation_bus
+from app.services.prompt_cache import system_prompt_cache
+from app.services.prompt_layout import assemble_prompt
+from app.services.shared_context_buffer import FeedEntry, shared_context_buffer
+from app.services.context_providers import HybridProvider, RecencyProvider, RAGProvider, SharedContextProvider
+from app.services.embedding_indexer import IndexJob, embedding_indexer, index_skipped_short, is_indexable
+from app.services.token_counter import count_tokens_async
 
 logger = logging.getLogger(__name__)
 
@@ -15,7 +24,7 @@ logger = logging.getLogger(__name__)
 class ContextManager:
     """Manages context and prompt combining for agents"""
 
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
         self._providers: Dict[ContextSource, SharedContextProvider] = {}
 
@@ -24,7 +33,7 @@ class ContextManager:
         Get or create the appropriate context provider.
         
         Args:
-            context_source: The context source type (RECENT or RAG)
+            context_source: The context source type (RECENT, RAG or HYBRID)
             
         Returns:
             The appropriate SharedContextProvider instance
@@ -32,76 +41,86 @@ class ContextManager:
         if context_source not in self._providers:
             if context_source == ContextSource.RAG:
                 self._providers[context_source] = RAGProvider(self.db)
+            elif context_source == ContextSource.HYBRID:
+                self._providers[context_source] = HybridProvider(self.db)
             else:
                 # Default to recency provider
                 self._providers[context_source] = RecencyProvider(self.db)
         return self._providers[context_source]
 
-    def build_system_prompt(self, agent_id: UUID) -> Optional[str]:
+    async def load_chat_context(self, agent_id: UUID) -> Optional[ChatContext]:
+        """Load the per-turn ChatContext snapshot for an agent (one query)."""
+        return await load_chat_context(self.db, agent_id)
+
+    async def build_system_prompt(
+        self,
+        agent_id: UUID,
+        chat_context: Optional[ChatContext] = None
+    ) -> Optional[str]:
         """
         Build the system prompt by combining project and agent prompts.
         Returns None if neither project nor agent has a prompt.
-        """
-        agent = self.db.query(Agent).filter(Agent.id == agent_id).first()
-        if not agent:
-            return None
-
-        prompt_parts = []
-
-        # If agent is part of a project and project has a prompt
-        if agent.project_id:
-            project = self.db.query(Project).filter(Project.id == agent.project_id).first()
-            if project and project.has_prompt and project.prompt_content:
-                prompt_parts.append(f"PROJECT CONTEXT:\n{project.prompt_content}")
 
-        # If agent has its own prompt
-        if agent.has_prompt and agent.prompt_content:
-            prompt_parts.append(f"AGENT ROLE:\n{agent.prompt_content}")
+        Compiled prompts are served from the in-process cache; a hit issues
+        no queries. With a chat_context, the cached entry must match its
+        agent/project versions.
+        """
+        cached = system_prompt_cache.get(agent_id, chat_context)
+        if cached is not None:
+            return cached.prompt
 
-        # Return combined prompt or None
-        if not prompt_parts:
+        chat_context = chat_context or await self.load_chat_context(agent_id)
+        if not chat_context:
             return None
+        return system_prompt_cache.put(chat_context).prompt
 
-        return "\n\n".join(prompt_parts)
-
-    def get_shared_context(
+    async def get_shared_context(
         self, 
         project_id: UUID, 
         current_agent_id: UUID,
         query: Optional[str] = None,
-        limit: int = 20
+        limit: int = 20,
+        chat_context: Optional[ChatContext] = None
     ) -> Optional[str]:
         """
         Get shared context from other agents in the same project.
         
-        Uses the configured context provider (recency or RAG) based on project settings.
-        The query parameter is used by the RAG provider for semantic search.
+        Uses the configured context provider (recency, RAG or hybrid) based on project settings.
+        The query parameter is used by the RAG and hybrid providers for search.
         
         Args:
             project_id: The project ID
             current_agent_id: The current agent ID (to exclude from results)
             query: Optional query string for semantic search (used by RAG)
             limit: Maximum number of messages/chunks to include
+            chat_context: Snapshot for current_agent_id; avoids reloading the project
             
         Returns:
             Formatted shared context string, or None if unavailable
         """
-        project = self.db.query(Project).filter(Project.id == project_id).first()
-        
+        if chat_context is not None:
+            enable_context_sharing = chat_context.shares_context
+            context_source = chat_context.context_source
+        else:
+            result = await self.db.execute(select(Project).where(Project.id == project_id))
+            project = result.scalars().first()
+            enable_context_sharing = bool(project and project.enable_context_sharing)
+            context_source = project.context_source if project else None
+
         # Gate: If context sharing is disabled, return None
-        if not project or not project.enable_context_sharing:
+        if not enable_context_sharing:
             return None
 
         # Get the appropriate provider based on project settings
-        context_source = project.context_source or ContextSource.RECENT
-        provider = self._get_provider(context_source)
+        provider = self._get_provider(context_source or ContextSource.RECENT)
         
         # Call the provider
-        return provider.get_shared_context(
+        return await provider.get_shared_context(
             project_id=project_id,
             current_agent_id=current_agent_id,
             query=query,
-            limit=limit
+            limit=limit,
+            chat_context=chat_context
         )
 
     def _extract_latest_user_message(self, messages: List[Dict]) -> Optional[str]:
@@ -119,170 +138,271 @@ class ContextManager:
                 return msg.get("content")
         return None
 
-    def format_context_for_llm(
+    async def _prompt_parts(
+        self,
+        agent_id: UUID,
+        query: Optional[str],
+        include_shared_context: bool,
+        chat_context: ChatContext
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        The turn-invariant system messages (system prompt, then the rolling
+        summary of older conversation) and the per-turn shared-context
+        system message, if any. `query` is passed to RAG-based providers.
+        """
+        prefix = []
+        system_prompt = await self.build_system_prompt(agent_id, chat_context)
+        if system_prompt:
+            prefix.append({"role": "system", "content": system_prompt})
+
+        if chat_context.summary:
+            prefix.append({
+                "role": "system",
+                "content": f"{SUMMARY_HEADER}\n{chat_context.summary}"
+            })
+
+        # Add shared context if agent is in project and context sharing is enabled
+        shared = None
+        if include_shared_context and chat_context.project_id:
+            shared_context = await self.get_shared_context(
+                chat_context.project_id,
+                agent_id,
+                query=query,  # Pass query for RAG
+                chat_context=chat_context
+            )
+            if shared_context:
+                shared = {"role": "system", "content": shared_context}
+        return prefix, shared
+
+    async def format_context_for_llm(
         self,
         agent_id: UUID,
         current_messages: List[Dict],
-        include_shared_context: bool = True
+        include_shared_context: bool = True,
+        chat_context: Optional[ChatContext] = None
     ) -> List[Dict]:
         """
         Format complete context for LLM API call.
         Returns a list of message dictionaries ready for OpenAI API.
         
+        The agent's rolling summary of older conversation, if any, follows
+        the system prompt as a compact system message. Shared context is
+        placed according to PROMPT_LAYOUT (see prompt_layout.assemble_prompt).
         Passes the latest user message as the query for RAG-based shared context.
         """
-        formatted_messages = []
+        chat_context = chat_context or await self.load_chat_context(agent_id)
+        if not chat_context:
+            return list(current_messages)
 
-        # Add system prompt if exists
-        system_prompt = self.build_system_prompt(agent_id)
-        if system_prompt:
-            formatted_messages.append({
-                "role": "system",
-                "content": system_prompt
-            })
+        prefix, shared = await self._prompt_parts(
+            agent_id, self._extract_latest_user_message(current_messages), include_shared_context, chat_context
+        )
+        return assemble_prompt(prefix, list(current_messages), shared)
 
-        # Add shared context if agent is in project and context sharing is enabled
-        if include_shared_context:
-            agent = self.db.query(Agent).filter(Agent.id == agent_id).first()
-            if agent and agent.project_id:
-                # Extract latest user message for RAG query
-                query = self._extract_latest_user_message(current_messages)
-                
-                shared_context = self.get_shared_context(
-                    agent.project_id, 
-                    agent_id,
-                    query=query  # Pass query for RAG
-                )
-                if shared_context:
-                    formatted_messages.append({
-                        "role": "system",
-                        "content": shared_context
-                    })
-
-        # Add current conversation messages
-        formatted_messages.extend(current_messages)
-
-        return formatted_messages
-
-    def get_agent_history(
+    async def build_chat_messages(
+        self,
+        message: str,
+        agent_id: Optional[UUID] = None,
+        temp_chat_id: Optional[UUID] = None,
+        chat_context: Optional[ChatContext] = None,
+        model: Optional[str] = None
+    ) -> List[Dict]:
+        """
+        Messages for the LLM call of a new user `message`.
+
+        System prompt and conversation summary (agent chats) come first,
+        then as much recent history as fits the model's token budget after
+        reserving room for them, the shared context, the new message and
+        the reply (see context_budget.history_token_budget), then the new
+        message. Messages already folded into the summary are not repeated.
+
+        With the stable-prefix layout the shared context sits just before
+        the new message, so consecutive turns share a byte-identical prefix
+        up to the previous reply. The history window starts right after the
+        summary cursor while it fits the budget, so the prefix only moves
+        when the summary is updated.
+        """
+        current = {"role": "user", "content": message}
+        prefix, shared = [], None
+        if agent_id:
+            chat_context = chat_context or await self.load_chat_context(agent_id)
+            if chat_context:
+                prefix, shared = await self._prompt_parts(agent_id, message, True, chat_context)
+        reserved = prefix + ([shared] if shared else []) + [current]
+        history = await self.get_history_window(
+            history_token_budget(reserved, model=model),
+            agent_id=agent_id,
+            temp_chat_id=temp_chat_id,
+            after=chat_context.summary_cursor if chat_context else None
+        )
+        conversation = [{"role": msg.role.value, "content": msg.content} for msg in history]
+        return assemble_prompt(prefix, conversation + [current], shared)
+
+    async def get_history_window(
+        self,
+        token_budget: int,
+        agent_id: Optional[UUID] = None,
+        temp_chat_id: Optional[UUID] = None,
+        after: Optional[Cursor] = None,
+        max_messages: Optional[int] = None
+    ) -> List[ChatMessage]:
+        """
+        The newest messages of an agent or temporary chat whose tokens add
+        up to at most `token_budget`, chronologically.
+
+        The running total is computed in the database from the token counts
+        stored at save time, so only the messages that fit are loaded and
+        nothing is re-tokenized. The window is contiguous: it stops at the
+        first message that does not fit. Rows saved without a count are
+        estimated from their length. With `after` (a summary cursor), only
+        messages newer than it are considered.
+        """
+        if token_budget <= 0:
+            return []
+        owner = ChatMessage.agent_id == agent_id if agent_id else ChatMessage.temp_chat_id == temp_chat_id
+        result = await self.db.execute(history_window_query(token_budget, owner, after, max_messages))
+        return list(result.scalars().all())
+
+    async def get_agent_history(
         self,
         agent_id: UUID,
         limit: int = 50,
         offset: int = 0
     ) -> List[ChatMessage]:
         """Get chat history for a specific agent"""
-        messages = (
-            self.db.query(ChatMessage)
-            .filter(ChatMessage.agent_id == agent_id)
+        result = await self.db.execute(
+            select(ChatMessage)
+            .where(ChatMessage.agent_id == agent_id)
             .order_by(ChatMessage.created_at.desc())
             .limit(limit)
             .offset(offset)
-            .all()
         )
+        messages = result.scalars().all()
         return list(reversed(messages))  # Return chronologically
 
-    def get_temp_chat_history(
+    async def get_temp_chat_history(
         self,
         temp_chat_id: UUID,
         limit: int = 50,
         offset: int = 0
     ) -> List[ChatMessage]:
         """Get chat history for a temporary chat"""
-        messages = (
-            self.db.query(ChatMessage)
-            .filter(ChatMessage.temp_chat_id == temp_chat_id)
+        result = await self.db.execute(
+            select(ChatMessage)
+            .where(ChatMessage.temp_chat_id == temp_chat_id)
             .order_by(ChatMessage.created_at.desc())
             .limit(limit)
             .offset(offset)
-            .all()
         )
+        messages = result.scalars().all()
         return list(reversed(messages))  # Return chronologically
 
-    def save_message(
+    async def save_message(
         self,
         user_id: UUID,
         role: MessageRole,
         content: str,
         agent_id: Optional[UUID] = None,
-        temp_chat_id: Optional[UUID] = None
+        temp_chat_id: Optional[UUID] = None,
+        is_truncated: bool = False,
+        chat_context: Optional[ChatContext] = None
     ) -> ChatMessage:
         """
         Save a chat message to database.
         
-        If the message belongs to an agent with RAG-enabled context sharing,
-        the message will also be indexed for semantic search.
+        Agent messages carry their project_id (denormalized for the project
+        activity feed). If the message belongs to an agent with RAG-enabled
+        context sharing, it will also be indexed for semantic search. Pass
+        the turn's chat_context to skip reloading the agent and project.
         """
+        if agent_id and chat_context is None:
+            chat_context = await self.load_chat_context(agent_id)
+
         message = ChatMessage(
             user_id=user_id,
             agent_id=agent_id,
             temp_chat_id=temp_chat_id,
+            project_id=chat_context.project_id if chat_context else None,
             role=role,
-            content=content
+            content=content,
+            is_truncated=is_truncated,
+            token_count=await count_tokens_async(content)
         )
         self.db.add(message)
-        self.db.commit()
-        self.db.refresh(message)
+        await self.db.commit()  # server defaults come back via INSERT ... RETURNING
+
+        if message.project_id:
+            shared_context_buffer.append(
+                message.project_id, FeedEntry.from_message(message, chat_context.agent_name)
+            )
         
         # Trigger RAG indexing if applicable
         if agent_id:
-            self._maybe_index_for_rag(message, agent_id)
+            await self._maybe_index_for_rag(message, agent_id, chat_context)
+            if role == MessageRole.ASSISTANT:
+                # Older messages may have left the history window
+                conversation_summarizer.request(agent_id)
         
         return message
     
-    def _maybe_index_for_rag(self, message: ChatMessage, agent_id: UUID) -> None:
+    async def _maybe_index_for_rag(
+        self,
+        message: ChatMessage,
+        agent_id: UUID,
+        chat_context: Optional[ChatContext] = None
+    ) -> None:
         """
-        Index the message for RAG if the project has RAG context enabled.
+        Queue the message for RAG indexing if the project has RAG context enabled.
         
         Args:
             message: The message to potentially index
             agent_id: The agent ID the message belongs to
+            chat_context: Snapshot for agent_id, loaded if not given
         """
         try:
-            # Get the agent and its project
-            agent = self.db.query(Agent).filter(Agent.id == agent_id).first()
-            if not agent or not agent.project_id:
-                return
-            
-            project = self.db.query(Project).filter(Project.id == agent.project_id).first()
-            if not project:
+            chat_context = chat_context or await self.load_chat_context(agent_id)
+            if not chat_context or not chat_context.project_id:
                 return
             
             # Check if RAG indexing is enabled for this project
-            if not project.enable_context_sharing:
+            if not chat_context.shares_context:
                 return
-            if project.context_source != ContextSource.RAG:
+            if not ContextSource(chat_context.context_source).uses_embeddings:
                 return
             
-            # Index the message
-            embedding_service = EmbeddingService(self.db)
-            embedding_service.index_message(
+            if not is_indexable(message.content):
+                index_skipped_short.inc()
+                return
+            
+            # Queue the message; the background indexer embeds it in a batch
+            await embedding_indexer.enqueue(IndexJob(
                 message_id=message.id,
                 agent_id=agent_id,
-                project_id=project.id,
+                project_id=chat_context.project_id,
                 content=message.content
-            )
-            logger.debug(f"Indexed message {message.id} for RAG")
+            ))
             
         except Exception as e:
             # Don't fail the save operation if indexing fails
             logger.error(f"Error indexing message for RAG: {e}")
 
-    def clear_agent_history(self, agent_id: UUID) -> int:
+    async def clear_agent_history(self, agent_id: UUID) -> int:
         """Clear all messages for an agent. Returns number of deleted messages."""
-        count = (
-            self.db.query(ChatMessage)
-            .filter(ChatMessage.agent_id == agent_id)
-            .delete()
+        result = await self.db.execute(
+            delete(ChatMessage).where(ChatMessage.agent_id == agent_id)
+        )
+        await self.db.execute(
+            delete(ConversationSummary).where(ConversationSummary.agent_id == agent_id)
         )
-        self.db.commit()
-        return count
+        # Cached project feeds may still hold the deleted messages
+        await invalidation_bus.publish_async(self.db, "agent", agent_id)
+        await self.db.commit()
+        return result.rowcount
 
-    def clear_temp_chat_history(self, temp_chat_id: UUID) -> int:
+    async def clear_temp_chat_history(self, temp_chat_id: UUID) -> int:
         """Clear all messages for a temporary chat. Returns number of deleted messages."""
-        count = (
-            self.db.query(ChatMessage)
-            .filter(ChatMessage.temp_chat_id == temp_chat_id)
-            .delete()
+        result = await self.db.execute(
+            delete(ChatMessage).where(ChatMessage.temp_chat_id == temp_chat_id)
         )
-        self.db.commit()
-        return count
+        await self.db.commit()
+        return result.rowcount
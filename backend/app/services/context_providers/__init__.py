@@ -3,10 +3,12 @@
 from app.services.context_providers.base import SharedContextProvider
 from app.services.context_providers.recency_provider import RecencyProvider
 from app.services.context_providers.rag_provider import RAGProvider, EmbeddingService
+from app.services.context_providers.hybrid_provider import HybridProvider
 
 __all__ = [
     "SharedContextProvider",
     "RecencyProvider",
     "RAGProvider",
     "EmbeddingService",
+    "HybridProvider",
 ]
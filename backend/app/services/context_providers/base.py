@@ -1,9 +1,13 @@
 """Base interface for shared context providers"""
 
 from abc import ABC, abstractmethod
-from typing import Optional
+from typing import Dict, Optional
 from uuid import UUID
-from sqlalchemy.orm import Session
+from sqlalchemy import and_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models import Agent
+from app.services.chat_context import ChatContext
 
 
 class SharedContextProvider(ABC):
@@ -13,18 +17,20 @@ class SharedContextProvider(ABC):
     Implementations can retrieve shared context using different strategies:
     - RecencyProvider: Returns the most recent N messages from other agents
     - RAGProvider: Uses semantic search to find relevant context
+    - HybridProvider: Fuses full-text and semantic search results
     """
     
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession):
         self.db = db
     
     @abstractmethod
-    def get_shared_context(
+    async def get_shared_context(
         self,
         project_id: UUID,
         current_agent_id: UUID,
         query: Optional[str] = None,
-        limit: int = 20
+        limit: int = 20,
+        chat_context: Optional[ChatContext] = None
     ) -> Optional[str]:
         """
         Get shared context from other agents in the same project.
@@ -34,8 +40,28 @@ class SharedContextProvider(ABC):
             current_agent_id: The current agent ID (to exclude from results)
             query: Optional query string for semantic search (used by RAG provider)
             limit: Maximum number of messages/chunks to include
+            chat_context: Snapshot for current_agent_id; supplies the other agents without a query
             
         Returns:
             Formatted string containing shared context, or None if no context available
         """
         pass
+
+    async def _get_other_agents(
+        self,
+        project_id: UUID,
+        current_agent_id: UUID,
+        chat_context: Optional[ChatContext] = None
+    ) -> Dict[UUID, str]:
+        """Map of id -> name for the project's other agents, from chat_context when available"""
+        if chat_context is not None:
+            return chat_context.other_agents
+        result = await self.db.execute(
+            select(Agent.id, Agent.name).where(
+                and_(
+                    Agent.project_id == project_id,
+                    Agent.id != current_agent_id
+                )
+            )
+        )
+        return {agent_id: name for agent_id, name in result.all()}
@@ -0,0 +1,211 @@
+"""Hybrid shared context provider: full-text + pgvector search with rank fusion"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+from uuid import UUID
+from sqlalchemy import Text, and_, cast, func, literal_column, select
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.models import ChatMessage
+from app.services.chat_context import ChatContext
+from app.services.context_providers.base import SharedContextProvider
+from app.services.context_providers.rag_provider import RAGProvider
+from app.services.embedding_client import embedding_client
+
+logger = logging.getLogger(__name__)
+
+hybrid_lexical_only = metrics.counter(
+    "hybrid_search_lexical_only_total",
+    "Hybrid searches answered from full-text search alone (embeddings slow or unavailable)"
+)
+hybrid_search_latency = metrics.histogram(
+    "hybrid_search_seconds",
+    "Latency of hybrid shared-context searches, query embedding included"
+)
+
+
+def fulltext_vector():
+    """to_tsvector expression over chat_messages.content; must match the GIN index of migration 011"""
+    config = literal_column(f"'{settings.FULLTEXT_CONFIG}'::regconfig")
+    return func.to_tsvector(config, ChatMessage.content)
+
+
+def fulltext_query(query: str):
+    """
+    tsquery matching any of the query's lexemes.
+
+    plainto_tsquery ANDs every word, which almost never matches a chat
+    question as a whole; OR-ing them and ranking with ts_rank_cd favours
+    messages that contain more (and closer) query terms.
+    """
+    config = literal_column(f"'{settings.FULLTEXT_CONFIG}'::regconfig")
+    return func.to_tsquery(
+        config, func.replace(cast(func.plainto_tsquery(config, query), Text), "&", "|")
+    )
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[UUID]], k: int) -> List[Tuple[UUID, float]]:
+    """
+    Fuse ranked lists: score(d) = sum of 1 / (k + rank of d), ranks from 1.
+
+    Only positions matter, so the full-text and cosine scores, which are on
+    unrelated scales, never need normalizing. Ties keep first-seen order.
+    """
+    scores: Dict[UUID, float] = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class HybridProvider(SharedContextProvider):
+    """
+    Hybrid shared context provider.
+
+    Runs a Postgres full-text search over chat_messages while the query
+    embedding is being fetched, then a pgvector search (see RAGProvider),
+    and merges both candidate lists with reciprocal-rank fusion.
+
+    If the embedding does not arrive within HYBRID_EMBEDDING_TIMEOUT_SECONDS
+    the answer comes from full-text search alone; the embedding call keeps
+    running so the next identical query finds it cached. After an
+    embeddings API error, searches skip embeddings for
+    HYBRID_EMBEDDING_COOLDOWN_SECONDS.
+    """
+
+    # Per process: providers are created per request
+    _embeddings_down_until = 0.0
+
+    def __init__(self, db):
+        super().__init__(db)
+        self._vector = RAGProvider(db)
+
+    async def get_shared_context(
+        self,
+        project_id: UUID,
+        current_agent_id: UUID,
+        query: Optional[str] = None,
+        limit: int = 10,
+        chat_context: Optional[ChatContext] = None
+    ) -> Optional[str]:
+        """
+        Get shared context using full-text and semantic search.
+
+        Args:
+            project_id: The project ID to search within
+            current_agent_id: The current agent ID (excluded from results)
+            query: The query string to search for (required)
+            limit: Maximum number of results to return
+            chat_context: Snapshot for current_agent_id; supplies the other agents without a query
+
+        Returns:
+            Formatted string containing relevant context, or None if no results
+        """
+        if not query:
+            logger.debug("No query provided for hybrid search, returning None")
+            return None
+
+        start = time.perf_counter()
+        try:
+            other_agents = await self._get_other_agents(project_id, current_agent_id, chat_context)
+            if not other_agents:
+                return None
+
+            results, semantic_used = await self.search(project_id, list(other_agents), query, limit)
+            if not results:
+                logger.debug(f"No hybrid search results for project {project_id}")
+                return None
+
+            mode = "hybrid search" if semantic_used else "keyword search"
+            context_parts = [f"SHARED CONTEXT FROM OTHER AGENTS IN PROJECT ({mode}):"]
+            for _, agent_id, content in results:
+                context_parts.append(f"[{other_agents.get(agent_id, 'Unknown Agent')}]: {content}")
+            return "\n".join(context_parts)
+
+        except Exception as e:
+            logger.error(f"Error in hybrid search: {e}")
+            return None
+        finally:
+            hybrid_search_latency.observe(time.perf_counter() - start)
+
+    async def search(
+        self,
+        project_id: UUID,
+        agent_ids: List[UUID],
+        query: str,
+        limit: int
+    ) -> Tuple[List[Tuple[UUID, UUID, str]], bool]:
+        """
+        Fused (message id, agent id, content) results, best first, and
+        whether the semantic search contributed.
+        """
+        start = time.perf_counter()
+        embedding_task = self._start_query_embedding(query)
+        candidates = max(settings.HYBRID_CANDIDATES, limit)
+
+        lexical = await self._lexical_search(project_id, agent_ids, query, candidates)
+        contents = {message_id: (agent_id, content) for message_id, agent_id, content in lexical}
+        rankings = [[message_id for message_id, _, _ in lexical]]
+
+        query_embedding = await self._await_embedding(embedding_task, start)
+        if query_embedding is not None:
+            semantic = await self._vector.search(project_id, agent_ids, query_embedding, candidates)
+            for embedding, _ in semantic:
+                contents.setdefault(embedding.message_id, (embedding.agent_id, embedding.content))
+            rankings.append([embedding.message_id for embedding, _ in semantic])
+        else:
+            hybrid_lexical_only.inc()
+
+        fused = reciprocal_rank_fusion(rankings, settings.HYBRID_RRF_K)[:limit]
+        return [(message_id, *contents[message_id]) for message_id, _ in fused], query_embedding is not None
+
+    async def _lexical_search(
+        self,
+        project_id: UUID,
+        agent_ids: List[UUID],
+        query: str,
+        limit: int
+    ) -> List[Tuple[UUID, UUID, str]]:
+        """(message id, agent id, content) of the best full-text matches, best first"""
+        document = fulltext_vector()
+        tsquery = fulltext_query(query)
+        result = await self.db.execute(
+            select(ChatMessage.id, ChatMessage.agent_id, ChatMessage.content)
+            .where(
+                and_(
+                    ChatMessage.project_id == project_id,
+                    ChatMessage.agent_id.in_(agent_ids),
+                    document.op("@@")(tsquery)
+                )
+            )
+            .order_by(func.ts_rank_cd(document, tsquery).desc(), ChatMessage.created_at.desc())
+            .limit(limit)
+        )
+        return [tuple(row) for row in result.all()]
+
+    def _start_query_embedding(self, query: str) -> Optional[asyncio.Task]:
+        if time.monotonic() < HybridProvider._embeddings_down_until:
+            return None
+        task = asyncio.create_task(embedding_client.embed_query(query))
+        # Retrieve the outcome even if nobody awaits it (timeout, lexical error)
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _await_embedding(self, task: Optional[asyncio.Task], start: float) -> Optional[List[float]]:
+        """The query embedding, or None if it is unavailable or over the time budget"""
+        if task is None:
+            return None
+        remaining = settings.HYBRID_EMBEDDING_TIMEOUT_SECONDS - (time.perf_counter() - start)
+        try:
+            # Shielded: a late embedding still lands in the query cache
+            return await asyncio.wait_for(asyncio.shield(task), max(remaining, 0))
+        except asyncio.TimeoutError:
+            logger.warning("Query embedding too slow; using full-text search only")
+            return None
+        except Exception as e:
+            HybridProvider._embeddings_down_until = time.monotonic() + settings.HYBRID_EMBEDDING_COOLDOWN_SECONDS
+            logger.warning(f"Query embedding failed ({e}); using full-text search only")
+            return None
@@ -1,41 +1,122 @@
-"""RAG-based shared context provider using pgvector"""
+"""RAG-based shared context provider over a pluggable vector store"""
 
 import logging
-from typing import Optional, List
+from dataclasses import dataclass
+from typing import Optional, List, Sequence, Tuple
 from uuid import UUID
-from sqlalchemy import and_
-
-from openai import OpenAI
+import numpy as np
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.services.chat_context import ChatContext
 from app.services.context_providers.base import SharedContextProvider
-from app.models import Agent, MessageEmbedding
+from app.models import MessageEmbedding
+from app.services.embedding_client import embedding_client
+from app.services.embedding_indexer import IndexJob, embed_jobs
 from app.config import settings
+from app.core.metrics import metrics
+from app.services.token_counter import count_tokens
+from app.services.vector_stores import VectorRecord, VectorStore, vector_store
 
 logger = logging.getLogger(__name__)
 
+rag_chunks_below_cutoff = metrics.counter(
+    "rag_chunks_below_cutoff_total",
+    "RAG candidates dropped for exceeding RAG_MAX_DISTANCE"
+)
+rag_chunks_over_budget = metrics.counter(
+    "rag_chunks_over_budget_total",
+    "Selected RAG chunks left out to stay within RAG_CONTEXT_TOKEN_BUDGET"
+)
+rag_context_tokens = metrics.histogram(
+    "rag_context_tokens",
+    "Tokens of RAG shared context inserted per turn",
+    buckets=(0, 100, 250, 500, 1000, 1500, 2000, 4000, 8000)
+)
+
+
+@dataclass(frozen=True)
+class Chunk:
+    """A search hit considered for the shared context"""
+    agent_id: UUID
+    content: str
+    distance: float  # Cosine distance to the query
+    embedding: Sequence[float]
+
+
+def maximal_marginal_relevance(chunks: Sequence[Chunk], k: int, mmr_lambda: float) -> List[Chunk]:
+    """
+    Pick up to `k` chunks, each maximizing
+    lambda * similarity to the query - (1 - lambda) * max similarity to those already picked.
+
+    Near-duplicates of a chosen chunk score low and give way to chunks that
+    add something new.
+    """
+    if not chunks or k <= 0:
+        return []
+    vectors = np.asarray([chunk.embedding for chunk in chunks], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    relevance = 1.0 - np.asarray([chunk.distance for chunk in chunks], dtype=np.float32)
+    similarity = vectors @ vectors.T
+
+    selected: List[int] = []
+    remaining = list(range(len(chunks)))
+    while remaining and len(selected) < k:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining), dtype=np.float32)
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        selected.append(remaining.pop(int(np.argmax(scores))))
+    return [chunks[i] for i in selected]
+
+
+def select_chunks(
+    chunks: Sequence[Chunk],
+    limit: int,
+    max_distance: Optional[float] = None,
+    mmr_lambda: Optional[float] = None
+) -> List[Chunk]:
+    """Drop matches beyond the distance cutoff, then rerank the rest with MMR"""
+    max_distance = settings.RAG_MAX_DISTANCE if max_distance is None else max_distance
+    mmr_lambda = settings.RAG_MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+    relevant = [chunk for chunk in chunks if chunk.distance <= max_distance]
+    rag_chunks_below_cutoff.inc(len(chunks) - len(relevant))
+    return maximal_marginal_relevance(relevant, limit, mmr_lambda)
+
+
+def fit_to_budget(header: str, lines: Sequence[str], token_budget: int) -> List[str]:
+    """
+    `lines` in order, leaving out any that would push header + lines over
+    `token_budget` tokens.
+    """
+    used = count_tokens(header)
+    kept = []
+    for line in lines:
+        tokens = count_tokens(line) + 1  # newline
+        if used + tokens > token_budget:
+            continue
+        kept.append(line)
+        used += tokens
+    return kept
+
 
 class RAGProvider(SharedContextProvider):
     """
-    RAG-based shared context provider using pgvector.
+    RAG-based shared context provider.
     
     Uses semantic search to find relevant context from other agents
-    in the same project based on the current query.
+    in the same project based on the current query. Searches run in
+    `store` (the VECTOR_STORE_BACKEND store by default).
     """
     
-    def __init__(self, db):
+    def __init__(self, db: AsyncSession, store: Optional[VectorStore] = None):
         super().__init__(db)
-        self._openai_client = None
-    
-    @property
-    def openai_client(self) -> OpenAI:
-        """Lazy-load OpenAI client"""
-        if self._openai_client is None:
-            self._openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        return self._openai_client
+        self.store = vector_store if store is None else store
     
-    def _get_embedding(self, text: str) -> List[float]:
+    async def _get_embedding(self, text: str) -> List[float]:
         """
-        Get embedding for text using OpenAI API.
+        Get the query embedding (cached per normalized query and model).
         
         Args:
             text: The text to embed
@@ -43,31 +124,39 @@ class RAGProvider(SharedContextProvider):
         Returns:
             List of floats representing the embedding vector
         """
-        try:
-            response = self.openai_client.embeddings.create(
-                model=settings.OPENAI_EMBEDDING_MODEL,
-                input=text
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            logger.error(f"Error getting embedding: {e}")
-            raise
+        return await embedding_client.embed_query(text)
     
-    def get_shared_context(
+    async def search(
+        self,
+        project_id: UUID,
+        agent_ids: List[UUID],
+        query_embedding: List[float],
+        limit: int
+    ) -> List[Tuple[VectorRecord, float]]:
+        """Nearest stored embeddings of `agent_ids` in the project, closest first, with distances"""
+        return await self.store.search(self.db, project_id, agent_ids, query_embedding, limit)
+
+    async def get_shared_context(
         self,
         project_id: UUID,
         current_agent_id: UUID,
         query: Optional[str] = None,
-        limit: int = 10  # Default to 10 for RAG (semantic chunks)
+        limit: int = 10,  # Default to 10 for RAG (semantic chunks)
+        chat_context: Optional[ChatContext] = None
     ) -> Optional[str]:
         """
         Get shared context using semantic search.
         
+        The nearest RAG_CANDIDATES chunks are cut off at RAG_MAX_DISTANCE,
+        reranked with MMR down to `limit`, and formatted within
+        RAG_CONTEXT_TOKEN_BUDGET tokens.
+        
         Args:
             project_id: The project ID to search within
             current_agent_id: The current agent ID (to optionally exclude)
             query: The query string to search for (required for RAG)
-            limit: Maximum number of results to return
+            limit: Maximum number of chunks to include
+            chat_context: Snapshot for current_agent_id; supplies the other agents without a query
             
         Returns:
             Formatted string containing relevant context, or None if no results
@@ -78,50 +167,43 @@ class RAGProvider(SharedContextProvider):
         
         try:
             # Get query embedding
-            query_embedding = self._get_embedding(query)
+            query_embedding = await self._get_embedding(query)
             
             # Get other agents in the project (for filtering and labeling)
-            other_agents = self.db.query(Agent).filter(
-                and_(
-                    Agent.project_id == project_id,
-                    Agent.id != current_agent_id
-                )
-            ).all()
+            other_agents = await self._get_other_agents(project_id, current_agent_id, chat_context)
             
             if not other_agents:
                 return None
             
-            other_agent_ids = [agent.id for agent in other_agents]
-            
-            # Search for similar embeddings using pgvector
-            # Using cosine distance (<=>), lower is more similar
-            similar_embeddings = (
-                self.db.query(MessageEmbedding)
-                .filter(
-                    and_(
-                        MessageEmbedding.project_id == project_id,
-                        MessageEmbedding.agent_id.in_(other_agent_ids)
-                    )
-                )
-                .order_by(MessageEmbedding.embedding.cosine_distance(query_embedding))
-                .limit(limit)
-                .all()
+            candidates = max(settings.RAG_CANDIDATES, limit)
+            rows = await self.search(project_id, list(other_agents), query_embedding, candidates)
+            chunks = select_chunks(
+                [Chunk(emb.agent_id, emb.content, distance, emb.embedding) for emb, distance in rows],
+                limit
             )
             
-            if not similar_embeddings:
-                logger.debug(f"No embeddings found for project {project_id}")
+            if not chunks:
+                logger.debug(f"No embeddings within distance {settings.RAG_MAX_DISTANCE} for project {project_id}")
                 return None
             
-            # Format results as context
-            context_parts = ["SHARED CONTEXT FROM OTHER AGENTS IN PROJECT (semantic search):"]
+            # Format results as context, most relevant first
+            header = "SHARED CONTEXT FROM OTHER AGENTS IN PROJECT (semantic search):"
+            lines = []
+            for chunk in chunks:
+                agent_name = other_agents.get(chunk.agent_id, "Unknown Agent")
+                logger.debug(f"RAG chunk distance={chunk.distance:.4f} [{agent_name}]: {chunk.content[:80]!r}")
+                if settings.RAG_DEBUG_DISTANCES:
+                    lines.append(f"[{agent_name}] (distance {chunk.distance:.3f}): {chunk.content}")
+                else:
+                    lines.append(f"[{agent_name}]: {chunk.content}")
             
-            for emb in similar_embeddings:
-                agent = next((a for a in other_agents if a.id == emb.agent_id), None)
-                agent_name = agent.name if agent else "Unknown Agent"
-                # Include full content (already stored in the embedding record)
-                context_parts.append(f"[{agent_name}]: {emb.content}")
-            
-            return "\n".join(context_parts)
+            kept = fit_to_budget(header, lines, settings.RAG_CONTEXT_TOKEN_BUDGET)
+            rag_chunks_over_budget.inc(len(lines) - len(kept))
+            if not kept:
+                return None
+            context = "\n".join([header] + kept)
+            rag_context_tokens.observe(count_tokens(context))
+            return context
             
         except Exception as e:
             logger.error(f"Error in RAG search: {e}")
@@ -136,30 +218,11 @@ class EmbeddingService:
     Used to index messages into the vector store.
     """
     
-    def __init__(self, db):
+    def __init__(self, db, store: Optional[VectorStore] = None):
         self.db = db
-        self._openai_client = None
+        self.store = vector_store if store is None else store
     
-    @property
-    def openai_client(self) -> OpenAI:
-        """Lazy-load OpenAI client"""
-        if self._openai_client is None:
-            self._openai_client = OpenAI(api_key=settings.OPENAI_API_KEY)
-        return self._openai_client
-    
-    def _get_embedding(self, text: str) -> List[float]:
-        """Get embedding for text using OpenAI API."""
-        try:
-            response = self.openai_client.embeddings.create(
-                model=settings.OPENAI_EMBEDDING_MODEL,
-                input=text
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            logger.error(f"Error getting embedding: {e}")
-            raise
-    
-    def index_message(
+    async def index_message(
         self,
         message_id: UUID,
         agent_id: UUID,
@@ -169,6 +232,9 @@ class EmbeddingService:
         """
         Index a message by creating its embedding.
         
+        Identical content that is already indexed reuses the stored vector,
+        and messages too short to be useful context are skipped.
+        
         Args:
             message_id: The ID of the message to index
             agent_id: The agent ID this message belongs to
@@ -176,21 +242,26 @@ class EmbeddingService:
             content: The message content to embed
             
         Returns:
-            The created MessageEmbedding, or None on error
+            The created MessageEmbedding, or None if skipped or on error
         """
         try:
             # Check if already indexed
-            existing = (
-                self.db.query(MessageEmbedding)
-                .filter(MessageEmbedding.message_id == message_id)
-                .first()
+            result = await self.db.execute(
+                select(MessageEmbedding)
+                .where(MessageEmbedding.message_id == message_id)
             )
+            existing = result.scalars().first()
             if existing:
                 logger.debug(f"Message {message_id} already indexed")
                 return existing
             
-            # Get embedding
-            embedding = self._get_embedding(content)
+            embedded = await embed_jobs(
+                self.db, embedding_client, [IndexJob(message_id, agent_id, project_id, content)]
+            )
+            if not embedded:
+                logger.debug(f"Message {message_id} too short to index")
+                return None
+            (item,) = embedded
             
             # Create embedding record
             message_embedding = MessageEmbedding(
@@ -198,22 +269,23 @@ class EmbeddingService:
                 message_id=message_id,
                 agent_id=agent_id,
                 content=content,
-                embedding=embedding
+                embedding=item.embedding,
+                content_hash=item.content_hash
             )
             
             self.db.add(message_embedding)
-            self.db.commit()
-            self.db.refresh(message_embedding)
+            await self.db.commit()
+            self.store.added([VectorRecord.from_model(message_embedding)])
             
             logger.debug(f"Indexed message {message_id} for project {project_id}")
             return message_embedding
             
         except Exception as e:
             logger.error(f"Error indexing message {message_id}: {e}")
-            self.db.rollback()
+            await self.db.rollback()
             return None
     
-    def delete_message_embedding(self, message_id: UUID) -> bool:
+    async def delete_message_embedding(self, message_id: UUID) -> bool:
         """
         Delete the embedding for a message.
         
@@ -224,14 +296,14 @@ class EmbeddingService:
             True if deleted, False otherwise
         """
         try:
-            count = (
-                self.db.query(MessageEmbedding)
-                .filter(MessageEmbedding.message_id == message_id)
-                .delete()
+            result = await self.db.execute(
+                delete(MessageEmbedding)
+                .where(MessageEmbedding.message_id == message_id)
             )
-            self.db.commit()
-            return count > 0
+            await self.db.commit()
+            self.store.discard_message(message_id)
+            return result.rowcount > 0
         except Exception as e:
             logger.error(f"Error deleting embedding for message {message_id}: {e}")
-            self.db.rollback()
+            await self.db.rollback()
             return False
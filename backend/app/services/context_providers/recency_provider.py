@@ -1,10 +1,16 @@
 """Recency-based shared context provider"""
 
-from typing import Optional
+from typing import List, Optional
 from uuid import UUID
-from sqlalchemy import and_
+from sqlalchemy import func, select
 
+from app.services.chat_context import ChatContext
 from app.services.context_providers.base import SharedContextProvider
+from app.services.shared_context_buffer import (
+    CONTENT_PREVIEW_CHARS,
+    FeedEntry,
+    shared_context_buffer,
+)
 from app.models import Agent, ChatMessage, MessageRole
 
 
@@ -14,14 +20,18 @@ class RecencyProvider(SharedContextProvider):
     
     Returns the most recent N messages from other agents in the same project.
     This is the original/default implementation for shared context.
+
+    Served from the per-project in-memory feed (zero queries); a project
+    that is not buffered is warmed with one query of its activity feed.
     """
     
-    def get_shared_context(
+    async def get_shared_context(
         self,
         project_id: UUID,
         current_agent_id: UUID,
         query: Optional[str] = None,  # Ignored by recency provider
-        limit: int = 20
+        limit: int = 20,
+        chat_context: Optional[ChatContext] = None
     ) -> Optional[str]:
         """
         Get shared context from other agents based on recency.
@@ -29,37 +39,57 @@ class RecencyProvider(SharedContextProvider):
         Returns the most recent messages from other agents in the project,
         regardless of the query content.
         """
-        # Get other agents in the project
-        other_agents = self.db.query(Agent).filter(
-            and_(
-                Agent.project_id == project_id,
-                Agent.id != current_agent_id
-            )
-        ).all()
-
-        if not other_agents:
-            return None
+        feed = shared_context_buffer.get(project_id)
+        if feed is None:
+            shared_context_buffer.begin_warm(project_id)
+            rows = await self._load_feed(project_id, None, shared_context_buffer.capacity)
+            feed = shared_context_buffer.finish_warm(project_id, rows)
 
-        # Get recent messages from other agents
-        other_agent_ids = [agent.id for agent in other_agents]
-        
-        recent_messages = (
-            self.db.query(ChatMessage)
-            .filter(ChatMessage.agent_id.in_(other_agent_ids))
-            .order_by(ChatMessage.created_at.desc())
-            .limit(limit)
-            .all()
-        )
+        recent_messages = [e for e in feed.entries if e.agent_id != current_agent_id][-limit:]
+        if len(recent_messages) < limit and feed.is_full:
+            # The buffer is dominated by this agent; older messages of others may exist
+            recent_messages = await self._load_feed(project_id, current_agent_id, limit)
 
         if not recent_messages:
             return None
 
         # Format as context summary
         context_parts = ["SHARED CONTEXT FROM OTHER AGENTS IN PROJECT:"]
-        for msg in reversed(recent_messages):  # Show chronologically
-            agent = next((a for a in other_agents if a.id == msg.agent_id), None)
-            agent_name = agent.name if agent else "Unknown Agent"
-            role_label = "User" if msg.role == MessageRole.USER else "Assistant"
-            context_parts.append(f"[{agent_name} - {role_label}]: {msg.content[:200]}")
+        for entry in recent_messages:  # Chronological
+            role_label = "User" if entry.role == MessageRole.USER else "Assistant"
+            context_parts.append(f"[{entry.agent_name} - {role_label}]: {entry.preview}")
 
         return "\n".join(context_parts)
+
+    async def _load_feed(
+        self,
+        project_id: UUID,
+        exclude_agent_id: Optional[UUID],
+        limit: int
+    ) -> List[FeedEntry]:
+        """Newest `limit` feed entries from the database, oldest first"""
+        result = await self.db.execute(self.feed_query(project_id, exclude_agent_id, limit))
+        return [FeedEntry(*row) for row in reversed(result.all())]
+
+    @staticmethod
+    def feed_query(project_id: UUID, exclude_agent_id: Optional[UUID], limit: int):
+        """
+        Newest messages of the project as (id, agent id, agent name, role, preview) rows.
+
+        One range scan of the (project_id, created_at DESC) index, joined to
+        agents for the names.
+        """
+        stmt = (
+            select(
+                ChatMessage.id,
+                ChatMessage.agent_id,
+                Agent.name,
+                ChatMessage.role,
+                func.substr(ChatMessage.content, 1, CONTENT_PREVIEW_CHARS)
+            )
+            .join(Agent, Agent.id == ChatMessage.agent_id)
+            .where(ChatMessage.project_id == project_id)
+        )
+        if exclude_agent_id is not None:
+            stmt = stmt.where(ChatMessage.agent_id != exclude_agent_id)
+        return stmt.order_by(ChatMessage.created_at.desc()).limit(limit)
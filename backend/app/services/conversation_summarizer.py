@@ -0,0 +1,283 @@
+"""Background rolling summaries of agent conversations"""
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, List, Optional
+from uuid import UUID
+
+from sqlalchemy import select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.database import AsyncSessionLocal
+from app.models import ChatMessage, ConversationSummary
+from app.services.chat_service import chat_service
+from app.services.context_budget import Cursor, history_window_query, stored_message_tokens
+from app.services.token_counter import count_tokens_async
+
+logger = logging.getLogger(__name__)
+
+summary_updates = metrics.counter(
+    "conversation_summary_updates_total",
+    "Rolling summaries updated with messages that left the history window"
+)
+summary_messages_folded = metrics.counter(
+    "conversation_summary_messages_folded_total",
+    "Messages folded into rolling summaries"
+)
+summary_failures = metrics.counter(
+    "conversation_summary_failures_total",
+    "Summary updates that failed (retried on the agent's next request)"
+)
+summary_update_seconds = metrics.histogram(
+    "conversation_summary_update_seconds",
+    "Duration of one summary update, LLM call included"
+)
+
+SUMMARY_HEADER = "SUMMARY OF EARLIER CONVERSATION:"
+SUMMARIZER_INSTRUCTIONS = (
+    "You maintain a running summary of a conversation between a user and an AI assistant. "
+    "Merge the new messages into the existing summary. Keep facts, decisions, names, numbers, "
+    "code identifiers, open questions and the user's preferences; drop pleasantries and "
+    "verbatim logs. Reply with the updated summary only, as terse bullet points."
+)
+
+Complete = Callable[[List[Dict[str, str]]], Awaitable[str]]
+
+
+async def complete_with_llm(messages: List[Dict[str, str]]) -> str:
+    """One non-streaming completion with the summary model"""
+    if not chat_service.client:
+        raise ValueError("OpenAI API key not configured")
+    response = await chat_service.client.chat.completions.create(
+        model=settings.SUMMARY_MODEL or settings.LLM_MODEL,
+        messages=messages,
+        temperature=0,
+        max_tokens=settings.SUMMARY_MAX_TOKENS
+    )
+    return (response.choices[0].message.content or "").strip()
+
+
+def summarizer_prompt(summary: Optional[str], messages: List[ChatMessage]) -> List[Dict[str, str]]:
+    clip = settings.SUMMARY_MESSAGE_CHARS
+    lines = []
+    for message in messages:
+        content = message.content if len(message.content) <= clip else message.content[:clip] + " [...]"
+        lines.append(f"[{message.role.value}]: {content}")
+    return [
+        {"role": "system", "content": SUMMARIZER_INSTRUCTIONS},
+        {
+            "role": "user",
+            "content": f"EXISTING SUMMARY:\n{summary or '(none)'}\n\nNEW MESSAGES:\n" + "\n".join(lines)
+        },
+    ]
+
+
+@dataclass
+class SummaryUpdate:
+    """Outcome of one update: messages folded in, and whether more are waiting"""
+    folded: int
+    more: bool
+
+
+async def update_summary(db: AsyncSession, agent_id: UUID, complete: Complete) -> SummaryUpdate:
+    """
+    Fold the agent's messages that have left the history window into its summary.
+
+    The newest SUMMARY_KEEP_RECENT_TOKENS of unsummarized history stay
+    verbatim; up to SUMMARY_BATCH_TOKENS of the messages before them are
+    merged into the summary with one LLM call. The write is a
+    compare-and-set on `version`, so a concurrent update from another
+    worker wins and this one is discarded.
+    """
+    summary = await db.get(ConversationSummary, agent_id)
+    cursor: Optional[Cursor] = summary.cursor if summary else None
+
+    # Oldest message of the part that stays verbatim
+    owner = ChatMessage.agent_id == agent_id
+    result = await db.execute(history_window_query(settings.SUMMARY_KEEP_RECENT_TOKENS, owner, after=cursor))
+    recent = result.scalars().all()
+    if recent:
+        boundary = (recent[0].created_at, recent[0].id)
+    else:
+        # The newest message alone is over the budget: keep just that one
+        result = await db.execute(
+            select(ChatMessage.created_at, ChatMessage.id)
+            .where(owner)
+            .order_by(ChatMessage.created_at.desc(), ChatMessage.id.desc())
+            .limit(1)
+        )
+        boundary = result.first()
+        if boundary is None:
+            return SummaryUpdate(0, False)
+
+    conditions = [owner, tuple_(ChatMessage.created_at, ChatMessage.id) < tuple_(*boundary)]
+    if cursor is not None:
+        conditions.append(tuple_(ChatMessage.created_at, ChatMessage.id) > tuple_(*cursor))
+    result = await db.execute(
+        select(ChatMessage, stored_message_tokens().label("tokens"))
+        .where(*conditions)
+        .order_by(ChatMessage.created_at, ChatMessage.id)
+        .limit(settings.HISTORY_MAX_MESSAGES + 1)
+    )
+    rows = result.all()
+    capped_rows = rows[:settings.HISTORY_MAX_MESSAGES]  # the extra row only tells whether more are waiting
+    batch, used = [], 0
+    for message, tokens in capped_rows:
+        if batch and used + tokens > settings.SUMMARY_BATCH_TOKENS:
+            break
+        batch.append(message)
+        used += tokens
+    if not batch:
+        return SummaryUpdate(0, False)
+    more = len(rows) > settings.HISTORY_MAX_MESSAGES or len(batch) < len(capped_rows)
+    previous_version = summary.version if summary else None
+    prompt = summarizer_prompt(summary.content if summary else None, batch)
+    last = batch[-1]
+    new_cursor = dict(cursor_created_at=last.created_at, cursor_message_id=last.id)
+    await db.commit()  # don't hold a transaction open during the LLM call
+
+    content = await complete(prompt)
+    values = dict(content=content, token_count=await count_tokens_async(content), **new_cursor)
+    if previous_version is None:
+        db.add(ConversationSummary(agent_id=agent_id, summarized_count=len(batch), version=1, **values))
+        try:
+            await db.commit()
+        except IntegrityError:
+            await db.rollback()
+            logger.debug(f"Summary of agent {agent_id} was created concurrently; discarding this one")
+            return SummaryUpdate(0, True)
+    else:
+        result = await db.execute(
+            update(ConversationSummary)
+            .where(
+                ConversationSummary.agent_id == agent_id,
+                ConversationSummary.version == previous_version
+            )
+            .values(
+                summarized_count=ConversationSummary.summarized_count + len(batch),
+                version=previous_version + 1,
+                **values
+            )
+        )
+        await db.commit()
+        if result.rowcount == 0:
+            logger.debug(f"Summary of agent {agent_id} changed concurrently; discarding this update")
+            return SummaryUpdate(0, True)
+    return SummaryUpdate(len(batch), more)
+
+
+class ConversationSummarizer:
+    """
+    Background maintainer of per-agent rolling summaries.
+
+    The chat path only calls `request(agent_id)` after saving a reply,
+    which records the agent as pending and returns immediately. A worker
+    task wakes every `poll_seconds`, takes up to `agents_per_poll` pending
+    agents not updated in the last `min_interval` seconds, and runs
+    `update_summary` for them with at most `concurrency` LLM calls in
+    flight. An agent with more history to fold is requested again, so a
+    long backlog is worked through one rate-limited batch at a time.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        complete: Optional[Complete] = None,
+        min_interval: Optional[float] = None,
+        poll_seconds: Optional[float] = None,
+        agents_per_poll: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.complete = complete or complete_with_llm
+        self.min_interval = settings.SUMMARY_MIN_INTERVAL_SECONDS if min_interval is None else min_interval
+        self.poll_seconds = poll_seconds or settings.SUMMARY_POLL_SECONDS
+        self.agents_per_poll = agents_per_poll or settings.SUMMARY_AGENTS_PER_POLL
+        self.concurrency = concurrency or settings.SUMMARY_CONCURRENCY
+        self._clock = clock
+        self._pending: "OrderedDict[UUID, None]" = OrderedDict()
+        self._last_run: Dict[UUID, float] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def request(self, agent_id: UUID) -> None:
+        """Mark the agent's summary as possibly stale (non-blocking)"""
+        if settings.SUMMARY_ENABLED:
+            self._pending[agent_id] = None
+
+    def due(self) -> List[UUID]:
+        """Take the pending agents that may run now, oldest request first"""
+        now = self._clock()
+        self._last_run = {a: t for a, t in self._last_run.items() if now - t < self.min_interval}
+        due = []
+        for agent_id in list(self._pending):
+            if len(due) == self.agents_per_poll:
+                break
+            if agent_id not in self._last_run:
+                del self._pending[agent_id]
+                due.append(agent_id)
+        return due
+
+    async def run_once(self) -> int:
+        """Update the due agents; returns the number of messages folded in"""
+        due = self.due()
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(agent_id: UUID) -> int:
+            async with semaphore:
+                self._last_run[agent_id] = self._clock()
+                return await self._summarize(agent_id)
+
+        return sum(await asyncio.gather(*(run(agent_id) for agent_id in due)))
+
+    async def _summarize(self, agent_id: UUID) -> int:
+        start = time.perf_counter()
+        try:
+            async with self.session_factory() as db:
+                outcome = await update_summary(db, agent_id, self.complete)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            summary_failures.inc()
+            logger.error(f"Error updating summary of agent {agent_id}: {e}")
+            return 0
+        finally:
+            summary_update_seconds.observe(time.perf_counter() - start)
+        if outcome.folded:
+            summary_updates.inc()
+            summary_messages_folded.inc(outcome.folded)
+        if outcome.more:
+            self.request(agent_id)
+        return outcome.folded
+
+    async def start(self) -> None:
+        if self._task is None and settings.SUMMARY_ENABLED:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.poll_seconds)
+            await self.run_once()
+
+
+conversation_summarizer = ConversationSummarizer()
@@ -0,0 +1,285 @@
+"""
+Resumable job that embeds a project's existing messages for RAG
+
+Run from the command line:
+
+    python -m app.services.embedding_backfill <project_id> [--restart]
+
+It is also started automatically when a project switches to a context source
+that uses embeddings, RAG or hybrid (see `start_backfill`).
+"""
+
+import argparse
+import asyncio
+import logging
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+from uuid import UUID
+
+from sqlalchemy import exists, func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.database import AsyncSessionLocal
+from app.models import ChatMessage, EmbeddingBackfill, MessageEmbedding
+from app.services.embedding_client import EmbeddingClient, embedding_client
+from app.services.embedding_indexer import IndexJob, embed_jobs, indexable_content_length, write_embeddings
+from app.services.openai_clients import openai_clients
+
+logger = logging.getLogger(__name__)
+
+backfill_indexed = metrics.counter(
+    "embedding_backfill_indexed_total",
+    "Historical messages embedded by backfill jobs"
+)
+
+Cursor = Tuple[Optional[datetime], Optional[UUID]]
+
+
+@dataclass(frozen=True)
+class BackfillProgress:
+    """Snapshot of a running backfill"""
+    project_id: UUID
+    indexed: int  # This run
+    total: int  # Un-indexed messages when this run started
+    elapsed: float
+
+    @property
+    def rate(self) -> float:
+        """Messages per second"""
+        return self.indexed / self.elapsed if self.elapsed > 0 else 0.0
+
+    @property
+    def eta_seconds(self) -> Optional[float]:
+        if self.rate == 0:
+            return None
+        return max(0, self.total - self.indexed) / self.rate
+
+    def __str__(self) -> str:
+        eta = f"{self.eta_seconds:.0f}s" if self.eta_seconds is not None else "?"
+        return (
+            f"project {self.project_id}: {self.indexed}/{self.total} messages, "
+            f"{self.rate:.1f} msg/s, ETA {eta}"
+        )
+
+
+def _as_utc(value: datetime) -> datetime:
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class EmbeddingBackfillJob:
+    """
+    Embed every un-indexed message of one project.
+
+    Messages are read in pages with a keyset cursor on (created_at, id), so
+    each page is an index range scan regardless of how far the job has got.
+    Each page is embedded in batches of `batch_size` with at most
+    `concurrency` embeddings calls in flight, bulk-inserted, and then the
+    cursor is checkpointed in `embedding_backfills`; a rerun resumes after
+    the last checkpoint, while a run after a completed one starts over to
+    pick up messages left behind the cursor. Only one worker runs a
+    project's job at a time (the checkpoint row is a lease renewed on every
+    page).
+    """
+
+    def __init__(
+        self,
+        project_id: UUID,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        client: Optional[EmbeddingClient] = None,
+        batch_size: Optional[int] = None,
+        concurrency: Optional[int] = None,
+        max_retries: Optional[int] = None,
+        retry_base_delay: float = 1.0,
+        lease_seconds: Optional[float] = None,
+        on_progress: Optional[Callable[[BackfillProgress], None]] = None
+    ):
+        self.project_id = project_id
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.client = client or embedding_client
+        self.batch_size = batch_size or settings.EMBEDDING_BACKFILL_BATCH_SIZE
+        self.concurrency = concurrency or settings.EMBEDDING_BACKFILL_CONCURRENCY
+        self.max_retries = max_retries if max_retries is not None else settings.EMBEDDING_MAX_RETRIES
+        self.retry_base_delay = retry_base_delay
+        self.lease_seconds = lease_seconds or settings.EMBEDDING_BACKFILL_LEASE_SECONDS
+        self.on_progress = on_progress
+
+    async def run(self, restart: bool = False) -> Optional[BackfillProgress]:
+        """Run to completion; None if another worker holds the job"""
+        cursor = await self._claim(restart)
+        if cursor is False:
+            logger.info(f"Backfill for project {self.project_id} is already running elsewhere")
+            return None
+
+        total = await self._count_remaining(cursor)
+        start = time.perf_counter()
+        indexed = 0
+        progress = BackfillProgress(self.project_id, 0, total, 0.0)
+        semaphore = asyncio.Semaphore(self.concurrency)
+        try:
+            while True:
+                page = await self._next_page(cursor, self.batch_size * self.concurrency)
+                if not page:
+                    break
+                batches = [page[i:i + self.batch_size] for i in range(0, len(page), self.batch_size)]
+                written = await asyncio.gather(*(self._index_batch(batch, semaphore) for batch in batches))
+                last = page[-1]
+                cursor = (last[0], last[1].message_id)
+                indexed += sum(written)
+                backfill_indexed.inc(sum(written))
+                await self._checkpoint(cursor, sum(written))
+
+                progress = BackfillProgress(self.project_id, indexed, total, time.perf_counter() - start)
+                logger.info(f"Embedding backfill: {progress}")
+                if self.on_progress:
+                    self.on_progress(progress)
+        except Exception as e:
+            await self._finish(EmbeddingBackfill.STATUS_FAILED, str(e))
+            raise
+        await self._finish(EmbeddingBackfill.STATUS_COMPLETED)
+        return progress
+
+    async def _claim(self, restart: bool):
+        """Take the lease; returns the resume cursor, or False if someone else holds it"""
+        async with self.session_factory() as db:
+            row = await db.get(EmbeddingBackfill, self.project_id, with_for_update=True)
+            if row is None:
+                db.add(EmbeddingBackfill(project_id=self.project_id, status=EmbeddingBackfill.STATUS_RUNNING))
+                try:
+                    await db.commit()
+                except IntegrityError:
+                    return False
+                return (None, None)
+
+            lease_expired = _as_utc(row.updated_at) < datetime.now(timezone.utc) - timedelta(seconds=self.lease_seconds)
+            if row.status == EmbeddingBackfill.STATUS_RUNNING and not lease_expired:
+                return False
+            if restart or row.status == EmbeddingBackfill.STATUS_COMPLETED:
+                # After a completed run, rescan from the start: messages behind the
+                # cursor that the live indexer skipped (back-pressure, errors) are
+                # found by the NOT EXISTS filter, indexed ones cost an index probe
+                row.cursor_created_at = None
+                row.cursor_message_id = None
+            if restart:
+                row.indexed_count = 0
+            row.status = EmbeddingBackfill.STATUS_RUNNING
+            row.error = None
+            row.finished_at = None
+            row.updated_at = func.now()
+            cursor = (row.cursor_created_at, row.cursor_message_id)
+            await db.commit()
+            return cursor
+
+    def _remaining_filter(self, cursor: Cursor):
+        conditions = [
+            ChatMessage.project_id == self.project_id,
+            ~exists().where(MessageEmbedding.message_id == ChatMessage.id),
+            indexable_content_length(ChatMessage.content) >= settings.EMBEDDING_MIN_CONTENT_CHARS,
+        ]
+        if cursor[0] is not None:
+            conditions.append(tuple_(ChatMessage.created_at, ChatMessage.id) > tuple_(*cursor))
+        return conditions
+
+    async def _count_remaining(self, cursor: Cursor) -> int:
+        async with self.session_factory() as db:
+            result = await db.execute(select(func.count()).select_from(ChatMessage).where(*self._remaining_filter(cursor)))
+            return result.scalar_one()
+
+    async def _next_page(self, cursor: Cursor, size: int) -> List[Tuple[datetime, IndexJob]]:
+        async with self.session_factory() as db:
+            result = await db.execute(
+                select(ChatMessage.created_at, ChatMessage.id, ChatMessage.agent_id, ChatMessage.content)
+                .where(*self._remaining_filter(cursor))
+                .order_by(ChatMessage.created_at, ChatMessage.id)
+                .limit(size)
+            )
+            return [
+                (created_at, IndexJob(message_id, agent_id, self.project_id, content))
+                for created_at, message_id, agent_id, content in result.all()
+            ]
+
+    async def _index_batch(self, batch: List[Tuple[datetime, IndexJob]], semaphore: asyncio.Semaphore) -> int:
+        jobs = [job for _, job in batch]
+        async with semaphore:
+            for attempt in range(self.max_retries + 1):
+                try:
+                    async with self.session_factory() as db:
+                        embedded = await embed_jobs(db, self.client, jobs)
+                        return await write_embeddings(db, embedded)
+                except Exception as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self.retry_base_delay * (2 ** attempt)
+                    logger.warning(f"Backfill batch failed ({e}); retrying in {delay:.1f}s")
+                    await asyncio.sleep(delay)
+        return 0
+
+    async def _checkpoint(self, cursor: Cursor, written: int) -> None:
+        async with self.session_factory() as db:
+            row = await db.get(EmbeddingBackfill, self.project_id)
+            row.cursor_created_at, row.cursor_message_id = cursor
+            row.indexed_count += written
+            row.updated_at = func.now()
+            await db.commit()
+
+    async def _finish(self, status: str, error: Optional[str] = None) -> None:
+        async with self.session_factory() as db:
+            row = await db.get(EmbeddingBackfill, self.project_id)
+            if row is None:
+                return
+            row.status = status
+            row.error = error
+            row.finished_at = func.now()
+            await db.commit()
+
+
+_running: Dict[UUID, asyncio.Task] = {}
+
+
+async def start_backfill(project_id: UUID) -> asyncio.Task:
+    """Run the backfill for a project in a background task (once per process)"""
+    task = _running.get(project_id)
+    if task is not None and not task.done():
+        return task
+
+    async def run():
+        try:
+            await EmbeddingBackfillJob(project_id).run()
+        except Exception:
+            logger.exception(f"Embedding backfill for project {project_id} failed")
+        finally:
+            _running.pop(project_id, None)
+
+    task = asyncio.create_task(run())
+    _running[project_id] = task
+    return task
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Embed a project's existing messages for RAG")
+    parser.add_argument("project_id", type=UUID)
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and rescan from the start")
+    parser.add_argument("--batch-size", type=int, default=None)
+    parser.add_argument("--concurrency", type=int, default=None)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+
+    async def run():
+        job = EmbeddingBackfillJob(args.project_id, batch_size=args.batch_size, concurrency=args.concurrency)
+        try:
+            progress = await job.run(restart=args.restart)
+        finally:
+            await openai_clients.aclose()
+        if progress is None:
+            raise SystemExit("Backfill already running in another worker")
+        print(f"Done: {progress}")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,242 @@
+"""Process-wide async embeddings client with a query-embedding cache"""
+
+import asyncio
+import hashlib
+import logging
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.services.openai_clients import openai_clients
+
+logger = logging.getLogger(__name__)
+
+embedding_cache_hits = metrics.counter(
+    "embedding_cache_hits_total",
+    "Query embeddings served from the in-process cache"
+)
+embedding_cache_misses = metrics.counter(
+    "embedding_cache_misses_total",
+    "Query embeddings that required an embeddings API call"
+)
+embedding_latency = metrics.histogram(
+    "embedding_request_seconds",
+    "Latency of embeddings API calls"
+)
+embedding_batch_size = metrics.histogram(
+    "embedding_request_inputs",
+    "Inputs per embeddings API call",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 2048)
+)
+
+
+def normalize_query(text: str) -> str:
+    """Canonical form used for cache keys: NFKC, case-folded, whitespace collapsed"""
+    return " ".join(unicodedata.normalize("NFKC", text).casefold().split())
+
+
+def supports_dimensions(model: str) -> bool:
+    """Whether the model accepts the `dimensions` request parameter"""
+    return model.startswith("text-embedding-3")
+
+
+def cache_key(text: str, model: str) -> str:
+    return hashlib.sha256(f"{model}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+def content_hash(text: str, model: str, dimensions: int) -> str:
+    """Key of a stored document embedding: identical normalized text under one model version"""
+    return hashlib.sha256(f"{model}\0{dimensions}\0{normalize_query(text)}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """Bounded LRU of embeddings whose entries expire after `ttl_seconds`"""
+
+    def __init__(
+        self,
+        max_entries: int,
+        ttl_seconds: float,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, List[float]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[List[float]]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, embedding = item
+            if expires_at <= self._clock():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return embedding
+
+    def put(self, key: str, embedding: List[float]) -> None:
+        with self._lock:
+            self._entries[key] = (self._clock() + self.ttl_seconds, embedding)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class EmbeddingClient:
+    """
+    Shared AsyncOpenAI embeddings client.
+
+    `embed_query` is for retrieval queries: results are cached by a hash of
+    the normalized text and the model, and concurrent requests for the same
+    query share one API call. `embed_many` is for indexing documents and is
+    never cached.
+
+    Models that support it are asked for `dimensions`-long vectors, so
+    stored and query embeddings always match the column size.
+    """
+
+    def __init__(
+        self,
+        model: Optional[str] = None,
+        client: Optional[AsyncOpenAI] = None,
+        cache: Optional[EmbeddingCache] = None,
+        dimensions: Optional[int] = None
+    ):
+        self.model = model or settings.OPENAI_EMBEDDING_MODEL
+        self.dimensions = dimensions or settings.EMBEDDING_DIMENSION
+        self._client = client
+        self.cache = cache or EmbeddingCache(
+            settings.EMBEDDING_CACHE_SIZE, settings.EMBEDDING_CACHE_TTL_SECONDS
+        )
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def content_hash(self, text: str) -> str:
+        return content_hash(text, self.model, self.dimensions)
+
+    @property
+    def client(self) -> AsyncOpenAI:
+        """The process-wide OpenAI client unless one was given"""
+        return self._client if self._client is not None else openai_clients.require()
+
+    async def embed_query(self, text: str) -> List[float]:
+        """Embedding for a search query, from cache when possible"""
+        key = cache_key(text, self.model)
+        cached = self.cache.get(key)
+        if cached is not None:
+            embedding_cache_hits.inc()
+            return cached
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            embedding_cache_hits.inc()
+            return await asyncio.shield(inflight)
+
+        embedding_cache_misses.inc()
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            (embedding,) = await self.embed_many([text])
+            self.cache.put(key, embedding)
+            future.set_result(embedding)
+            return embedding
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else is waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        """Embeddings for `texts`, in order, with one API call"""
+        start = time.perf_counter()
+        try:
+            kwargs = {}
+            if supports_dimensions(self.model):
+                # Passed through extra_body: the pinned SDK predates the `dimensions` argument
+                kwargs["extra_body"] = {"dimensions": self.dimensions}
+            response = await self.client.embeddings.create(model=self.model, input=list(texts), **kwargs)
+        except Exception as e:
+            logger.error(f"Error getting embeddings: {e}")
+            raise
+        finally:
+            embedding_latency.observe(time.perf_counter() - start)
+        embedding_batch_size.observe(len(texts))
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+class LocalEmbedder:
+    """
+    Deterministic offline stand-in for EmbeddingClient.
+
+    Each normalized word and character trigram is hashed to a signed bucket
+    of a `dimensions`-long vector, which is then L2-normalized: texts that
+    share vocabulary get small cosine distances. No network and no model,
+    and identical across processes, so the whole RAG pipeline can run in
+    tests and offline benchmarks. Not a substitute for real embeddings'
+    retrieval quality.
+    """
+
+    model = "local-feature-hashing-v1"
+    TRIGRAM_WEIGHT = 0.5
+
+    def __init__(self, dimensions: Optional[int] = None):
+        self.dimensions = dimensions or settings.EMBEDDING_DIMENSION
+
+    def content_hash(self, text: str) -> str:
+        return content_hash(text, self.model, self.dimensions)
+
+    def embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in re.findall(r"\w+", normalize_query(text)):
+            self._add_feature(vector, word, 1.0)
+            padded = f"<{word}>"
+            for i in range(len(padded) - 2):
+                self._add_feature(vector, padded[i:i + 3], self.TRIGRAM_WEIGHT)
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector /= norm
+        return vector.tolist()
+
+    def _add_feature(self, vector: np.ndarray, feature: str, weight: float) -> None:
+        digest = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+        vector[digest % self.dimensions] += weight if digest >> 63 else -weight
+
+    async def embed_query(self, text: str) -> List[float]:
+        return self.embed(text)
+
+    async def embed_many(self, texts: Sequence[str]) -> List[List[float]]:
+        embedding_batch_size.observe(len(texts))
+        return [self.embed(text) for text in texts]
+
+
+def create_embedding_client(backend: Optional[str] = None):
+    """Embeddings client for EMBEDDING_BACKEND (openai | local)"""
+    backend = backend or settings.EMBEDDING_BACKEND
+    if backend == "openai":
+        return EmbeddingClient()
+    if backend == "local":
+        return LocalEmbedder()
+    raise ValueError(f"Unknown embedding backend: {backend}")
+
+
+embedding_client = create_embedding_client()
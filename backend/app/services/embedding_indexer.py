@@ -0,0 +1,344 @@
+"""Background queue that embeds saved chat messages in batches"""
+
+import asyncio
+import logging
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.database import AsyncSessionLocal
+from app.models import ChatMessage, MessageEmbedding
+from app.services.embedding_client import EmbeddingClient, embedding_client
+from app.services.vector_stores import VectorRecord, vector_store
+
+logger = logging.getLogger(__name__)
+
+index_enqueued = metrics.counter(
+    "embedding_index_enqueued_total",
+    "Messages queued for background embedding"
+)
+index_dropped = metrics.counter(
+    "embedding_index_dropped_total",
+    "Messages not queued because the indexing queue stayed full (left for the backfill job)"
+)
+index_written = metrics.counter(
+    "embedding_index_written_total",
+    "Message embeddings written by the background indexer"
+)
+index_failed = metrics.counter(
+    "embedding_index_failed_total",
+    "Messages given up on after all retries"
+)
+index_batch_seconds = metrics.histogram(
+    "embedding_index_batch_seconds",
+    "Time to embed and store one batch, retries included"
+)
+index_skipped_short = metrics.counter(
+    "embedding_index_skipped_short_total",
+    "Messages not indexed because they are shorter than EMBEDDING_MIN_CONTENT_CHARS"
+)
+dedup_hits = metrics.counter(
+    "embedding_dedup_hits_total",
+    "Messages indexed with the vector of identical content (embedding inputs saved)"
+)
+dedup_misses = metrics.counter(
+    "embedding_dedup_misses_total",
+    "Messages whose content had to be sent to the embeddings API"
+)
+dedup_calls_saved = metrics.counter(
+    "embedding_dedup_calls_saved_total",
+    "Embeddings API calls avoided because every message in the batch was a duplicate"
+)
+
+
+@dataclass(frozen=True)
+class IndexJob:
+    """A saved message waiting to be embedded"""
+    message_id: uuid.UUID
+    agent_id: uuid.UUID
+    project_id: uuid.UUID
+    content: str
+
+
+@dataclass(frozen=True)
+class EmbeddedJob:
+    """An IndexJob with its vector, ready to write"""
+    job: IndexJob
+    embedding: object
+    content_hash: str
+
+
+# Stripped before the length check; the backfill applies the same set in SQL (see indexable_content_length)
+INDEXABLE_STRIP_CHARS = " \t\n\r\f\v"
+
+
+def is_indexable(content: str) -> bool:
+    """Short boilerplate ("thanks", "continue") carries no retrievable context"""
+    return len(content.strip(INDEXABLE_STRIP_CHARS)) >= settings.EMBEDDING_MIN_CONTENT_CHARS
+
+
+def indexable_content_length(content):
+    """SQL expression for the length is_indexable checks (trim(string, characters) in Postgres and SQLite)"""
+    return func.length(func.trim(content, INDEXABLE_STRIP_CHARS))
+
+
+async def find_embeddings(db: AsyncSession, hashes: Sequence[str]) -> Dict[str, object]:
+    """One stored vector per content hash, for the hashes that have one"""
+    if not hashes:
+        return {}
+    query = (
+        select(MessageEmbedding.content_hash, MessageEmbedding.embedding)
+        .where(MessageEmbedding.content_hash.in_(list(hashes)))
+    )
+    if (await db.connection()).dialect.name == "postgresql":
+        query = query.distinct(MessageEmbedding.content_hash)
+    else:
+        query = query.group_by(MessageEmbedding.content_hash)
+    result = await db.execute(query)
+    return {content_hash: embedding for content_hash, embedding in result.all()}
+
+
+async def embed_jobs(db: AsyncSession, client: EmbeddingClient, jobs: List[IndexJob]) -> List[EmbeddedJob]:
+    """
+    Vectors for `jobs`, calling the embeddings API only for new content.
+
+    Messages shorter than EMBEDDING_MIN_CONTENT_CHARS are dropped. Content
+    that is already stored (same normalized text, model and dimensions), or
+    that repeats within the batch, reuses one vector. Ends the read
+    transaction before calling the API.
+    """
+    indexable = [job for job in jobs if is_indexable(job.content)]
+    index_skipped_short.inc(len(jobs) - len(indexable))
+    if not indexable:
+        return []
+
+    hashes = [client.content_hash(job.content) for job in indexable]
+    vectors = await find_embeddings(db, set(hashes))
+    await db.commit()
+
+    missing: Dict[str, str] = {}
+    for job, content_hash in zip(indexable, hashes):
+        if content_hash not in vectors:
+            missing.setdefault(content_hash, job.content)
+    if missing:
+        for content_hash, vector in zip(missing, await client.embed_many(list(missing.values()))):
+            vectors[content_hash] = vector
+    else:
+        dedup_calls_saved.inc()
+    dedup_misses.inc(len(missing))
+    dedup_hits.inc(len(indexable) - len(missing))
+
+    return [
+        EmbeddedJob(job, vectors[content_hash], content_hash)
+        for job, content_hash in zip(indexable, hashes)
+    ]
+
+
+def upsert_embeddings_statement(dialect_name: str):
+    """INSERT into message_embeddings that skips messages which are already indexed"""
+    table = MessageEmbedding.__table__
+    if dialect_name == "postgresql":
+        return pg_insert(table).on_conflict_do_nothing(index_elements=["message_id"])
+    if dialect_name == "sqlite":
+        return sqlite_insert(table).on_conflict_do_nothing(index_elements=["message_id"])
+    return table.insert()
+
+
+async def write_embeddings(db: AsyncSession, embedded: List[EmbeddedJob]) -> int:
+    """
+    Bulk-insert embeddings in one statement and commit.
+
+    Messages deleted since they were queued are skipped. Returns the number
+    of rows sent to the database. The vector store is told about the new
+    rows after the commit.
+    """
+    if not embedded:
+        return 0
+    rows = [
+        {
+            "id": uuid.uuid4(),
+            "project_id": item.job.project_id,
+            "message_id": item.job.message_id,
+            "agent_id": item.job.agent_id,
+            "content": item.job.content,
+            "embedding": item.embedding,
+            "content_hash": item.content_hash,
+        }
+        for item in embedded
+    ]
+    dialect_name = (await db.connection()).dialect.name
+    try:
+        await db.execute(upsert_embeddings_statement(dialect_name), rows)
+        await db.commit()
+    except IntegrityError:
+        # A message was deleted while queued (FK violation): keep the survivors
+        await db.rollback()
+        result = await db.execute(
+            select(ChatMessage.id).where(ChatMessage.id.in_([row["message_id"] for row in rows]))
+        )
+        alive = set(result.scalars().all())
+        rows = [row for row in rows if row["message_id"] in alive]
+        if rows:
+            await db.execute(upsert_embeddings_statement(dialect_name), rows)
+        await db.commit()
+    vector_store.added([
+        VectorRecord(row["message_id"], row["project_id"], row["agent_id"], row["content"], row["embedding"])
+        for row in rows
+    ])
+    return len(rows)
+
+
+class EmbeddingIndexer:
+    """
+    Background indexing queue for RAG-enabled projects.
+
+    The chat path only calls `enqueue`. A worker task collects up to
+    `batch_size` jobs (waiting at most `max_wait_ms` for a batch to fill),
+    embeds the new content among them with one multi-input embeddings call
+    (see `embed_jobs`), and writes them with one bulk insert. Failed batches are retried with exponential backoff.
+
+    The queue is bounded: when it is full, `enqueue` waits briefly and then
+    drops the job rather than slowing the chat response. Dropped messages
+    stay un-indexed until the backfill job picks them up.
+    """
+
+    def __init__(
+        self,
+        session_factory: Optional[Callable[[], AsyncSession]] = None,
+        client: Optional[EmbeddingClient] = None,
+        batch_size: Optional[int] = None,
+        max_wait_ms: Optional[int] = None,
+        queue_size: Optional[int] = None,
+        enqueue_timeout: Optional[float] = None,
+        max_retries: Optional[int] = None,
+        retry_base_delay: float = 0.5
+    ):
+        self.session_factory = session_factory or AsyncSessionLocal
+        self.client = client or embedding_client
+        self.batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else settings.EMBEDDING_BATCH_WAIT_MS) / 1000
+        self.queue_size = queue_size or settings.EMBEDDING_QUEUE_SIZE
+        self.enqueue_timeout = (
+            enqueue_timeout if enqueue_timeout is not None else settings.EMBEDDING_ENQUEUE_TIMEOUT_SECONDS
+        )
+        self.max_retries = max_retries if max_retries is not None else settings.EMBEDDING_MAX_RETRIES
+        self.retry_base_delay = retry_base_delay
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def queue(self) -> asyncio.Queue:
+        """The queue of the running event loop (created on first use)"""
+        loop = asyncio.get_running_loop()
+        if self._queue is None or self._loop is not loop:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._loop = loop
+        return self._queue
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def enqueue(self, job: IndexJob) -> bool:
+        """Queue a message for embedding; False if it was dropped under back-pressure"""
+        try:
+            self.queue.put_nowait(job)
+        except asyncio.QueueFull:
+            try:
+                await asyncio.wait_for(self.queue.put(job), self.enqueue_timeout)
+            except asyncio.TimeoutError:
+                index_dropped.inc()
+                logger.warning(f"Embedding queue full; message {job.message_id} left for backfill")
+                return False
+        index_enqueued.inc()
+        return True
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self, drain_timeout: float = 10.0) -> None:
+        """Stop the worker, first giving queued jobs up to `drain_timeout` seconds"""
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self.queue.join(), drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Stopping embedding indexer with {self.pending} messages still queued")
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        queue = self.queue
+        while True:
+            batch = await self._next_batch(queue)
+            try:
+                await self._index_batch(batch)
+            finally:
+                for _ in batch:
+                    queue.task_done()
+
+    async def _next_batch(self, queue: asyncio.Queue) -> List[IndexJob]:
+        batch = [await queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _index_batch(self, batch: List[IndexJob]) -> None:
+        # A message queued twice is embedded once
+        jobs: Dict[uuid.UUID, IndexJob] = {job.message_id: job for job in batch}
+        start = time.perf_counter()
+        for attempt in range(self.max_retries + 1):
+            try:
+                async with self.session_factory() as db:
+                    unique = await self._not_yet_indexed(db, jobs)
+                    if not unique:
+                        break
+                    embedded = await embed_jobs(db, self.client, unique)
+                    written = await write_embeddings(db, embedded)
+                index_written.inc(written)
+                break
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if attempt == self.max_retries:
+                    index_failed.inc(len(jobs))
+                    logger.error(f"Giving up on embedding batch of {len(jobs)} messages: {e}")
+                    break
+                delay = self.retry_base_delay * (2 ** attempt)
+                logger.warning(f"Embedding batch failed ({e}); retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+        index_batch_seconds.observe(time.perf_counter() - start)
+
+    @staticmethod
+    async def _not_yet_indexed(db: AsyncSession, jobs: Dict[uuid.UUID, IndexJob]) -> List[IndexJob]:
+        """Drop jobs whose message already has an embedding (don't pay to embed it again)"""
+        result = await db.execute(
+            select(MessageEmbedding.message_id).where(MessageEmbedding.message_id.in_(list(jobs)))
+        )
+        done = set(result.scalars().all())
+        return [job for message_id, job in jobs.items() if message_id not in done]
+
+
+embedding_indexer = EmbeddingIndexer()
@@ -10,6 +10,7 @@ from openai import AsyncOpenAI
 
 from app.config import settings
 from app.models import ProjectFile, Project
+from app.services.openai_clients import openai_clients
 
 logger = logging.getLogger(__name__)
 
@@ -39,8 +40,17 @@ def sanitize_filename(filename: str) -> str:
 class FileService:
     """Service for managing file uploads with OpenAI Files API"""
     
-    def __init__(self):
-        self.client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY) if settings.OPENAI_API_KEY else None
+    def __init__(self, client: Optional[AsyncOpenAI] = None):
+        self._client = client
+
+    @property
+    def client(self) -> Optional[AsyncOpenAI]:
+        """The process-wide OpenAI client unless one was given"""
+        return self._client if self._client is not None else openai_clients.get()
+
+    @client.setter
+    def client(self, client: Optional[AsyncOpenAI]) -> None:
+        self._client = client
     
     async def upload_file(
         self,
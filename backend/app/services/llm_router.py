@@ -0,0 +1,270 @@
+"""Routing of chat completions across OpenAI-compatible providers by time to first token"""
+
+import asyncio
+import logging
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+import anyio
+from openai import AsyncOpenAI
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.services.openai_clients import Provider, openai_clients
+
+logger = logging.getLogger(__name__)
+
+time_to_first_token = metrics.histogram(
+    "llm_time_to_first_token_seconds",
+    "Time from sending a chat completion to its first content token (winning provider)"
+)
+provider_failures = metrics.counter(
+    "llm_provider_failures_total",
+    "Chat completions that failed before their first token (and fell over to another provider)"
+)
+hedged_requests = metrics.counter(
+    "llm_hedged_requests_total",
+    "Chat completions also sent to a second provider because the first token was late"
+)
+hedge_wins = metrics.counter(
+    "llm_hedge_wins_total",
+    "Hedged chat completions where the second provider's first token came first"
+)
+hedge_losers_cancelled = metrics.counter(
+    "llm_hedge_losers_cancelled_total",
+    "Provider streams cancelled after another one produced the first token (or the client left)"
+)
+
+
+class LatencyTracker:
+    """
+    Exponentially weighted moving average of each provider's time to first
+    token. Failures count as a LLM_FAILURE_PENALTY_MS sample, so a provider
+    that keeps failing drops to the back until it recovers.
+    """
+
+    def __init__(self, alpha: Optional[float] = None, failure_penalty_ms: Optional[float] = None):
+        self.alpha = alpha or settings.LLM_TTFT_EWMA_ALPHA
+        self.failure_penalty_ms = failure_penalty_ms or settings.LLM_FAILURE_PENALTY_MS
+        self._ewma: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, provider: str, ttft_ms: float) -> None:
+        with self._lock:
+            previous = self._ewma.get(provider)
+            self._ewma[provider] = ttft_ms if previous is None else previous + self.alpha * (ttft_ms - previous)
+
+    def failure(self, provider: str) -> None:
+        self.observe(provider, self.failure_penalty_ms)
+
+    def estimate(self, provider: str) -> Optional[float]:
+        """Moving-average TTFT in ms, or None before the first sample"""
+        return self._ewma.get(provider)
+
+    def ranked(self, providers: List[str]) -> List[str]:
+        """Fastest first; providers without a sample yet come first, in the given order"""
+        order = {name: i for i, name in enumerate(providers)}
+        return sorted(providers, key=lambda name: (name in self._ewma, self._ewma.get(name, 0.0), order[name]))
+
+
+class RoutedStream:
+    """
+    A provider's streamed chat completion whose first content chunk has
+    already been received. Iterate it for all chunks (the buffered ones
+    first); `aclose()` closes the upstream response.
+    """
+
+    def __init__(self, provider: str, stream: Any, iterator: AsyncIterator, buffered: List[Any]):
+        self.provider = provider
+        self.stream = stream
+        self._iterator = iterator
+        self._buffered = buffered
+
+    async def __aiter__(self):
+        while self._buffered:
+            yield self._buffered.pop(0)
+        async for chunk in self._iterator:
+            yield chunk
+
+    async def aclose(self) -> None:
+        await self.stream.response.aclose()
+
+
+def _has_content(chunk: Any) -> bool:
+    return bool(chunk.choices) and bool(chunk.choices[0].delta.content)
+
+
+class LLMRouter:
+    """
+    Sends each chat completion to the provider with the lowest moving-average
+    time to first token (see LatencyTracker).
+
+    With LLM_ROUTER_EXPLORE_RATE a random other provider is tried instead,
+    so estimates of the others stay current. If the first token has not
+    arrived after `hedge_after_ms`, the request is also sent to the next
+    provider; whichever produces a token first is used and the other
+    stream is cancelled, closing its HTTP response so it stops generating.
+    A provider that fails before its first token falls over to the next.
+    """
+
+    def __init__(
+        self,
+        providers: Optional[List[str]] = None,
+        clients: Callable[[str], Optional[AsyncOpenAI]] = openai_clients.get,
+        provider_configs: Optional[Callable[[], Dict[str, Provider]]] = None,
+        tracker: Optional[LatencyTracker] = None,
+        hedge_after_ms: Optional[float] = None,
+        explore_rate: Optional[float] = None,
+        rng: Callable[[], float] = random.random
+    ):
+        self._providers = providers
+        self._clients = clients
+        self._provider_configs = provider_configs or (lambda: openai_clients.providers)
+        self.tracker = tracker or LatencyTracker()
+        self.hedge_after_ms = settings.LLM_HEDGE_AFTER_MS if hedge_after_ms is None else hedge_after_ms
+        self.explore_rate = settings.LLM_ROUTER_EXPLORE_RATE if explore_rate is None else explore_rate
+        self._rng = rng
+
+    @property
+    def providers(self) -> List[str]:
+        """Configured providers that have a client"""
+        names = settings.llm_providers_list if self._providers is None else self._providers
+        return [name for name in names if self._clients(name) is not None]
+
+    def order(self) -> List[str]:
+        """Providers in the order they will be tried"""
+        ranked = self.tracker.ranked(self.providers)
+        if len(ranked) > 1 and self._rng() < self.explore_rate:
+            explored = ranked[1 + min(int(self._rng() * (len(ranked) - 1)), len(ranked) - 2)]
+            ranked.remove(explored)
+            ranked.insert(0, explored)
+        return ranked
+
+    def model_for(self, provider: str, model: str) -> str:
+        config = self._provider_configs().get(provider)
+        return config.model_for(model) if config else model
+
+    def params_for(self, provider: str, params: Dict[str, Any], include_usage: bool) -> Dict[str, Any]:
+        """`params` plus stream_options.include_usage where the provider accepts it"""
+        config = self._provider_configs().get(provider)
+        if not (include_usage and config and config.stream_usage):
+            return params
+        # Passed through extra_body: the pinned SDK predates the `stream_options` argument
+        extra_body = dict(params.get("extra_body") or {}, stream_options={"include_usage": True})
+        return dict(params, extra_body=extra_body)
+
+    async def open_stream(
+        self,
+        messages: List[Dict[str, str]],
+        model: Optional[str] = None,
+        include_usage: bool = False,
+        **params
+    ) -> RoutedStream:
+        """
+        Start a streamed chat completion and wait for its first token.
+
+        `params` are passed to chat.completions.create. With `include_usage`
+        the last chunk carries token usage, from providers that support it
+        (Provider.stream_usage). Raises the last provider error if every
+        provider failed, or ValueError if none is configured.
+        """
+        queue = self.order()
+        if not queue:
+            raise ValueError("No LLM provider configured")
+        model = model or settings.LLM_MODEL
+        primary = queue[0]
+        # With another provider to fall over to, don't spend time on SDK retries
+        retry = len(queue) == 1
+        attempts: Dict[asyncio.Task, str] = {}
+
+        def launch() -> None:
+            name = queue.pop(0)
+            provider_params = self.params_for(name, params, include_usage)
+            attempts[asyncio.create_task(self._first_token(name, messages, model, provider_params, retry))] = name
+
+        launch()
+        deadline = time.monotonic() + self.hedge_after_ms / 1000
+        hedged = False
+        error: Optional[BaseException] = None
+        winner: Optional[RoutedStream] = None
+        try:
+            while attempts:
+                timeout = None
+                if self.hedge_after_ms > 0 and not hedged and queue:
+                    timeout = max(deadline - time.monotonic(), 0)
+                done, _ = await asyncio.wait(attempts, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    hedged = True
+                    hedged_requests.inc()
+                    logger.info(f"No first token from {primary} after {self.hedge_after_ms:g} ms; hedging")
+                    launch()
+                    continue
+                for task in done:
+                    name = attempts.pop(task)
+                    if task.exception() is not None:
+                        error = task.exception()
+                        provider_failures.inc()
+                        self.tracker.failure(name)
+                        logger.warning(f"LLM provider {name} failed before the first token: {error}")
+                    elif winner is None:
+                        winner = task.result()
+                    else:
+                        await task.result().aclose()  # both arrived at once
+                if winner is not None:
+                    if hedged and winner.provider != primary:
+                        hedge_wins.inc()
+                    return winner
+                if not attempts and queue:
+                    launch()  # fall over
+                    deadline = time.monotonic() + self.hedge_after_ms / 1000
+            raise error
+        finally:
+            for task in attempts:
+                if not task.done() and task.cancel():
+                    hedge_losers_cancelled.inc()
+            with anyio.CancelScope(shield=True):
+                # An attempt may have got its first token after the winner
+                # (or the caller's cancellation): close its stream too
+                for result in await asyncio.gather(*attempts, return_exceptions=True):
+                    if isinstance(result, RoutedStream) and result is not winner:
+                        await result.aclose()
+
+    async def _first_token(
+        self,
+        provider: str,
+        messages: List[Dict[str, str]],
+        model: str,
+        params: Dict[str, Any],
+        retry: bool = True
+    ) -> RoutedStream:
+        start = time.perf_counter()
+        client = self._clients(provider)
+        if not retry:
+            client = client.with_options(max_retries=0)
+        stream = await client.chat.completions.create(
+            model=self.model_for(provider, model),
+            messages=messages,
+            stream=True,
+            **params
+        )
+        iterator = stream.__aiter__()
+        buffered = []
+        try:
+            async for chunk in iterator:
+                buffered.append(chunk)
+                if _has_content(chunk):
+                    break
+        except BaseException:
+            # Cancelled (lost the race) or failed: stop the upstream generation
+            with anyio.CancelScope(shield=True):
+                await stream.response.aclose()
+            raise
+        elapsed = time.perf_counter() - start
+        self.tracker.observe(provider, elapsed * 1000)
+        time_to_first_token.observe(elapsed)
+        return RoutedStream(provider, stream, iterator, buffered)
+
+
+llm_router = LLMRouter()
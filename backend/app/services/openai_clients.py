@@ -0,0 +1,197 @@
+"""Process-wide AsyncOpenAI clients sharing tuned, pre-warmed connection pools"""
+
+import asyncio
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional
+
+import httpx
+from openai import AsyncOpenAI
+
+from app.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+http_requests = metrics.counter(
+    "openai_http_requests_total",
+    "HTTP requests sent to LLM / embeddings providers"
+)
+connections_opened = metrics.counter(
+    "openai_connections_opened_total",
+    "TCP connections opened to LLM / embeddings providers (requests minus these reused a pooled connection)"
+)
+tls_handshakes = metrics.counter(
+    "openai_tls_handshakes_total",
+    "TLS handshakes with LLM / embeddings providers"
+)
+
+OPENROUTER_BASE_URL = "https://openrouter.ai/api/v1"
+
+
+@dataclass(frozen=True)
+class Provider:
+    """An OpenAI-compatible API endpoint"""
+    name: str
+    api_key: Optional[str]
+    base_url: Optional[str] = None  # None: the SDK default (api.openai.com)
+    model: Optional[str] = None  # Serves every request with this model
+    model_prefix: str = ""  # Namespace for bare model names, e.g. "openai/"
+    stream_usage: bool = False  # Accepts stream_options.include_usage (usage in the last streamed chunk)
+
+    def model_for(self, model: str) -> str:
+        """This provider's name for `model`"""
+        if self.model:
+            return self.model
+        return model if "/" in model else self.model_prefix + model
+
+
+def configured_providers() -> Dict[str, Provider]:
+    return {
+        "openai": Provider("openai", settings.OPENAI_API_KEY, settings.OPENAI_BASE_URL, stream_usage=True),
+        "openrouter": Provider(
+            "openrouter", settings.OPENROUTER_API_KEY, OPENROUTER_BASE_URL,
+            model=settings.OPENROUTER_MODEL, model_prefix="openai/", stream_usage=True
+        ),
+        "compatible": Provider(
+            "compatible",
+            # Self-hosted servers often need no key, but the SDK requires one
+            settings.LLM_COMPATIBLE_API_KEY or ("unused" if settings.LLM_COMPATIBLE_BASE_URL else None),
+            settings.LLM_COMPATIBLE_BASE_URL,
+            model=settings.LLM_COMPATIBLE_MODEL,
+            stream_usage=settings.LLM_COMPATIBLE_STREAM_USAGE
+        ),
+    }
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401  (installed with httpx[http2])
+    except ImportError:
+        return False
+    return True
+
+
+async def _trace(event: str, info: Dict) -> None:
+    if event == "connection.connect_tcp.complete":
+        connections_opened.inc()
+    elif event == "connection.start_tls.complete":
+        tls_handshakes.inc()
+
+
+async def _count_request(request: httpx.Request) -> None:
+    http_requests.inc()
+    request.extensions["trace"] = _trace
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """
+    httpx client with limits suited to long-lived LLM streams.
+
+    The SDK default drops idle connections after 5 s, so most chat turns
+    paid for a new TCP + TLS handshake; here pooled connections stay open
+    for OPENAI_KEEPALIVE_SECONDS. Waiting for a free connection is capped
+    at OPENAI_POOL_TIMEOUT_SECONDS instead of 10 minutes, and the read
+    timeout applies between streamed chunks, not to the whole reply.
+    """
+    http2 = settings.OPENAI_HTTP2 and http2_available()
+    if settings.OPENAI_HTTP2 and not http2:
+        logger.warning("OPENAI_HTTP2 is set but h2 is not installed; using HTTP/1.1")
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=settings.OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=settings.OPENAI_KEEPALIVE_SECONDS
+        ),
+        timeout=request_timeout(),
+        event_hooks={"request": [_count_request]}
+    )
+
+
+def request_timeout() -> httpx.Timeout:
+    return httpx.Timeout(
+        connect=settings.OPENAI_CONNECT_TIMEOUT_SECONDS,
+        read=settings.OPENAI_READ_TIMEOUT_SECONDS,
+        write=settings.OPENAI_WRITE_TIMEOUT_SECONDS,
+        pool=settings.OPENAI_POOL_TIMEOUT_SECONDS
+    )
+
+
+class OpenAIClientRegistry:
+    """
+    One AsyncOpenAI client, and so one connection pool, per provider.
+
+    Chat, summaries, files and embeddings all use the same client, created
+    on first use or by `start()` in the application lifespan, which also
+    pre-opens OPENAI_WARMUP_CONNECTIONS connections so the first requests
+    after a deploy skip the TLS handshake. `aclose()` closes every pool.
+    """
+
+    def __init__(
+        self,
+        providers: Optional[Dict[str, Provider]] = None,
+        http_client_factory: Callable[[], httpx.AsyncClient] = create_http_client
+    ):
+        self._providers = providers
+        self._http_client_factory = http_client_factory
+        self._clients: Dict[str, AsyncOpenAI] = {}
+
+    @property
+    def providers(self) -> Dict[str, Provider]:
+        return configured_providers() if self._providers is None else self._providers
+
+    def get(self, name: str = "openai") -> Optional[AsyncOpenAI]:
+        """The provider's shared client, or None if it has no API key"""
+        client = self._clients.get(name)
+        if client is None:
+            provider = self.providers.get(name)
+            if provider is None or not provider.api_key:
+                return None
+            client = AsyncOpenAI(
+                api_key=provider.api_key,
+                base_url=provider.base_url,
+                timeout=request_timeout(),
+                http_client=self._http_client_factory()
+            )
+            self._clients[name] = client
+        return client
+
+    def require(self, name: str = "openai") -> AsyncOpenAI:
+        client = self.get(name)
+        if client is None:
+            raise ValueError(f"API key for {name} not configured")
+        return client
+
+    async def start(self, warmup_connections: Optional[int] = None) -> None:
+        """Create the clients of all configured providers and warm their pools"""
+        connections = settings.OPENAI_WARMUP_CONNECTIONS if warmup_connections is None else warmup_connections
+        names = [name for name in self.providers if self.get(name) is not None]
+        await asyncio.gather(*(self.warmup(name, connections) for name in names))
+
+    async def warmup(self, name: str, connections: int) -> int:
+        """
+        Open up to `connections` pooled connections to the provider with
+        concurrent `GET /models` requests (free, and authenticated, so a
+        bad key shows up in the startup log). Returns how many succeeded;
+        failures are logged and never block startup.
+        """
+        client = self.get(name)
+        if client is None or connections <= 0:
+            return 0
+        probe = client.with_options(max_retries=0, timeout=settings.OPENAI_CONNECT_TIMEOUT_SECONDS)
+        results = await asyncio.gather(
+            *(probe.models.list() for _ in range(connections)), return_exceptions=True
+        )
+        failures = [r for r in results if isinstance(r, BaseException)]
+        if failures:
+            logger.warning(f"Warming {name} connections: {len(failures)}/{connections} failed: {failures[0]}")
+        return connections - len(failures)
+
+    async def aclose(self) -> None:
+        clients, self._clients = list(self._clients.values()), {}
+        for client in clients:
+            await client.close()
+
+
+openai_clients = OpenAIClientRegistry()
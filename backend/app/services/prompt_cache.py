@@ -0,0 +1,124 @@
+"""In-process LRU cache of compiled system prompts"""
+
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+from uuid import UUID
+
+from app.config import settings
+from app.core.invalidation import FLUSH, Invalidation, invalidation_bus
+from app.core.metrics import metrics
+from app.services.chat_context import ChatContext
+
+prompt_cache_hits = metrics.counter(
+    "system_prompt_cache_hits_total",
+    "System prompts served from the in-process cache"
+)
+prompt_cache_misses = metrics.counter(
+    "system_prompt_cache_misses_total",
+    "System prompts compiled because no current cache entry existed"
+)
+prompt_cache_invalidations = metrics.counter(
+    "system_prompt_cache_invalidations_total",
+    "Cache entries dropped by agent/project updates"
+)
+
+
+@dataclass(frozen=True)
+class CachedPrompt:
+    """A compiled system prompt and the agent/project versions it was built from"""
+    agent_id: UUID
+    project_id: Optional[UUID]
+    agent_version: Optional[datetime]
+    project_version: Optional[datetime]
+    prompt: Optional[str]  # None when neither agent nor project has a prompt
+
+
+class SystemPromptCache:
+    """
+    LRU cache of compiled "PROJECT CONTEXT / AGENT ROLE" prompts keyed by agent id.
+
+    Entries are dropped by agent and project invalidations from the
+    invalidation bus (see `on_invalidation`), which the write routes publish
+    to and which fans out to every worker. Each
+    entry also records the agent and project `updated_at` it was compiled
+    from, so a caller holding a fresher ChatContext never gets a stale prompt.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None):
+        self.max_entries = max_entries if max_entries is not None else settings.SYSTEM_PROMPT_CACHE_SIZE
+        self._entries: "OrderedDict[UUID, CachedPrompt]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, agent_id: UUID, chat_context: Optional[ChatContext] = None) -> Optional[CachedPrompt]:
+        """Return the cached entry, or None on a miss or a version mismatch with chat_context"""
+        with self._lock:
+            entry = self._entries.get(agent_id)
+            if entry is not None and chat_context is not None and (
+                entry.agent_version != chat_context.agent_updated_at
+                or entry.project_id != chat_context.project_id
+                or entry.project_version != chat_context.project_updated_at
+            ):
+                entry = None
+            if entry is None:
+                prompt_cache_misses.inc()
+                return None
+            self._entries.move_to_end(agent_id)
+        prompt_cache_hits.inc()
+        return entry
+
+    def put(self, chat_context: ChatContext) -> CachedPrompt:
+        """Compile the prompt for a snapshot and cache it"""
+        entry = CachedPrompt(
+            agent_id=chat_context.agent_id,
+            project_id=chat_context.project_id,
+            agent_version=chat_context.agent_updated_at,
+            project_version=chat_context.project_updated_at,
+            prompt=chat_context.system_prompt,
+        )
+        with self._lock:
+            self._entries[entry.agent_id] = entry
+            self._entries.move_to_end(entry.agent_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def invalidate_agent(self, agent_id: UUID) -> None:
+        with self._lock:
+            removed = self._entries.pop(agent_id, None)
+        if removed is not None:
+            prompt_cache_invalidations.inc()
+
+    def invalidate_project(self, project_id: UUID) -> None:
+        """Drop the entries of every agent compiled with this project's prompt"""
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry.project_id == project_id]
+            for key in stale:
+                del self._entries[key]
+        if stale:
+            prompt_cache_invalidations.inc(len(stale))
+
+    def clear(self) -> None:
+        with self._lock:
+            count = len(self._entries)
+            self._entries.clear()
+        if count:
+            prompt_cache_invalidations.inc(count)
+
+    def on_invalidation(self, invalidation: Invalidation) -> None:
+        """Invalidation bus subscriber"""
+        if invalidation.kind == FLUSH:
+            self.clear()
+        elif invalidation.kind == "agent":
+            self.invalidate_agent(invalidation.entity_id)
+        elif invalidation.kind == "project":
+            self.invalidate_project(invalidation.entity_id)
+
+
+system_prompt_cache = SystemPromptCache()
+invalidation_bus.subscribe(system_prompt_cache.on_invalidation)
@@ -0,0 +1,90 @@
+"""Prompt message ordering and upstream prompt-cache accounting"""
+
+from typing import Any, Dict, List, Optional
+
+from app.config import settings
+from app.core.metrics import metrics
+
+# Upstream prompt caching (OpenAI and others) reuses the longest previously
+# seen byte-identical prefix of a prompt, in 128-token steps from 1024 tokens.
+# "stable_prefix" orders each turn as
+#
+#   system prompt, summary, history..., shared context, new message
+#
+# so everything up to the newest history message is the previous turn's
+# prompt plus its reply. "classic" puts the shared context, which changes
+# on every turn, right after the system prompt, invalidating the cache for
+# everything behind it.
+STABLE_PREFIX = "stable_prefix"
+CLASSIC = "classic"
+
+prompt_tokens = metrics.counter(
+    "llm_prompt_tokens_total",
+    "Prompt tokens reported by the LLM provider"
+)
+cached_prompt_tokens_total = metrics.counter(
+    "llm_prompt_cached_tokens_total",
+    "Prompt tokens served from the provider's prompt cache (ratio = this / llm_prompt_tokens_total)"
+)
+cached_prompt_ratio = metrics.histogram(
+    "llm_prompt_cached_ratio",
+    "Per-request share of prompt tokens served from the provider's prompt cache",
+    buckets=(0.0, 0.1, 0.25, 0.5, 0.75, 0.9, 1.0)
+)
+
+
+def assemble_prompt(
+    prefix: List[Dict],
+    conversation: List[Dict],
+    shared_context: Optional[Dict] = None,
+    layout: Optional[str] = None
+) -> List[Dict]:
+    """
+    Order the messages of one LLM call.
+
+    `prefix` holds the turn-invariant system messages (system prompt,
+    summary), `conversation` the history followed by the new message, and
+    `shared_context` the per-turn shared-context system message, if any.
+    With the stable-prefix layout the shared context goes right before the
+    new message; with the classic layout right after the prefix.
+    """
+    layout = layout or settings.PROMPT_LAYOUT
+    if shared_context is None:
+        return prefix + conversation
+    if layout == CLASSIC or not conversation:
+        return prefix + [shared_context] + conversation
+    return prefix + conversation[:-1] + [shared_context] + conversation[-1:]
+
+
+def _field(obj: Any, name: str) -> Any:
+    # Older SDK versions surface fields they don't model as plain dicts
+    if obj is None:
+        return None
+    if isinstance(obj, dict):
+        return obj.get(name)
+    return getattr(obj, name, None)
+
+
+def record_prompt_usage(usage: Any) -> Optional[float]:
+    """
+    Record the prompt-cache hit share of one response's `usage`.
+
+    Returns cached / prompt tokens, or None if the usage has no prompt
+    token count.
+    """
+    total = _field(usage, "prompt_tokens")
+    if not total:
+        return None
+    cached = _field(_field(usage, "prompt_tokens_details"), "cached_tokens") or 0
+    prompt_tokens.inc(total)
+    cached_prompt_tokens_total.inc(cached)
+    ratio = cached / total
+    cached_prompt_ratio.observe(ratio)
+    return ratio
+
+
+def cached_token_ratio() -> Optional[float]:
+    """Share of all prompt tokens so far that were served from the prompt cache"""
+    if not prompt_tokens.value:
+        return None
+    return cached_prompt_tokens_total.value / prompt_tokens.value
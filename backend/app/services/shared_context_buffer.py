@@ -0,0 +1,190 @@
+"""Per-project in-memory ring buffers of recent messages for recency shared context"""
+
+import threading
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Iterable, List, Optional
+from uuid import UUID
+
+from app.config import settings
+from app.core.invalidation import FLUSH, Invalidation, invalidation_bus
+from app.core.metrics import metrics
+from app.models import MessageRole
+
+buffer_hits = metrics.counter(
+    "shared_context_buffer_hits_total",
+    "Recency shared context served from the in-memory project buffer"
+)
+buffer_misses = metrics.counter(
+    "shared_context_buffer_misses_total",
+    "Project buffers warmed from the database"
+)
+buffer_evictions = metrics.counter(
+    "shared_context_buffer_evictions_total",
+    "Cold project buffers evicted to stay under the global memory cap"
+)
+
+CONTENT_PREVIEW_CHARS = 200  # Shared context shows this much of each message
+ENTRY_OVERHEAD_BYTES = 200  # Rough per-entry object overhead on top of the strings
+
+
+@dataclass(frozen=True)
+class FeedEntry:
+    """One message preview in a project feed"""
+    message_id: UUID
+    agent_id: UUID
+    agent_name: str
+    role: MessageRole
+    preview: str
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self.preview) + len(self.agent_name) + ENTRY_OVERHEAD_BYTES
+
+    @classmethod
+    def from_message(cls, message, agent_name: str) -> "FeedEntry":
+        return cls(
+            message_id=message.id,
+            agent_id=message.agent_id,
+            agent_name=agent_name,
+            role=message.role,
+            preview=message.content[:CONTENT_PREVIEW_CHARS],
+        )
+
+
+class ProjectFeed:
+    """Newest-last ring buffer of one project's most recent messages"""
+
+    def __init__(self, capacity: int, entries: Iterable[FeedEntry] = ()):
+        self.entries: Deque[FeedEntry] = deque(maxlen=capacity)
+        self.size_bytes = 0
+        for entry in entries:
+            self.append(entry)
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.entries) == self.entries.maxlen
+
+    def append(self, entry: FeedEntry) -> None:
+        if self.is_full:
+            self.size_bytes -= self.entries[0].size_bytes
+        self.entries.append(entry)
+        self.size_bytes += entry.size_bytes
+
+    def has_agent(self, agent_id: UUID) -> bool:
+        return any(entry.agent_id == agent_id for entry in self.entries)
+
+
+class SharedContextBuffer:
+    """
+    Bounded in-memory feeds of the last N messages per project.
+
+    `ContextManager.save_message` appends to a project's feed as messages are
+    saved; a feed that is not in memory is warmed lazily from the database
+    (`begin_warm` / `finish_warm`) on its next read. Appends that land while
+    a warm query is in flight are merged in, so a concurrent save is never
+    lost. Total memory is capped globally by evicting the least recently
+    used projects, and agent/project invalidations from the invalidation bus
+    drop affected feeds (renamed agents, cleared histories, deletions).
+    """
+
+    def __init__(self, capacity: Optional[int] = None, max_bytes: Optional[int] = None):
+        self.capacity = capacity or settings.SHARED_CONTEXT_BUFFER_SIZE
+        self.max_bytes = max_bytes or settings.SHARED_CONTEXT_BUFFER_MAX_BYTES
+        self.size_bytes = 0
+        self._feeds: "OrderedDict[UUID, ProjectFeed]" = OrderedDict()
+        self._warming: Dict[UUID, List[FeedEntry]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._feeds)
+
+    def get(self, project_id: UUID) -> Optional[ProjectFeed]:
+        """The project's feed, or None if it has to be warmed from the database"""
+        with self._lock:
+            feed = self._feeds.get(project_id)
+            if feed is not None:
+                self._feeds.move_to_end(project_id)
+        if feed is None:
+            buffer_misses.inc()
+        else:
+            buffer_hits.inc()
+        return feed
+
+    def begin_warm(self, project_id: UUID) -> None:
+        """Start collecting appends for a project whose feed is being loaded"""
+        with self._lock:
+            self._warming.setdefault(project_id, [])
+
+    def finish_warm(self, project_id: UUID, entries: Iterable[FeedEntry]) -> ProjectFeed:
+        """Install a feed from DB rows (oldest first) plus any appends made meanwhile"""
+        with self._lock:
+            loaded = list(entries)
+            if project_id not in self._warming:
+                # Invalidated (or installed by another reader) while loading: serve, don't cache
+                return ProjectFeed(self.capacity, loaded)
+            seen = {entry.message_id for entry in loaded}
+            concurrent = [e for e in self._warming.pop(project_id) if e.message_id not in seen]
+            feed = ProjectFeed(self.capacity, loaded + concurrent)
+            self._replace(project_id, feed)
+            self._evict()
+            return feed
+
+    def append(self, project_id: UUID, entry: FeedEntry) -> None:
+        """Record a saved message; no-op for projects that are not buffered"""
+        with self._lock:
+            if project_id in self._warming:
+                self._warming[project_id].append(entry)
+            feed = self._feeds.get(project_id)
+            if feed is None:
+                return
+            self.size_bytes -= feed.size_bytes
+            feed.append(entry)
+            self.size_bytes += feed.size_bytes
+            self._evict()
+
+    def discard_project(self, project_id: UUID) -> None:
+        with self._lock:
+            self._replace(project_id, None)
+            self._warming.pop(project_id, None)
+
+    def discard_agent(self, agent_id: UUID) -> None:
+        """Drop every feed holding messages of this agent"""
+        with self._lock:
+            for project_id in [p for p, feed in self._feeds.items() if feed.has_agent(agent_id)]:
+                self._replace(project_id, None)
+            # Warm queries in flight may have read the agent's old rows: don't cache them
+            self._warming.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._feeds.clear()
+            self._warming.clear()
+            self.size_bytes = 0
+
+    def on_invalidation(self, invalidation: Invalidation) -> None:
+        """Invalidation bus subscriber"""
+        if invalidation.kind == FLUSH:
+            self.clear()
+        elif invalidation.kind == "agent":
+            self.discard_agent(invalidation.entity_id)
+        elif invalidation.kind == "project":
+            self.discard_project(invalidation.entity_id)
+
+    def _replace(self, project_id: UUID, feed: Optional[ProjectFeed]) -> None:
+        old = self._feeds.pop(project_id, None)
+        if old is not None:
+            self.size_bytes -= old.size_bytes
+        if feed is not None:
+            self._feeds[project_id] = feed
+            self.size_bytes += feed.size_bytes
+
+    def _evict(self) -> None:
+        while self.size_bytes > self.max_bytes and len(self._feeds) > 1:
+            _, feed = self._feeds.popitem(last=False)
+            self.size_bytes -= feed.size_bytes
+            buffer_evictions.inc()
+
+
+shared_context_buffer = SharedContextBuffer()
+invalidation_bus.subscribe(shared_context_buffer.on_invalidation)
@@ -0,0 +1,113 @@
+"""Token coalescing for SSE chat streams"""
+
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import AsyncGenerator, AsyncIterator, Optional
+
+from app.config import settings
+
+
+@dataclass(frozen=True)
+class FlushPolicy:
+    """
+    When buffered LLM deltas are written out as one SSE frame.
+
+    A frame is flushed as soon as either limit is reached, whichever comes
+    first. An interval of 0 flushes every delta on its own (smoothest output,
+    most writes).
+    """
+    interval_ms: int
+    max_bytes: int
+
+    @classmethod
+    def from_settings(
+        cls,
+        interval_ms: Optional[int] = None,
+        max_bytes: Optional[int] = None
+    ) -> "FlushPolicy":
+        """Build a policy from per-request overrides, falling back to Settings"""
+        return cls(
+            interval_ms=settings.SSE_FLUSH_INTERVAL_MS if interval_ms is None else interval_ms,
+            max_bytes=settings.SSE_FLUSH_MAX_BYTES if max_bytes is None else max_bytes,
+        )
+
+    @property
+    def per_token(self) -> bool:
+        return self.interval_ms <= 0 or self.max_bytes <= 1
+
+
+async def coalesce_tokens(
+    chunks: AsyncIterator[str],
+    policy: FlushPolicy
+) -> AsyncGenerator[str, None]:
+    """
+    Batch text deltas from `chunks` according to `policy`.
+
+    The time window starts with the first delta in an empty buffer, and is
+    enforced even while the upstream is silent, so a slow token is never
+    held back longer than `interval_ms`. Closing this generator closes
+    `chunks` as well.
+    """
+    iterator = chunks.__aiter__()
+    if policy.per_token:
+        try:
+            async for chunk in iterator:
+                yield chunk
+        finally:
+            await _aclose(iterator)
+        return
+
+    window = policy.interval_ms / 1000
+    buffer = []
+    buffered_bytes = 0
+    deadline = None
+    pending: Optional[asyncio.Future] = None
+
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+
+            timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+
+            if not done:
+                # Window elapsed while waiting on upstream: flush what we have
+                yield "".join(buffer)
+                buffer, buffered_bytes, deadline = [], 0, None
+                continue
+
+            task, pending = pending, None
+            try:
+                chunk = task.result()
+            except StopAsyncIteration:
+                break
+
+            if not chunk:
+                continue
+            if not buffer:
+                deadline = time.monotonic() + window
+            buffer.append(chunk)
+            buffered_bytes += len(chunk.encode("utf-8"))
+
+            if buffered_bytes >= policy.max_bytes or time.monotonic() >= deadline:
+                yield "".join(buffer)
+                buffer, buffered_bytes, deadline = [], 0, None
+
+        if buffer:
+            yield "".join(buffer)
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, StopAsyncIteration):
+                pass
+        await _aclose(iterator)
+
+
+async def _aclose(iterator: AsyncIterator[str]) -> None:
+    aclose = getattr(iterator, "aclose", None)
+    if aclose is not None:
+        await aclose()
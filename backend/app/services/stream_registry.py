@@ -0,0 +1,200 @@
+"""Replay buffer for idempotent, resumable chat streams"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import AsyncGenerator, Awaitable, Callable, List, Optional
+
+from app.config import settings
+from app.core.metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+stream_replays = metrics.counter(
+    "chat_stream_replays_total",
+    "Stream requests served from the replay buffer instead of regenerating"
+)
+stream_resumes_expired = metrics.counter(
+    "chat_stream_resumes_expired_total",
+    "Reconnects (Last-Event-ID) for a stream no longer in this worker's replay buffer"
+)
+stream_replay_evictions = metrics.counter(
+    "chat_stream_replay_evictions_total",
+    "Finished streams dropped from the replay buffer (TTL or size limits)"
+)
+
+TRUNCATED_FRAME = "data: " + json.dumps({"type": "done", "truncated": True}) + "\n\n"
+EXPIRED_FRAME = "data: " + json.dumps({
+    "type": "error", "expired": True, "content": "This reply is no longer available; please send the message again"
+}) + "\n\n"
+
+
+class StreamRecord:
+    """
+    Numbered SSE frames of one chat stream.
+
+    Frames are appended by a producer task that is decoupled from any single
+    HTTP connection, so clients can drop and reconnect without restarting
+    generation. Event IDs are 1-based positions in `frames`.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.frames: List[str] = []
+        self.size_bytes = 0
+        self.done = False
+        self.created_at = time.monotonic()
+        self.finished_at: Optional[float] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        self.changed = asyncio.Condition()
+
+    async def append(self, frame: str) -> None:
+        self.frames.append(frame)
+        self.size_bytes += len(frame)
+        async with self.changed:
+            self.changed.notify_all()
+
+    async def finish(self) -> None:
+        self.done = True
+        self.finished_at = time.monotonic()
+        async with self.changed:
+            self.changed.notify_all()
+
+
+class StreamRegistry:
+    """
+    Per-worker registry of in-flight and recently finished chat streams.
+
+    Retention is bounded by time (finished streams expire after `ttl`
+    seconds) and by size (`max_streams` records / `max_bytes` of frames;
+    the oldest finished streams are evicted first). A stream whose last
+    subscriber disconnects is cancelled after `resume_grace` seconds unless
+    a client reconnects in the meantime.
+    """
+
+    def __init__(
+        self,
+        ttl: Optional[float] = None,
+        max_streams: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+        resume_grace: Optional[float] = None
+    ):
+        self.ttl = settings.SSE_REPLAY_TTL_SECONDS if ttl is None else ttl
+        self.max_streams = settings.SSE_REPLAY_MAX_STREAMS if max_streams is None else max_streams
+        self.max_bytes = settings.SSE_REPLAY_MAX_BYTES if max_bytes is None else max_bytes
+        self.resume_grace = settings.SSE_RESUME_GRACE_SECONDS if resume_grace is None else resume_grace
+        self._records: "OrderedDict[str, StreamRecord]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(record.size_bytes for record in self._records.values())
+
+    def open_stream(
+        self,
+        key: str,
+        frames_factory: Callable[[], AsyncGenerator[str, None]],
+        reuse: bool = True
+    ) -> StreamRecord:
+        """
+        Return the stream registered under `key`, starting it if needed.
+
+        With `reuse`, an existing record (running or finished within the TTL)
+        is returned as-is and `frames_factory` is not called. Otherwise a new
+        generation always starts and replaces any previous record.
+        """
+        self._evict()
+
+        record = self._records.get(key)
+        if record is not None and reuse:
+            stream_replays.inc()
+            return record
+
+        record = StreamRecord(key)
+        self._records[key] = record
+        self._records.move_to_end(key)
+        record.task = asyncio.create_task(self._produce(record, frames_factory()))
+        return record
+
+    def get(self, key: str) -> Optional[StreamRecord]:
+        """The stream registered under `key` (running or finished within the TTL), without starting one"""
+        self._evict()
+        record = self._records.get(key)
+        if record is not None:
+            stream_replays.inc()
+        return record
+
+    async def follow(
+        self,
+        record: StreamRecord,
+        last_event_id: int = 0,
+        is_disconnected: Optional[Callable[[], Awaitable[bool]]] = None
+    ) -> AsyncGenerator[str, None]:
+        """Yield frames after `last_event_id`, then live frames until the stream is done."""
+        record.subscribers += 1
+        next_id = max(last_event_id, 0) + 1
+        try:
+            while True:
+                while next_id <= len(record.frames):
+                    yield f"id: {next_id}\n{record.frames[next_id - 1]}"
+                    next_id += 1
+                if record.done:
+                    return
+                if is_disconnected is not None and await is_disconnected():
+                    return
+                async with record.changed:
+                    try:
+                        await asyncio.wait_for(
+                            record.changed.wait_for(
+                                lambda: record.done or len(record.frames) >= next_id
+                            ),
+                            timeout=1.0
+                        )
+                    except asyncio.TimeoutError:
+                        pass  # re-check disconnect
+        finally:
+            record.subscribers -= 1
+            if record.subscribers == 0 and not record.done:
+                asyncio.get_running_loop().call_later(
+                    self.resume_grace, self._cancel_if_orphaned, record
+                )
+
+    async def _produce(self, record: StreamRecord, frames: AsyncGenerator[str, None]) -> None:
+        try:
+            async for frame in frames:
+                await record.append(frame)
+        except asyncio.CancelledError:
+            await record.append(TRUNCATED_FRAME)
+        except Exception:
+            logger.exception(f"Chat stream {record.key} failed")
+        finally:
+            await record.finish()
+
+    def _cancel_if_orphaned(self, record: StreamRecord) -> None:
+        if record.subscribers == 0 and not record.done and record.task is not None:
+            logger.info(f"No client reconnected to stream {record.key}; cancelling")
+            record.task.cancel()
+
+    def _evict(self) -> None:
+        now = time.monotonic()
+        for key, record in list(self._records.items()):
+            if record.done and now - record.finished_at > self.ttl:
+                del self._records[key]
+                stream_replay_evictions.inc()
+
+        total_bytes = self.size_bytes
+        for key, record in list(self._records.items()):
+            if len(self._records) < self.max_streams and total_bytes <= self.max_bytes:
+                break
+            if record.done:
+                del self._records[key]
+                total_bytes -= record.size_bytes
+                stream_replay_evictions.inc()
+
+
+stream_registry = StreamRegistry()
@@ -0,0 +1,83 @@
+"""Prompt token counting for context budgets"""
+
+import asyncio
+import logging
+import math
+import threading
+import time
+from typing import Optional
+
+try:
+    import tiktoken
+except ImportError:  # optional: fall back to a character estimate
+    tiktoken = None
+
+logger = logging.getLogger(__name__)
+
+# o200k_base is the gpt-4o family tokenizer
+ENCODING_NAME = "o200k_base"
+CHARS_PER_TOKEN = 4  # Rough average for English text when tiktoken is unavailable
+ENCODING_RETRY_SECONDS = 300  # After a failed load, estimate until then instead of retrying on every call
+INLINE_COUNT_CHARS = 8192  # Longer texts are encoded in a worker thread by count_tokens_async
+
+_encoding_value: Optional["tiktoken.Encoding"] = None
+_encoding_failed_at: Optional[float] = None
+_encoding_lock = threading.Lock()
+
+
+def _encoding() -> Optional["tiktoken.Encoding"]:
+    """
+    The tiktoken encoding, loaded on first use. Its BPE file is downloaded
+    on first load (blocking), so the app loads it in a thread at startup
+    (see load_encoding). A failed load is retried after ENCODING_RETRY_SECONDS.
+    """
+    global _encoding_value, _encoding_failed_at
+    if _encoding_value is not None or tiktoken is None:
+        return _encoding_value
+    if _encoding_failed_at is not None and time.monotonic() - _encoding_failed_at < ENCODING_RETRY_SECONDS:
+        return None
+    with _encoding_lock:
+        if _encoding_value is None:
+            try:
+                _encoding_value = tiktoken.get_encoding(ENCODING_NAME)
+                _encoding_failed_at = None
+            except Exception as e:
+                # e.g. the BPE file cannot be downloaded
+                _encoding_failed_at = time.monotonic()
+                logger.warning(
+                    f"tiktoken encoding {ENCODING_NAME} unavailable ({e}); "
+                    f"estimating tokens from length, retrying in {ENCODING_RETRY_SECONDS} s"
+                )
+    return _encoding_value
+
+
+def _encoding_settled() -> bool:
+    """Whether _encoding() returns without trying to load (and maybe download) the BPE file"""
+    if _encoding_value is not None or tiktoken is None:
+        return True
+    return _encoding_failed_at is not None and time.monotonic() - _encoding_failed_at < ENCODING_RETRY_SECONDS
+
+
+async def load_encoding() -> bool:
+    """Load the encoding off the event loop; False if token counts will be estimated"""
+    return await asyncio.to_thread(_encoding) is not None
+
+
+def count_tokens(text: str) -> int:
+    """Tokens in `text` (exact with tiktoken, otherwise ~4 characters per token)"""
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+async def count_tokens_async(text: str) -> int:
+    """
+    count_tokens for the event loop: long texts (pasted logs, files) and a
+    load of the encoding run in a worker thread instead of blocking it
+    """
+    if len(text) <= INLINE_COUNT_CHARS and _encoding_settled():
+        return count_tokens(text)
+    return await asyncio.to_thread(count_tokens, text)
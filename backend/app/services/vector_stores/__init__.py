@@ -0,0 +1,37 @@
+"""Vector stores for searching message embeddings"""
+
+from typing import Optional
+
+from app.config import settings
+from app.core.invalidation import invalidation_bus
+from app.services.vector_stores.base import VectorRecord, VectorStore
+from app.services.vector_stores.pgvector_store import PgVectorStore, ProjectSizeCache, project_sizes
+from app.services.vector_stores.memory_store import InMemoryVectorStore, ProjectIndex
+
+
+def create_vector_store(backend: Optional[str] = None) -> VectorStore:
+    """Vector store for VECTOR_STORE_BACKEND (pgvector | memory | cached)"""
+    backend = backend or settings.VECTOR_STORE_BACKEND
+    if backend == "pgvector":
+        return PgVectorStore()
+    if backend == "memory":
+        return InMemoryVectorStore()
+    if backend == "cached":
+        return InMemoryVectorStore(fallback=PgVectorStore())
+    raise ValueError(f"Unknown vector store backend: {backend}")
+
+
+vector_store = create_vector_store()
+invalidation_bus.subscribe(vector_store.on_invalidation)
+
+__all__ = [
+    "VectorRecord",
+    "VectorStore",
+    "PgVectorStore",
+    "ProjectSizeCache",
+    "project_sizes",
+    "InMemoryVectorStore",
+    "ProjectIndex",
+    "create_vector_store",
+    "vector_store",
+]
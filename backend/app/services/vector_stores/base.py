@@ -0,0 +1,74 @@
+"""Base interface for message embedding vector stores"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Iterable, List, Sequence, Tuple
+from uuid import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.invalidation import Invalidation
+
+
+@dataclass(frozen=True)
+class VectorRecord:
+    """One indexed message as returned by a vector store search"""
+    message_id: UUID
+    project_id: UUID
+    agent_id: UUID
+    content: str
+    embedding: Sequence[float]
+
+    @classmethod
+    def from_model(cls, row) -> "VectorRecord":
+        return cls(
+            message_id=row.message_id,
+            project_id=row.project_id,
+            agent_id=row.agent_id,
+            content=row.content,
+            embedding=row.embedding,
+        )
+
+
+class VectorStore(ABC):
+    """
+    Abstract base class for vector stores.
+
+    message_embeddings in the database is always the source of truth;
+    implementations decide how it is searched:
+    - PgVectorStore: pgvector distance operators and the HNSW index
+    - InMemoryVectorStore: brute force over per-project NumPy matrices
+      (works on SQLite; optionally a hot-project cache in front of pgvector)
+    """
+
+    @abstractmethod
+    async def search(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        agent_ids: List[UUID],
+        query_embedding: List[float],
+        limit: int
+    ) -> List[Tuple[VectorRecord, float]]:
+        """
+        Nearest stored embeddings of `agent_ids` in the project, closest first.
+
+        Args:
+            db: Session used to read message_embeddings
+            project_id: The project to search within
+            agent_ids: Only embeddings of these agents are returned
+            query_embedding: The query vector
+            limit: Maximum number of results
+
+        Returns:
+            (record, cosine distance) pairs
+        """
+        pass
+
+    def added(self, records: Iterable[VectorRecord]) -> None:
+        """Called after embeddings are committed to message_embeddings"""
+
+    def discard_message(self, message_id: UUID) -> None:
+        """Called after a message's embedding is deleted"""
+
+    def on_invalidation(self, invalidation: Invalidation) -> None:
+        """Invalidation bus subscriber"""
@@ -0,0 +1,355 @@
+"""In-process brute-force vector store over per-project NumPy matrices"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+from uuid import UUID
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.invalidation import FLUSH, Invalidation
+from app.core.metrics import metrics
+from app.models import MessageEmbedding
+from app.services.vector_stores.base import VectorRecord, VectorStore
+from app.services.vector_stores.pgvector_store import ProjectSizeCache
+
+logger = logging.getLogger(__name__)
+
+memory_hits = metrics.counter(
+    "vector_store_memory_hits_total",
+    "Vector searches served from an in-memory project index"
+)
+memory_loads = metrics.counter(
+    "vector_store_memory_loads_total",
+    "Project indexes loaded from message_embeddings"
+)
+memory_evictions = metrics.counter(
+    "vector_store_memory_evictions_total",
+    "Cold project indexes evicted to stay under VECTOR_MEMORY_MAX_BYTES"
+)
+fallback_searches = metrics.counter(
+    "vector_store_fallback_searches_total",
+    "Searches of projects too large to keep in memory, sent to pgvector"
+)
+
+INITIAL_CAPACITY = 64  # Rows; the matrix doubles when full
+ROW_OVERHEAD_BYTES = 200  # Rough per-row object overhead on top of the content
+# server_default now() is the transaction start, so a row can commit with a
+# created_at slightly before the watermark; refreshes look back this far
+REFRESH_OVERLAP = timedelta(seconds=60)
+
+
+def unit_vector(values) -> np.ndarray:
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+class ProjectIndex:
+    """
+    One project's embeddings as a contiguous float32 matrix of unit vectors.
+
+    Cosine distance is then 1 - (matrix @ query). Rows are kept dense:
+    removing a row moves the last row into its place.
+    """
+
+    def __init__(self, project_id: UUID, dimensions: int, records: Iterable[VectorRecord] = ()):
+        self.project_id = project_id
+        self.dimensions = dimensions
+        self.vectors = np.empty((INITIAL_CAPACITY, dimensions), dtype=np.float32)
+        self.agent_codes = np.empty(INITIAL_CAPACITY, dtype=np.int32)
+        self.rows: List[Tuple[UUID, UUID, str]] = []  # (message_id, agent_id, content)
+        self.row_of: Dict[UUID, int] = {}
+        self.codes: Dict[UUID, int] = {}
+        self.content_bytes = 0
+        self.watermark = None  # Newest created_at loaded from the database
+        self.refreshed_at = 0.0
+        for record in records:
+            self.add(record)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def size_bytes(self) -> int:
+        return (
+            self.vectors.nbytes + self.agent_codes.nbytes + self.content_bytes
+            + len(self.rows) * ROW_OVERHEAD_BYTES
+        )
+
+    def has_agent(self, agent_id: UUID) -> bool:
+        return agent_id in self.codes
+
+    def add(self, record: VectorRecord) -> bool:
+        """Append a record; False if the message is already indexed"""
+        if record.message_id in self.row_of:
+            return False
+        row = len(self.rows)
+        if row == len(self.vectors):
+            self._grow()
+        self.vectors[row] = unit_vector(record.embedding)
+        self.agent_codes[row] = self.codes.setdefault(record.agent_id, len(self.codes))
+        self.rows.append((record.message_id, record.agent_id, record.content))
+        self.row_of[record.message_id] = row
+        self.content_bytes += len(record.content)
+        return True
+
+    def remove(self, message_id: UUID) -> bool:
+        row = self.row_of.pop(message_id, None)
+        if row is None:
+            return False
+        last = len(self.rows) - 1
+        self.content_bytes -= len(self.rows[row][2])
+        if row != last:
+            self.vectors[row] = self.vectors[last]
+            self.agent_codes[row] = self.agent_codes[last]
+            self.rows[row] = self.rows[last]
+            self.row_of[self.rows[row][0]] = row
+        self.rows.pop()
+        return True
+
+    def search(
+        self,
+        agent_ids: Iterable[UUID],
+        query_embedding,
+        limit: int
+    ) -> List[Tuple[VectorRecord, float]]:
+        codes = [self.codes[agent_id] for agent_id in agent_ids if agent_id in self.codes]
+        count = len(self.rows)
+        if not codes or not count or limit <= 0:
+            return []
+        scores = self.vectors[:count] @ unit_vector(query_embedding)
+        if len(codes) == len(self.codes):
+            candidates = np.arange(count)
+        else:
+            candidates = np.flatnonzero(np.isin(self.agent_codes[:count], codes))
+            scores = scores[candidates]
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+        else:
+            top = np.arange(len(candidates))
+        top = top[np.argsort(-scores[top], kind="stable")]
+
+        results = []
+        for i in top:
+            row = int(candidates[i])
+            message_id, agent_id, content = self.rows[row]
+            record = VectorRecord(
+                message_id=message_id,
+                project_id=self.project_id,
+                agent_id=agent_id,
+                content=content,
+                embedding=self.vectors[row].copy(),
+            )
+            results.append((record, 1.0 - float(scores[i])))
+        return results
+
+    def _grow(self) -> None:
+        capacity = len(self.vectors) * 2
+        vectors = np.empty((capacity, self.dimensions), dtype=np.float32)
+        vectors[:len(self.rows)] = self.vectors[:len(self.rows)]
+        agent_codes = np.empty(capacity, dtype=np.int32)
+        agent_codes[:len(self.rows)] = self.agent_codes[:len(self.rows)]
+        self.vectors, self.agent_codes = vectors, agent_codes
+
+
+class InMemoryVectorStore(VectorStore):
+    """
+    Exact nearest-neighbour search over per-project matrices held in process.
+
+    A project's embeddings are loaded from message_embeddings on its first
+    search (this works on any database, SQLite included) and kept current
+    by `added` / `discard_message` for writes made in this process and a
+    created_at delta refresh every `refresh_seconds` for writes made by
+    other workers. Agent/project invalidations drop the affected projects.
+    Total memory is capped by evicting the least recently used projects.
+
+    With a `fallback` store (VECTOR_STORE_BACKEND=cached) the memory store
+    is a hot-project cache: projects with more than `max_project_rows`
+    vectors are searched by the fallback instead of being loaded.
+    """
+
+    def __init__(
+        self,
+        fallback: Optional[VectorStore] = None,
+        max_bytes: Optional[int] = None,
+        max_project_rows: Optional[int] = None,
+        refresh_seconds: Optional[float] = None,
+        dimensions: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.fallback = fallback
+        self.max_bytes = max_bytes or settings.VECTOR_MEMORY_MAX_BYTES
+        self.max_project_rows = max_project_rows or settings.VECTOR_MEMORY_MAX_PROJECT_ROWS
+        self.refresh_seconds = (
+            settings.VECTOR_MEMORY_REFRESH_SECONDS if refresh_seconds is None else refresh_seconds
+        )
+        self.dimensions = dimensions or settings.EMBEDDING_DIMENSION
+        self._clock = clock
+        self._projects: "OrderedDict[UUID, ProjectIndex]" = OrderedDict()
+        self._loading: Dict[UUID, List[VectorRecord]] = {}
+        self._oversized = ProjectSizeCache(clock=clock)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._projects)
+
+    @property
+    def size_bytes(self) -> int:
+        return sum(index.size_bytes for index in self._projects.values())
+
+    async def search(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        agent_ids: List[UUID],
+        query_embedding: List[float],
+        limit: int
+    ) -> List[Tuple[VectorRecord, float]]:
+        if self.fallback is not None and self._oversized.get(project_id) is not None:
+            fallback_searches.inc()
+            return await self.fallback.search(db, project_id, agent_ids, query_embedding, limit)
+
+        with self._lock:
+            index = self._projects.get(project_id)
+            if index is not None:
+                self._projects.move_to_end(project_id)
+        if index is None:
+            index = await self._load(db, project_id)
+            if index is None:
+                fallback_searches.inc()
+                return await self.fallback.search(db, project_id, agent_ids, query_embedding, limit)
+        else:
+            memory_hits.inc()
+            if self._clock() - index.refreshed_at >= self.refresh_seconds:
+                await self._refresh(db, index)
+
+        with self._lock:
+            return index.search(agent_ids, query_embedding, limit)
+
+    def added(self, records: Iterable[VectorRecord]) -> None:
+        with self._lock:
+            for record in records:
+                if record.project_id in self._loading:
+                    self._loading[record.project_id].append(record)
+                index = self._projects.get(record.project_id)
+                if index is not None:
+                    index.add(record)
+            self._evict()
+
+    def discard_message(self, message_id: UUID) -> None:
+        with self._lock:
+            for index in self._projects.values():
+                if index.remove(message_id):
+                    break
+            # A load in flight may have read the row before it was deleted
+            self._loading.clear()
+
+    def discard_project(self, project_id: UUID) -> None:
+        with self._lock:
+            self._projects.pop(project_id, None)
+            self._loading.pop(project_id, None)
+
+    def discard_agent(self, agent_id: UUID) -> None:
+        """Drop every project index holding vectors of this agent"""
+        with self._lock:
+            for project_id in [p for p, index in self._projects.items() if index.has_agent(agent_id)]:
+                del self._projects[project_id]
+            self._loading.clear()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._projects.clear()
+            self._loading.clear()
+        self._oversized.clear()
+
+    def on_invalidation(self, invalidation: Invalidation) -> None:
+        if invalidation.kind == FLUSH:
+            self.clear()
+        elif invalidation.kind == "agent":
+            self.discard_agent(invalidation.entity_id)
+        elif invalidation.kind == "project":
+            self.discard_project(invalidation.entity_id)
+
+    async def _load(self, db: AsyncSession, project_id: UUID) -> Optional[ProjectIndex]:
+        """
+        Build the project's index from the database and cache it.
+
+        Returns None when the project is too large and a fallback exists.
+        """
+        with self._lock:
+            self._loading.setdefault(project_id, [])
+        query = self._rows_query(project_id)
+        if self.fallback is not None:
+            query = query.limit(self.max_project_rows + 1)
+        result = await db.execute(query)
+        rows = result.all()
+        if self.fallback is not None and len(rows) > self.max_project_rows:
+            with self._lock:
+                self._loading.pop(project_id, None)
+            self._oversized.put(project_id, len(rows))
+            return None
+
+        memory_loads.inc()
+        index = ProjectIndex(project_id, self.dimensions)
+        self._add_rows(index, rows)
+        index.refreshed_at = self._clock()
+        with self._lock:
+            if project_id not in self._loading:
+                # Invalidated (or installed by another reader) while loading: serve, don't cache
+                return index
+            for record in self._loading.pop(project_id):
+                index.add(record)
+            self._projects[project_id] = index
+            self._projects.move_to_end(project_id)
+            self._evict()
+        logger.debug(f"Loaded {len(index)} vectors of project {project_id} into memory")
+        return index
+
+    async def _refresh(self, db: AsyncSession, index: ProjectIndex) -> None:
+        """Pick up rows written by other workers since the last load or refresh"""
+        index.refreshed_at = self._clock()
+        query = self._rows_query(index.project_id)
+        if index.watermark is not None:
+            query = query.where(MessageEmbedding.created_at >= index.watermark - REFRESH_OVERLAP)
+        result = await db.execute(query)
+        rows = result.all()
+        with self._lock:
+            self._add_rows(index, rows)
+            self._evict()
+
+    def _rows_query(self, project_id: UUID):
+        return (
+            select(
+                MessageEmbedding.message_id,
+                MessageEmbedding.agent_id,
+                MessageEmbedding.content,
+                MessageEmbedding.embedding,
+                MessageEmbedding.created_at,
+            )
+            .where(MessageEmbedding.project_id == project_id)
+            .order_by(MessageEmbedding.created_at)
+        )
+
+    def _add_rows(self, index: ProjectIndex, rows) -> None:
+        for row in rows:
+            index.add(VectorRecord(
+                message_id=row.message_id,
+                project_id=index.project_id,
+                agent_id=row.agent_id,
+                content=row.content,
+                embedding=row.embedding,
+            ))
+            if index.watermark is None or row.created_at > index.watermark:
+                index.watermark = row.created_at
+
+    def _evict(self) -> None:
+        size = sum(index.size_bytes for index in self._projects.values())
+        while size > self.max_bytes and len(self._projects) > 1:
+            _, index = self._projects.popitem(last=False)
+            size -= index.size_bytes
+            memory_evictions.inc()
@@ -0,0 +1,184 @@
+"""pgvector-backed vector store"""
+
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, List, Optional, Tuple
+from uuid import UUID
+from sqlalchemy import and_, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models import MessageEmbedding
+from app.services.vector_stores.base import VectorRecord, VectorStore
+
+logger = logging.getLogger(__name__)
+
+ITERATIVE_SCAN_MIN_VERSION = (0, 8)  # hnsw.iterative_scan / hnsw.max_scan_tuples
+
+
+class ProjectSizeCache:
+    """
+    Bounded LRU of per-project vector counts, expiring after `ttl_seconds`.
+
+    Counts are capped at VECTOR_EXACT_SCAN_MAX_ROWS + 1: the search only
+    needs to know whether a project is small enough to scan exactly.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: Optional[float] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = settings.VECTOR_PROJECT_SIZE_TTL_SECONDS if ttl_seconds is None else ttl_seconds
+        self._clock = clock
+        self._entries: "OrderedDict[UUID, Tuple[float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, project_id: UUID) -> Optional[int]:
+        with self._lock:
+            item = self._entries.get(project_id)
+            if item is None:
+                return None
+            expires_at, count = item
+            if expires_at <= self._clock():
+                del self._entries[project_id]
+                return None
+            self._entries.move_to_end(project_id)
+            return count
+
+    def put(self, project_id: UUID, count: int) -> None:
+        with self._lock:
+            self._entries[project_id] = (self._clock() + self.ttl_seconds, count)
+            self._entries.move_to_end(project_id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+project_sizes = ProjectSizeCache()
+
+
+class PgVectorStore(VectorStore):
+    """
+    Searches message_embeddings in Postgres with pgvector.
+
+    Small projects are scanned exactly; larger ones use the HNSW index with
+    per-transaction search settings.
+    """
+
+    def __init__(self):
+        self._iterative_scan_supported: Optional[bool] = None
+
+    async def _supports_iterative_scan(self, db: AsyncSession) -> bool:
+        """Whether the installed pgvector has iterative index scans (checked once)"""
+        if self._iterative_scan_supported is None:
+            result = await db.execute(text("SELECT extversion FROM pg_extension WHERE extname = 'vector'"))
+            version = result.scalar()
+            parsed = tuple(int(part) for part in version.split(".")[:2] if part.isdigit()) if version else ()
+            self._iterative_scan_supported = parsed >= ITERATIVE_SCAN_MIN_VERSION
+            if not self._iterative_scan_supported:
+                logger.warning(
+                    f"pgvector {version} has no iterative index scans (needs >= 0.8); "
+                    f"ignoring VECTOR_ITERATIVE_SCAN={settings.VECTOR_ITERATIVE_SCAN}"
+                )
+        return self._iterative_scan_supported
+
+    async def _use_exact_scan(self, db: AsyncSession, project_id: UUID) -> bool:
+        """
+        Whether the project is small enough to search without the ANN index.
+
+        The HNSW index is global, so for a small project in a large table
+        nearly every candidate it returns belongs to another project and is
+        filtered out. Scanning the project's rows exactly is both cheaper
+        and has perfect recall up to VECTOR_EXACT_SCAN_MAX_ROWS vectors.
+        """
+        threshold = settings.VECTOR_EXACT_SCAN_MAX_ROWS
+        count = project_sizes.get(project_id)
+        if count is None:
+            # Bounded count: reads at most threshold + 1 entries of the project_id index
+            result = await db.execute(
+                select(func.count()).select_from(
+                    select(MessageEmbedding.id)
+                    .where(MessageEmbedding.project_id == project_id)
+                    .limit(threshold + 1)
+                    .subquery()
+                )
+            )
+            count = result.scalar_one()
+            project_sizes.put(project_id, count)
+        return count <= threshold
+
+    async def _apply_search_settings(self, db: AsyncSession, limit: int) -> None:
+        """
+        Set the ANN search breadth for this transaction (Postgres only).
+
+        hnsw.ef_search below the LIMIT would silently return fewer rows, so
+        it is raised to at least `limit`. With iterative scans enabled the
+        index keeps producing candidates until `limit` rows pass the
+        project/agent filter (or VECTOR_MAX_SCAN_TUPLES is reached); they
+        are skipped on pgvector < 0.8, which rejects those settings.
+        """
+        connection = await db.connection()
+        if connection.dialect.name != "postgresql":
+            return
+        await db.execute(
+            text(
+                "SELECT set_config('hnsw.ef_search', :ef_search, true), "
+                "set_config('ivfflat.probes', :probes, true)"
+            ),
+            {
+                "ef_search": str(max(settings.VECTOR_HNSW_EF_SEARCH, limit)),
+                "probes": str(settings.VECTOR_IVFFLAT_PROBES),
+            }
+        )
+        if settings.VECTOR_ITERATIVE_SCAN != "off" and await self._supports_iterative_scan(db):
+            await db.execute(
+                text(
+                    "SELECT set_config('hnsw.iterative_scan', :mode, true), "
+                    "set_config('hnsw.max_scan_tuples', :max_tuples, true)"
+                ),
+                {
+                    "mode": settings.VECTOR_ITERATIVE_SCAN,
+                    "max_tuples": str(settings.VECTOR_MAX_SCAN_TUPLES),
+                }
+            )
+
+    async def search(
+        self,
+        db: AsyncSession,
+        project_id: UUID,
+        agent_ids: List[UUID],
+        query_embedding: List[float],
+        limit: int
+    ) -> List[Tuple[VectorRecord, float]]:
+        # Search for similar embeddings using pgvector
+        # Using cosine distance (<=>), lower is more similar
+        distance = MessageEmbedding.embedding.cosine_distance(query_embedding)
+        if await self._use_exact_scan(db, project_id):
+            # "+ 0" keeps the planner off the ANN index: it filters on
+            # project_id and sorts the project's own vectors exactly
+            order_by = distance + 0
+        else:
+            await self._apply_search_settings(db, limit)
+            order_by = distance
+        result = await db.execute(
+            select(MessageEmbedding, distance.label("distance"))
+            .where(
+                and_(
+                    MessageEmbedding.project_id == project_id,
+                    MessageEmbedding.agent_id.in_(agent_ids)
+                )
+            )
+            .order_by(order_by)
+            .limit(limit)
+        )
+        # relaxed_order iterative scans may return rows slightly out of order
+        rows = sorted(result.all(), key=lambda row: row.distance)
+        return [(VectorRecord.from_model(row.MessageEmbedding), row.distance) for row in rows]
@@ -0,0 +1 @@
+"""Standalone performance benchmarks (run as `python -m benchmarks.<name>`)"""
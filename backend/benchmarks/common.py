@@ -0,0 +1,41 @@
+"""Shared helpers for the benchmarks"""
+
+import statistics
+import time
+from typing import Callable, Dict, List
+
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import create_engine
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.compiler import compiles
+
+
+@compiles(UUID, "sqlite")
+def _uuid_sqlite(type_, compiler, **kw):
+    return "CHAR(32)"
+
+
+@compiles(Vector, "sqlite")
+def _vector_sqlite(type_, compiler, **kw):
+    return "BLOB"
+
+
+def make_engine(url: str) -> Engine:
+    """Engine for a benchmark database (Postgres, or SQLite for a quick local run)"""
+    return create_engine(url)
+
+
+def time_call(fn: Callable[[], object], repeat: int) -> Dict[str, float]:
+    """Median and p95 wall time (ms) of `fn` over `repeat` runs after one warmup"""
+    fn()
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {
+        "median_ms": statistics.median(samples),
+        "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+    }
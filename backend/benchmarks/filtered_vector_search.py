@@ -0,0 +1,174 @@
+"""
+Project-filtered vector search: global HNSW post-filtering vs what
+RAGProvider now does.
+
+Loads --total vectors spread over --projects projects with Zipf-skewed
+sizes (a few huge projects, a long tail of tiny ones) into a scratch table
+with one global HNSW index and a btree on project_id, then queries each
+sampled project with `WHERE project_id = :p ORDER BY distance LIMIT k`:
+
+- global:    HNSW with iterative scans off, the old behaviour; small
+             projects get fewer than k rows back
+- iterative: HNSW with hnsw.iterative_scan = relaxed_order
+- provider:  exact scan ("distance + 0") for projects with at most
+             --exact-max-rows vectors, iterative HNSW above that
+
+Reports rows returned, recall@k against exact NumPy top-k, and p50/p99
+latency per project-size bucket. Requires Postgres with pgvector >= 0.8.0
+(iterative scans); there is no SQLite mode.
+
+Usage:
+    python -m benchmarks.filtered_vector_search --url postgresql://... --total 500000
+"""
+
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.common import make_engine
+from benchmarks.vector_recall import synthetic_embeddings, to_literal
+
+TABLE = "bench_filtered_vectors"
+BATCH = 5_000
+BUCKETS = [(1, 100), (101, 1_000), (1_001, 10_000), (10_001, None)]
+
+
+def project_sizes(projects: int, total: int, skew: float, rng: np.random.Generator) -> np.ndarray:
+    weights = 1.0 / np.arange(1, projects + 1) ** skew
+    sizes = np.maximum(1, np.round(weights / weights.sum() * total)).astype(int)
+    rng.shuffle(sizes)
+    return sizes
+
+
+def load(engine, vectors: np.ndarray, owners: np.ndarray, m: int, ef_construction: int) -> float:
+    dim = vectors.shape[1]
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(
+            f"CREATE TABLE {TABLE} (id integer PRIMARY KEY, project_id integer NOT NULL, embedding vector({dim}))"
+        ))
+    for start in range(0, len(vectors), BATCH):
+        rows = [
+            {"id": start + i, "project_id": int(owners[start + i]), "embedding": to_literal(v)}
+            for i, v in enumerate(vectors[start:start + BATCH])
+        ]
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"INSERT INTO {TABLE} VALUES (:id, :project_id, CAST(:embedding AS vector))"),
+                rows
+            )
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text(f"CREATE INDEX ON {TABLE} (project_id)"))
+        conn.execute(text(
+            f"CREATE INDEX ON {TABLE} USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {m}, ef_construction = {ef_construction})"
+        ))
+        conn.execute(text(f"ANALYZE {TABLE}"))
+    return time.perf_counter() - start
+
+
+def bucket_of(size: int) -> str:
+    for low, high in BUCKETS:
+        if size >= low and (high is None or size <= high):
+            return f"{low:,}-{high:,}" if high else f">{low - 1:,}"
+    raise ValueError(size)
+
+
+def run_strategy(engine, strategy, samples, sizes, k, ef_search, exact_max_rows):
+    """Returns {bucket: (rows returned, recall, p50 ms, p99 ms)}"""
+    ann = text(
+        f"SELECT id FROM {TABLE} WHERE project_id = :p "
+        f"ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+    )
+    exact = text(
+        f"SELECT id FROM {TABLE} WHERE project_id = :p "
+        f"ORDER BY (embedding <=> CAST(:q AS vector)) + 0 LIMIT :k"
+    )
+    iterative = "off" if strategy == "global" else "relaxed_order"
+    stats = defaultdict(lambda: {"returned": 0, "hits": 0, "expected": 0, "ms": []})
+    with engine.connect() as conn:
+        conn.execute(text("SELECT set_config('hnsw.ef_search', :v, false)"), {"v": str(ef_search)})
+        conn.execute(text("SELECT set_config('hnsw.iterative_scan', :v, false)"), {"v": iterative})
+        for project, query, expected in samples:
+            use_exact = strategy == "provider" and sizes[project] <= exact_max_rows
+            started = time.perf_counter()
+            ids = conn.execute(exact if use_exact else ann, {"p": project, "q": to_literal(query), "k": k}).scalars().all()
+            bucket = stats[bucket_of(sizes[project])]
+            bucket["ms"].append((time.perf_counter() - started) * 1000)
+            bucket["returned"] += len(ids)
+            bucket["hits"] += len(set(ids) & expected)
+            bucket["expected"] += len(expected)
+    return {
+        name: (
+            b["returned"] / len(b["ms"]),
+            b["hits"] / b["expected"],
+            float(np.percentile(b["ms"], 50)),
+            float(np.percentile(b["ms"], 99)),
+        )
+        for name, b in stats.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Postgres URL with pgvector >= 0.8.0")
+    parser.add_argument("--projects", type=int, default=1_000)
+    parser.add_argument("--total", type=int, default=200_000)
+    parser.add_argument("--skew", type=float, default=1.1, help="Zipf exponent of project sizes")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=1_000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", type=int, default=100)
+    parser.add_argument("--exact-max-rows", type=int, default=5_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    sizes = project_sizes(args.projects, args.total, args.skew, rng)
+    owners = np.repeat(np.arange(args.projects), sizes)
+    vectors = synthetic_embeddings(len(owners), args.dim, 200, rng)
+    members = {p: np.flatnonzero(owners == p) for p in range(args.projects)}
+
+    samples = []
+    for project in rng.integers(0, args.projects, size=args.queries):
+        rows = members[int(project)]
+        query = vectors[rng.choice(rows)] + 0.2 * rng.standard_normal(args.dim).astype(np.float32)
+        query /= np.linalg.norm(query)
+        scores = vectors[rows] @ query
+        top = rows[np.argsort(-scores)[:args.k]]
+        samples.append((int(project), query, set(top.tolist())))
+
+    engine = make_engine(args.url)
+    try:
+        build_seconds = load(engine, vectors, owners, args.m, args.ef_construction)
+        print(
+            f"{args.projects:,} projects, {len(owners):,} vectors (largest {sizes.max():,}, "
+            f"median {int(np.median(sizes)):,}), k={args.k}, ef_search={args.ef_search}, "
+            f"index build {build_seconds:.1f}s"
+        )
+        print(f"{'strategy':<10} {'project size':>13} {'rows':>5} {'recall':>7} {'p50':>8} {'p99':>8}")
+        for strategy in ("global", "iterative", "provider"):
+            results = run_strategy(
+                engine, strategy, samples, sizes, args.k, args.ef_search, args.exact_max_rows
+            )
+            for low, high in BUCKETS:
+                name = bucket_of(low)
+                if name not in results:
+                    continue
+                rows, recall, p50, p99 = results[name]
+                print(f"{strategy:<10} {name:>13} {rows:>5.1f} {recall:>7.3f} {p50:>6.2f}ms {p99:>6.2f}ms")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
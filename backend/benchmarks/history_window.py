@@ -0,0 +1,87 @@
+"""
+Prompt tokens of conversation history per turn: last 20 messages vs token budget.
+
+Simulates conversations where most messages are a sentence or two and
+some are pasted logs / files (--paste-rate), and for every turn compares
+the history sent by:
+
+- last-20 (old): the 20 most recent messages, whatever their size
+- budget (new): the newest messages whose stored token counts (plus
+  per-message overhead) fit history_token_budget, stopping at the first
+  one that does not fit, as ContextManager.get_history_window does
+
+Reports p50 / p95 / max history tokens and messages per turn. Token
+counts use tiktoken when installed, else ~4 chars/token. Runs in-process;
+no database needed.
+
+Usage:
+    python -m benchmarks.history_window --conversations 200 --turns 40
+"""
+
+import argparse
+
+import numpy as np
+
+from app.config import settings
+from app.services.context_budget import MESSAGE_OVERHEAD_TOKENS, history_token_budget
+from app.services.token_counter import count_tokens
+
+WORDS = "the deploy failed because migration timed out we should retry with a larger pool please check logs".split()
+
+
+def message(rng, paste_rate: float) -> str:
+    if rng.random() < paste_rate:
+        lines = int(rng.integers(50, 400))
+        return "\n".join(f"2026-01-01T00:00:{i % 60:02d} ERROR worker-{i % 7} job {i} failed: timeout" for i in range(lines))
+    return " ".join(rng.choice(WORDS, int(rng.integers(5, 60))))
+
+
+def percentiles(values):
+    values = np.asarray(values)
+    return np.percentile(values, 50), np.percentile(values, 95), values.max()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=40)
+    parser.add_argument("--paste-rate", type=float, default=0.08)
+    parser.add_argument("--model", default=settings.LLM_MODEL)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    system = {"role": "system", "content": " ".join(rng.choice(WORDS, 300))}
+    results = {"last-20": ([], []), "budget": ([], [])}
+    for _ in range(args.conversations):
+        counts = []  # stored token counts, oldest first
+        for _ in range(args.turns):
+            new = {"role": "user", "content": message(rng, args.paste_rate)}
+            budget = history_token_budget([system, new], model=args.model)
+
+            last_20 = [tokens + MESSAGE_OVERHEAD_TOKENS for tokens in counts[-20:]]
+            results["last-20"][0].append(sum(last_20))
+            results["last-20"][1].append(len(last_20))
+
+            used, kept = 0, 0
+            for tokens in reversed(counts[-settings.HISTORY_MAX_MESSAGES:]):
+                if used + tokens + MESSAGE_OVERHEAD_TOKENS > budget:
+                    break
+                used += tokens + MESSAGE_OVERHEAD_TOKENS
+                kept += 1
+            results["budget"][0].append(used)
+            results["budget"][1].append(kept)
+
+            counts.append(count_tokens(new["content"]))
+            counts.append(count_tokens(message(rng, args.paste_rate)))  # the reply
+
+    print(f"HISTORY_TOKEN_BUDGET={settings.HISTORY_TOKEN_BUDGET}, model={args.model}, paste rate={args.paste_rate}")
+    print(f"{'strategy':<10} {'tokens p50':>11} {'p95':>8} {'max':>8} {'msgs p50':>9} {'p95':>5}")
+    for name, (tokens, messages) in results.items():
+        t50, t95, tmax = percentiles(tokens)
+        m50, m95, _ = percentiles(messages)
+        print(f"{name:<10} {t50:>11.0f} {t95:>8.0f} {tmax:>8.0f} {m50:>9.0f} {m95:>5.0f}")
+
+
+if __name__ == "__main__":
+    main()
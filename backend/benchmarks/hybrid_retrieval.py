@@ -0,0 +1,217 @@
+"""
+Hybrid (full-text + vector, rank-fused) vs RAG shared-context retrieval.
+
+Seeds one project with a synthetic corpus: messages about --topics topics,
+some carrying a unique identifier (an error code, ticket number, ...).
+Embeddings are synthetic: each topic has a centre and a message's vector is
+its centre plus noise, so the vector search can find the topic but cannot
+see identifiers. The embeddings API is replaced by a lookup with
+--embed-latency-ms of simulated network time.
+
+Two query sets:
+- known-item: "what happened with <identifier> ..."; relevant = that one
+  message; reports hit@k
+- topical: a few topic words plus filler; relevant = the topic's messages;
+  reports precision@k
+
+Modes: rag (RAGProvider search after the query embedding), hybrid
+(HybridProvider: full-text search overlaps the embedding call) and lexical
+(HybridProvider with embeddings unavailable). Requires Postgres with
+pgvector; there is no SQLite mode.
+
+Usage:
+    python -m benchmarks.hybrid_retrieval --url postgresql://... --messages 100000
+"""
+
+import argparse
+import asyncio
+import math
+import time
+import uuid
+
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.database import Base, register_vector_codec, to_async_database_url
+from app.models import User, Project, Agent, ChatMessage, MessageEmbedding
+from app.services.context_providers import hybrid_provider, rag_provider
+from app.services.context_providers.hybrid_provider import HybridProvider
+from app.services.context_providers.rag_provider import RAGProvider
+from app.services.vector_stores import project_sizes
+from benchmarks.common import make_engine
+
+BATCH = 2_000
+TABLES = [User.__table__, Project.__table__, Agent.__table__, ChatMessage.__table__, MessageEmbedding.__table__]
+FILLER = "please can we check the latest update about this and what should happen next".split()
+
+
+class SyntheticEmbeddings:
+    """Stands in for the embeddings API: known vectors after a fixed delay"""
+
+    def __init__(self, vectors, latency_ms: float):
+        self.vectors = vectors
+        self.latency = latency_ms / 1000
+
+    async def embed_query(self, query: str):
+        await asyncio.sleep(self.latency)
+        return self.vectors[query]
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def build_corpus(args, rng):
+    dim = settings.EMBEDDING_DIMENSION
+    centres = rng.standard_normal((args.topics, dim)).astype(np.float32)
+    vocab = [[f"t{t}w{j}" for j in range(30)] for t in range(args.topics)]
+    messages = []  # (topic, identifier or None, text, vector)
+    for i in range(args.messages):
+        topic = int(rng.integers(args.topics))
+        words = list(rng.choice(vocab[topic], 8)) + list(rng.choice(FILLER, 4))
+        identifier = f"err{i:07d}" if rng.random() < 0.3 else None
+        if identifier:
+            words.append(identifier)
+        rng.shuffle(words)
+        vector = unit(centres[topic] + 0.6 * rng.standard_normal(dim).astype(np.float32))
+        messages.append((topic, identifier, " ".join(words), vector))
+    return centres, vocab, messages
+
+
+def build_queries(args, rng, centres, vocab, messages):
+    dim = settings.EMBEDDING_DIMENSION
+    query_vectors, known_item, topical = {}, [], []
+    with_ids = [i for i, m in enumerate(messages) if m[1]]
+    for i in rng.choice(with_ids, args.queries, replace=False):
+        topic, identifier = messages[i][0], messages[i][1]
+        query = f"what happened with {identifier} {rng.choice(vocab[topic])}"
+        query_vectors[query] = unit(centres[topic] + 0.6 * rng.standard_normal(dim).astype(np.float32)).tolist()
+        known_item.append((query, int(i)))
+    for _ in range(args.queries):
+        topic = int(rng.integers(args.topics))
+        query = " ".join(list(rng.choice(vocab[topic], 2)) + list(rng.choice(FILLER, 3)))
+        query_vectors[query] = unit(centres[topic] + 0.3 * rng.standard_normal(dim).astype(np.float32)).tolist()
+        topical.append((query, topic))
+    return query_vectors, known_item, topical
+
+
+def seed(engine, messages):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+    Base.metadata.drop_all(engine, tables=list(reversed(TABLES)))
+    Base.metadata.create_all(engine, tables=TABLES)
+
+    user_id, project_id = uuid.uuid4(), uuid.uuid4()
+    agents = [uuid.uuid4() for _ in range(6)]  # agents[0] is the asking agent
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": user_id, "email": "bench@example.com", "password_hash": "x", "name": "B"}])
+        conn.execute(Project.__table__.insert(), [{"id": project_id, "user_id": user_id, "name": "P", "context_source": "hybrid"}])
+        conn.execute(Agent.__table__.insert(), [
+            {"id": a, "user_id": user_id, "project_id": project_id, "agent_type": "project_agent", "name": f"Agent {i}"}
+            for i, a in enumerate(agents)
+        ])
+    message_ids = [uuid.uuid4() for _ in messages]
+    for start in range(0, len(messages), BATCH):
+        chunk = list(enumerate(messages[start:start + BATCH], start))
+        with engine.begin() as conn:
+            conn.execute(ChatMessage.__table__.insert(), [
+                {"id": message_ids[i], "user_id": user_id, "agent_id": agents[1 + i % 5], "project_id": project_id,
+                 "role": "assistant", "content": content}
+                for i, (_, _, content, _) in chunk
+            ])
+            conn.execute(MessageEmbedding.__table__.insert(), [
+                {"id": uuid.uuid4(), "project_id": project_id, "message_id": message_ids[i], "agent_id": agents[1 + i % 5],
+                 "content": content, "embedding": vector.tolist()}
+                for i, (_, _, content, vector) in chunk
+            ])
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE INDEX ON chat_messages USING gin (to_tsvector('{settings.FULLTEXT_CONFIG}'::regconfig, content))"
+        ))
+        ops = "halfvec_cosine_ops" if settings.EMBEDDING_HALF_PRECISION else "vector_cosine_ops"
+        conn.execute(text(f"CREATE INDEX ON message_embeddings USING hnsw (embedding {ops})"))
+        conn.execute(text("ANALYZE"))
+    return project_id, agents[1:], message_ids
+
+
+async def run_mode(mode, session_factory, project_id, agent_ids, queries, k):
+    """Returns (result id lists, per-query ms)"""
+    HybridProvider._embeddings_down_until = math.inf if mode == "lexical" else 0.0
+    results, samples = [], []
+    for query in queries:
+        started = time.perf_counter()
+        async with session_factory() as db:
+            if mode == "rag":
+                provider = RAGProvider(db)
+                embedding = await provider._get_embedding(query)
+                rows = await provider.search(project_id, agent_ids, embedding, k)
+                ids = [row.message_id for row, _ in rows]
+            else:
+                rows, _ = await HybridProvider(db).search(project_id, agent_ids, query, k)
+                ids = [message_id for message_id, _, _ in rows]
+        samples.append((time.perf_counter() - started) * 1000)
+        results.append(ids)
+    HybridProvider._embeddings_down_until = 0.0
+    return results, samples
+
+
+async def evaluate(args, url, project_id, agent_ids, message_ids, messages, query_vectors, known_item, topical):
+    fake = SyntheticEmbeddings(query_vectors, args.embed_latency_ms)
+    rag_provider.embedding_client = fake
+    hybrid_provider.embedding_client = fake
+    project_sizes.clear()
+
+    engine = create_async_engine(to_async_database_url(url))
+    register_vector_codec(engine)
+    session_factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    topic_of = {message_id: messages[i][0] for i, message_id in enumerate(message_ids)}
+
+    print(f"{'mode':<8} {'queries':<10} {'quality':>14} {'p50':>9} {'p99':>9}")
+    try:
+        for mode in ("rag", "hybrid", "lexical"):
+            ids, samples = await run_mode(mode, session_factory, project_id, agent_ids, [q for q, _ in known_item], args.k)
+            hits = sum(message_ids[target] in got for (_, target), got in zip(known_item, ids)) / len(known_item)
+            print(f"{mode:<8} {'known-item':<10} {'hit@' + str(args.k) + ' ' + format(hits, '.3f'):>14} "
+                  f"{np.percentile(samples, 50):>7.1f}ms {np.percentile(samples, 99):>7.1f}ms")
+
+            ids, samples = await run_mode(mode, session_factory, project_id, agent_ids, [q for q, _ in topical], args.k)
+            precision = sum(
+                sum(topic_of[m] == topic for m in got) / args.k for (_, topic), got in zip(topical, ids)
+            ) / len(topical)
+            print(f"{mode:<8} {'topical':<10} {'P@' + str(args.k) + ' ' + format(precision, '.3f'):>14} "
+                  f"{np.percentile(samples, 50):>7.1f}ms {np.percentile(samples, 99):>7.1f}ms")
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Postgres URL with pgvector installed")
+    parser.add_argument("--messages", type=int, default=50_000)
+    parser.add_argument("--topics", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--embed-latency-ms", type=float, default=150)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    centres, vocab, messages = build_corpus(args, rng)
+    query_vectors, known_item, topical = build_queries(args, rng, centres, vocab, messages)
+
+    engine = make_engine(args.url)
+    try:
+        project_id, agent_ids, message_ids = seed(engine, messages)
+        print(f"{args.messages:,} messages, {args.topics} topics, simulated embedding latency {args.embed_latency_ms:.0f}ms")
+        asyncio.run(evaluate(
+            args, args.url, project_id, agent_ids, message_ids, messages, query_vectors, known_item, topical
+        ))
+    finally:
+        Base.metadata.drop_all(engine, tables=list(reversed(TABLES)))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+In-memory vector store: search latency, memory and recall by project size.
+
+Builds ProjectIndex matrices of synthetic clustered embeddings and times
+`search` for a query filtered to all agents and to one agent in four.
+Recall@k is measured against a float64 brute force over the raw vectors,
+so it only reflects float32 rounding (it should be 1.0). Runs in-process;
+no database needed.
+
+Usage:
+    python -m benchmarks.memory_vector_store --sizes 1000 10000 50000 --dim 1536
+"""
+
+import argparse
+import uuid
+
+import numpy as np
+
+from app.services.vector_stores import ProjectIndex, VectorRecord
+from benchmarks.common import time_call
+from benchmarks.vector_recall import synthetic_embeddings
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=100)
+    parser.add_argument("--agents", type=int, default=4)
+    parser.add_argument("--k", type=int, default=30)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    agents = [uuid.uuid4() for _ in range(args.agents)]
+    print(f"{'rows':>8} {'MB':>8} {'all p50':>9} {'all p95':>9} {'1/4 p50':>9} {'1/4 p95':>9} {'recall':>7}")
+    for size in args.sizes:
+        vectors = synthetic_embeddings(size, args.dim, args.clusters, rng)
+        owners = rng.integers(args.agents, size=size)
+        project_id = uuid.uuid4()
+        index = ProjectIndex(project_id, args.dim, (
+            VectorRecord(uuid.uuid4(), project_id, agents[owner], "x" * 200, vector)
+            for owner, vector in zip(owners, vectors)
+        ))
+        queries = synthetic_embeddings(args.queries, args.dim, args.clusters, rng)
+
+        position = iter(range(10 ** 9))
+        all_agents = time_call(lambda: index.search(agents, queries[next(position) % args.queries], args.k), 50)
+        one_agent = time_call(lambda: index.search(agents[:1], queries[next(position) % args.queries], args.k), 50)
+
+        normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        ids = [message_id for message_id, _, _ in index.rows]
+        hits = 0
+        for query in queries:
+            exact = np.argsort(-(normalized @ (query / np.linalg.norm(query))))[:args.k]
+            found = {record.message_id for record, _ in index.search(agents, query, args.k)}
+            hits += len(found & {ids[i] for i in exact})
+        recall = hits / (args.k * args.queries)
+
+        print(
+            f"{size:>8} {index.size_bytes / 2 ** 20:>8.1f} "
+            f"{all_agents['median_ms']:>8.2f}ms {all_agents['p95_ms']:>8.2f}ms "
+            f"{one_agent['median_ms']:>8.2f}ms {one_agent['p95_ms']:>8.2f}ms {recall:>7.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
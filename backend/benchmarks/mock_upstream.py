@@ -0,0 +1,207 @@
+"""
+Local OpenAI-compatible mock upstream for connection and latency benchmarks.
+
+A minimal HTTP/1.1 server with keep-alive that answers
+
+- GET  /v1/models
+- POST /v1/chat/completions (streamed with chunked SSE, or not)
+- POST /v1/embeddings
+
+and counts the connections it accepts. Every new connection is delayed
+by `handshake_ms` before its first response, standing in for the TCP +
+TLS handshake with the real API; streamed replies wait `first_token_ms`
+and then `token_interval_ms` between tokens, and stop early (counted in
+`streams_cancelled`) when the client hangs up.
+
+Usage (standalone):
+    python -m benchmarks.mock_upstream --port 8400 --handshake-ms 50
+    OPENAI_BASE_URL=http://127.0.0.1:8400/v1 OPENAI_API_KEY=sk-mock uvicorn app.main:app
+"""
+
+import argparse
+import asyncio
+import json
+from typing import Optional, Sequence
+
+
+class MockUpstream:
+    """In-process mock of the OpenAI API; `connections` and `requests` count what it served"""
+
+    def __init__(
+        self,
+        handshake_ms: float = 0.0,
+        first_token_ms: float = 0.0,
+        token_interval_ms: float = 0.0,
+        tokens: Sequence[str] = ("Hello", " from", " the", " mock"),
+        status: int = 200
+    ):
+        self.handshake_ms = handshake_ms
+        self.first_token_ms = first_token_ms
+        self.token_interval_ms = token_interval_ms
+        self.tokens = list(tokens)
+        self.status = status  # anything but 200 answers every request with that error
+        self.connections = 0
+        self.requests = 0
+        self.streams_completed = 0
+        self.streams_cancelled = 0
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._handlers = set()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}/v1"
+
+    async def start(self, port: int = 0) -> str:
+        self._server = await asyncio.start_server(self._handle, "127.0.0.1", port)
+        return self.base_url
+
+    async def stop(self) -> None:
+        if self._server is None:
+            return
+        self._server.close()
+        for handler in list(self._handlers):
+            handler.cancel()
+        await asyncio.gather(*self._handlers, return_exceptions=True)
+        await self._server.wait_closed()
+        self._server = None
+
+    async def __aenter__(self) -> "MockUpstream":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        self.connections += 1
+        self._handlers.add(asyncio.current_task())
+        handshake = self.handshake_ms
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, path, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, value = line.decode("latin-1").split(":", 1)
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                self.requests += 1
+                if handshake:
+                    await asyncio.sleep(handshake / 1000)
+                    handshake = 0
+                await self._respond(reader, writer, method, path.split("?")[0], json.loads(body) if body else {})
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+    async def _respond(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, method: str, path: str, body: dict
+    ) -> None:
+        if self.status != 200:
+            error = {"error": {"message": "mock upstream error", "type": "server_error"}}
+            return await self._send_json(writer, error, self.status)
+        if path.endswith("/models"):
+            return await self._send_json(writer, {
+                "object": "list", "data": [{"id": "mock", "object": "model", "created": 0, "owned_by": "mock"}]
+            })
+        if path.endswith("/embeddings"):
+            inputs = body.get("input", [])
+            inputs = [inputs] if isinstance(inputs, str) else inputs
+            dimensions = body.get("dimensions", 8)
+            return await self._send_json(writer, {
+                "object": "list",
+                "model": body.get("model", "mock"),
+                "data": [
+                    {"object": "embedding", "index": i, "embedding": [float(len(text))] + [0.0] * (dimensions - 1)}
+                    for i, text in enumerate(inputs)
+                ],
+                "usage": {"prompt_tokens": len(inputs), "total_tokens": len(inputs)},
+            })
+        if path.endswith("/chat/completions"):
+            if body.get("stream"):
+                return await self._stream_chat(reader, writer, body)
+            await asyncio.sleep(self.first_token_ms / 1000)
+            return await self._send_json(writer, {
+                "id": "chatcmpl-mock", "object": "chat.completion", "created": 0, "model": body.get("model", "mock"),
+                "choices": [{
+                    "index": 0, "finish_reason": "stop",
+                    "message": {"role": "assistant", "content": "".join(self.tokens)},
+                }],
+                "usage": self._usage(body),
+            })
+        await self._send_json(writer, {"error": {"message": f"no route {method} {path}"}}, 404)
+
+    def _usage(self, body: dict) -> dict:
+        prompt = sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", []))
+        return {"prompt_tokens": prompt, "completion_tokens": len(self.tokens), "total_tokens": prompt + len(self.tokens)}
+
+    async def _send_json(self, writer: asyncio.StreamWriter, payload: dict, status: int = 200) -> None:
+        data = json.dumps(payload).encode()
+        writer.write(
+            f"HTTP/1.1 {status} {'OK' if status == 200 else 'Error'}\r\n"
+            f"content-type: application/json\r\ncontent-length: {len(data)}\r\n\r\n".encode() + data
+        )
+        await writer.drain()
+
+    async def _pause(self, reader: asyncio.StreamReader, ms: float) -> bool:
+        """Wait `ms`; False if the client hung up meanwhile"""
+        # Mid-response an HTTP/1.1 client sends nothing, so any read result means EOF
+        hangup = asyncio.ensure_future(reader.read(1))
+        done, _ = await asyncio.wait({hangup}, timeout=ms / 1000)
+        if done:
+            return False
+        hangup.cancel()
+        await asyncio.gather(hangup, return_exceptions=True)  # let go of the reader before the next readline()
+        return True
+
+    async def _stream_chat(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, body: dict) -> None:
+        writer.write(b"HTTP/1.1 200 OK\r\ncontent-type: text/event-stream\r\ntransfer-encoding: chunked\r\n\r\n")
+        await writer.drain()
+        base = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": 0, "model": body.get("model", "mock")}
+        for i, token in enumerate(self.tokens):
+            if not await self._pause(reader, self.token_interval_ms if i else self.first_token_ms):
+                self.streams_cancelled += 1
+                raise ConnectionResetError("client hung up")
+            chunk = dict(base, choices=[{"index": 0, "delta": {"content": token}, "finish_reason": None}])
+            await self._send_event(writer, json.dumps(chunk))
+        if body.get("stream_options", {}).get("include_usage"):
+            await self._send_event(writer, json.dumps(dict(base, choices=[], usage=self._usage(body))))
+        await self._send_event(writer, "[DONE]")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+        self.streams_completed += 1
+
+    async def _send_event(self, writer: asyncio.StreamWriter, data: str) -> None:
+        event = f"data: {data}\n\n".encode()
+        writer.write(f"{len(event):x}\r\n".encode() + event + b"\r\n")
+        await writer.drain()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8400)
+    parser.add_argument("--handshake-ms", type=float, default=50)
+    parser.add_argument("--first-token-ms", type=float, default=200)
+    parser.add_argument("--token-interval-ms", type=float, default=20)
+    args = parser.parse_args()
+
+    async def serve():
+        upstream = MockUpstream(args.handshake_ms, args.first_token_ms, args.token_interval_ms)
+        print(f"Mock upstream at {await upstream.start(args.port)}")
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Connections, handshakes and latency of LLM calls: per-request vs shared clients.
+
+Sends bursts of concurrent streamed chat completions to a local mock
+upstream (benchmarks.mock_upstream) that delays the first response on
+every new connection by --handshake-ms, standing in for TCP + TLS setup
+with the real API. Bursts are --gap-seconds apart, like chat traffic
+with idle spells. Compares:
+
+- per-request: a new AsyncOpenAI client per call, closed afterwards (how
+  RAG clients used to be built per ContextManager)
+- sdk-default: one shared AsyncOpenAI with the SDK's default pool, which
+  drops idle connections after 5 s; no warmup
+- shared-tuned: openai_clients' registry (long keep-alive, tuned limits)
+  warmed at startup with --warmup connections
+
+Reports connections opened (each one a TLS handshake against the real
+API), handshakes avoided vs per-request, and p50 / p95 time to first
+token and to the full reply.
+
+Usage:
+    python -m benchmarks.openai_connection_pool --bursts 3 --concurrency 16 --gap-seconds 6
+"""
+
+import argparse
+import asyncio
+import threading
+import time
+
+import numpy as np
+from openai import AsyncOpenAI
+
+from app.config import settings
+from app.services.openai_clients import OpenAIClientRegistry, Provider
+from benchmarks.mock_upstream import MockUpstream
+
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+async def timed_stream(client: AsyncOpenAI):
+    start = time.perf_counter()
+    first = None
+    stream = await client.chat.completions.create(model="mock", messages=MESSAGES, stream=True)
+    async for chunk in stream:
+        if first is None and chunk.choices:
+            first = time.perf_counter() - start
+    return first * 1000, (time.perf_counter() - start) * 1000
+
+
+class UpstreamThread:
+    """The mock upstream on its own event loop, so it is not queued behind the clients' work"""
+
+    def __init__(self, upstream: MockUpstream):
+        self.upstream = upstream
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+
+    def start(self) -> str:
+        self.thread.start()
+        return asyncio.run_coroutine_threadsafe(self.upstream.start(), self.loop).result()
+
+    def stop(self) -> None:
+        asyncio.run_coroutine_threadsafe(self.upstream.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+
+async def run_strategy(name: str, args) -> dict:
+    upstream = MockUpstream(args.handshake_ms, args.first_token_ms, args.token_interval_ms)
+    server = UpstreamThread(upstream)
+    base_url = server.start()
+    registry, shared = None, None
+    if name == "sdk-default":
+        shared = AsyncOpenAI(api_key="sk-mock", base_url=base_url)
+    elif name == "shared-tuned":
+        registry = OpenAIClientRegistry(providers={"openai": Provider("openai", "sk-mock", base_url)})
+        await registry.start(warmup_connections=args.warmup)
+        shared = registry.get()
+    warmup_connections = upstream.connections
+
+    async def call():
+        if shared is not None:
+            return await timed_stream(shared)
+        client = AsyncOpenAI(api_key="sk-mock", base_url=base_url)
+        try:
+            return await timed_stream(client)
+        finally:
+            await client.close()
+
+    samples = []
+    for burst in range(args.bursts):
+        if burst:
+            await asyncio.sleep(args.gap_seconds)
+        samples += await asyncio.gather(*(call() for _ in range(args.concurrency)))
+
+    if registry is not None:
+        await registry.aclose()
+    elif shared is not None:
+        await shared.close()
+    server.stop()
+    ttft, total = np.array(samples).T
+    return {
+        "connections": upstream.connections - warmup_connections,
+        "ttft": (np.percentile(ttft, 50), np.percentile(ttft, 95)),
+        "total": (np.percentile(total, 50), np.percentile(total, 95)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--bursts", type=int, default=3)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--gap-seconds", type=float, default=6.0)
+    parser.add_argument("--handshake-ms", type=float, default=60.0)
+    parser.add_argument("--first-token-ms", type=float, default=150.0)
+    parser.add_argument("--token-interval-ms", type=float, default=10.0)
+    parser.add_argument("--warmup", type=int, default=None, help="default: --concurrency")
+    args = parser.parse_args()
+    args.warmup = args.concurrency if args.warmup is None else args.warmup
+    settings.OPENAI_HTTP2 = False  # the mock upstream speaks HTTP/1.1
+
+    results = {name: asyncio.run(run_strategy(name, args)) for name in ("per-request", "sdk-default", "shared-tuned")}
+    requests = args.bursts * args.concurrency
+    baseline = results["per-request"]["connections"]
+    print(f"{requests} streamed calls in {args.bursts} bursts of {args.concurrency}, "
+          f"{args.gap_seconds:g} s apart; simulated handshake {args.handshake_ms:g} ms")
+    print(f"{'strategy':<13} {'handshakes':>10} {'avoided':>8} {'TTFT p50':>9} {'p95':>7} {'total p50':>10} {'p95':>7}")
+    for name, r in results.items():
+        print(
+            f"{name:<13} {r['connections']:>10} {baseline - r['connections']:>8} "
+            f"{r['ttft'][0]:>9.1f} {r['ttft'][1]:>7.1f} {r['total'][0]:>10.1f} {r['total'][1]:>7.1f}"
+        )
+    print("(handshakes exclude the shared-tuned warmup, which happens before traffic)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Prompt tokens of RAG shared context per turn: top-k vs cutoff + MMR + budget.
+
+Replays synthetic conversations against a synthetic project history and,
+for every user turn, builds the shared context from the same nearest
+RAG_CANDIDATES chunks with each stage switched on in turn:
+
+- top-k (old): the `limit` nearest chunks, all inserted
+- cutoff: RAG_MAX_DISTANCE
+- cutoff+MMR: rag_provider.select_chunks with RAG_MMR_LAMBDA
+- cutoff+MMR+budget: plus fit_to_budget (RAG_CONTEXT_TOKEN_BUDGET)
+
+The history has sub-topics under shared themes (so weak, same-theme
+matches exist) and repeated messages (pasted errors, re-sent questions)
+as near-duplicate vectors. Reports tokens per turn and how many distinct
+relevant messages (same sub-topic, duplicates counted once) each context
+carries. Token counts use tiktoken when installed, else ~4 chars/token. Runs in-process; no database needed.
+
+Usage:
+    python -m benchmarks.rag_context_tokens --conversations 200 --turns 8
+"""
+
+import argparse
+
+import numpy as np
+
+from app.config import settings
+from app.services.context_providers.rag_provider import Chunk, fit_to_budget, select_chunks
+from app.services.token_counter import count_tokens
+
+HEADER = "SHARED CONTEXT FROM OTHER AGENTS IN PROJECT (semantic search):"
+
+
+def unit(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=-1, keepdims=True)
+
+
+def build_history(args, rng):
+    """(vectors, texts, topic ids, duplicate-group ids) and the topic centres"""
+    dim = args.dim
+    themes = unit(rng.standard_normal((args.themes, dim)))
+    topics_per_theme = args.topics // args.themes
+    own = np.sqrt(1 - args.theme_weight ** 2)
+    centres = unit(
+        np.repeat(themes, topics_per_theme, axis=0) * args.theme_weight
+        + unit(rng.standard_normal((args.themes * topics_per_theme, dim))) * own
+    )
+    vocab = [[f"t{t}w{j}" for j in range(40)] for t in range(len(centres))]
+    filler = "the we it is to and of for that this on with as you can will be".split()
+
+    vectors, texts, topics, groups = [], [], [], []
+    group = 0
+    while len(vectors) < args.messages:
+        topic = int(rng.integers(len(centres)))
+        words = int(rng.integers(10, 120))
+        text = " ".join(rng.choice(vocab[topic] + filler, words))
+        base = unit(centres[topic] + 0.8 * unit(rng.standard_normal(dim)))
+        copies = int(rng.choice([1, 1, 1, 2, 3, 4]))  # re-sent / pasted again
+        for _ in range(copies):
+            vectors.append(unit(base + 0.05 * unit(rng.standard_normal(dim))))
+            texts.append(text)
+            topics.append(topic)
+            groups.append(group)
+        group += 1
+    return np.array(vectors[:args.messages]), texts, np.array(topics), np.array(groups), centres
+
+
+VARIANTS = [
+    # name, distance cutoff, MMR lambda, token budget (None = settings)
+    ("top-k (old)", 2.0, 1.0, 10**9),
+    ("cutoff", None, 1.0, 10**9),
+    ("cutoff+MMR", None, None, 10**9),
+    ("cutoff+MMR+budget", None, None, None),
+]
+
+
+def build_context(query, vectors, texts, limit, max_distance, mmr_lambda, token_budget):
+    """(formatted context, history indexes included)"""
+    distances = 1.0 - vectors @ query
+    nearest = np.argsort(distances)[:max(settings.RAG_CANDIDATES, limit)]
+    chunks = [Chunk(i, texts[i], float(distances[i]), vectors[i]) for i in nearest]  # agent_id slot holds the index
+
+    selected = select_chunks(chunks, limit, max_distance, mmr_lambda)
+    lines = [f"[Agent]: {chunk.content}" for chunk in selected]
+    budget = settings.RAG_CONTEXT_TOKEN_BUDGET if token_budget is None else token_budget
+    kept = fit_to_budget(HEADER, lines, budget)
+    kept_set = set(kept)
+    included = [chunk.agent_id for chunk, line in zip(selected, lines) if line in kept_set]
+    return ("\n".join([HEADER] + kept) if kept else ""), included
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--messages", type=int, default=5_000)
+    parser.add_argument("--themes", type=int, default=50)
+    parser.add_argument("--topics", type=int, default=1_000)
+    parser.add_argument("--theme-weight", type=float, default=0.7, help="How similar sub-topics of a theme are")
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=8)
+    parser.add_argument("--limit", type=int, default=20, help="Chunks requested per turn (ContextManager default)")
+    parser.add_argument("--dim", type=int, default=256)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors, texts, topics, groups, centres = build_history(args, rng)
+    turns = []
+    for _ in range(args.conversations):
+        topic = int(rng.integers(len(centres)))
+        turns.extend(
+            (topic, unit(centres[topic] + 0.8 * unit(rng.standard_normal(args.dim))))
+            for _ in range(args.turns)
+        )
+
+    print(
+        f"{args.conversations} conversations x {args.turns} turns, {len(texts):,} history messages, "
+        f"limit {args.limit}, cutoff {settings.RAG_MAX_DISTANCE}, MMR lambda {settings.RAG_MMR_LAMBDA}, "
+        f"budget {settings.RAG_CONTEXT_TOKEN_BUDGET}"
+    )
+    print(f"{'':<18} {'mean tokens':>12} {'p50':>7} {'p95':>7} {'chunks':>7} {'relevant':>9} {'vs old':>7}")
+    baseline = None
+    for name, max_distance, mmr_lambda, token_budget in VARIANTS:
+        tokens, chunks, relevant = [], [], []
+        for topic, query in turns:
+            context, included = build_context(
+                query, vectors, texts, args.limit, max_distance, mmr_lambda, token_budget
+            )
+            tokens.append(count_tokens(context))
+            chunks.append(len(included))
+            # Distinct on-topic messages; a re-sent message counts once
+            relevant.append(len({groups[i] for i in included if topics[i] == topic}))
+        tokens = np.array(tokens)
+        baseline = baseline if baseline is not None else tokens.mean()
+        print(
+            f"{name:<18} {tokens.mean():>12.0f} {np.percentile(tokens, 50):>7.0f} {np.percentile(tokens, 95):>7.0f} "
+            f"{np.mean(chunks):>7.1f} {np.mean(relevant):>9.2f} {tokens.mean() / baseline - 1:>+7.1%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Recency shared context: agent_id IN (...) lookup vs the project activity feed.
+
+Seeds one project with --agents agents and N messages (plus noise in other
+projects), then times both ways of fetching the newest messages from the
+other agents:
+
+- old: load the project's other agents, then
+  `agent_id IN (...) ORDER BY created_at DESC LIMIT n`
+- new: one range scan of (project_id, created_at DESC) joined to agents
+
+Usage:
+    python -m benchmarks.recency_feed --url postgresql://... --sizes 10000 100000 1000000
+    python -m benchmarks.recency_feed  # SQLite temp file, for a quick run
+"""
+
+import argparse
+import os
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import and_, select, text
+from sqlalchemy.orm import Session
+
+from app.database import Base
+from app.models import User, Project, Agent, ChatMessage
+from app.services.context_providers.recency_provider import RecencyProvider
+from benchmarks.common import make_engine, time_call
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+BATCH = 10_000
+TABLES = [User.__table__, Project.__table__, Agent.__table__, ChatMessage.__table__]
+
+
+def seed(engine, messages: int, agents: int):
+    """One target project plus a same-sized noise project; returns (project_id, current_agent_id)"""
+    Base.metadata.drop_all(engine, tables=list(reversed(TABLES)))
+    Base.metadata.create_all(engine, tables=TABLES)
+    with engine.begin() as conn:
+        # Indexes the pre-feed schema relied on (see migration 002)
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_messages_agent_id ON chat_messages (agent_id)"))
+        conn.execute(text("CREATE INDEX IF NOT EXISTS ix_chat_messages_created_at ON chat_messages (created_at)"))
+
+    user_id = uuid.uuid4()
+    projects = [uuid.uuid4(), uuid.uuid4()]
+    agent_ids = {p: [uuid.uuid4() for _ in range(agents)] for p in projects}
+    with engine.begin() as conn:
+        conn.execute(User.__table__.insert(), [{"id": user_id, "email": "bench@example.com", "password_hash": "x", "name": "B"}])
+        conn.execute(Project.__table__.insert(), [{"id": p, "user_id": user_id, "name": "P"} for p in projects])
+        conn.execute(Agent.__table__.insert(), [
+            {"id": a, "user_id": user_id, "project_id": p, "agent_type": "project_agent", "name": f"Agent {i}"}
+            for p in projects for i, a in enumerate(agent_ids[p])
+        ])
+
+    role_values = ["user", "assistant"]
+    for start in range(0, messages * len(projects), BATCH):
+        rows = []
+        for i in range(start, min(start + BATCH, messages * len(projects))):
+            project = projects[i % len(projects)]
+            rows.append({
+                "id": uuid.uuid4(),
+                "user_id": user_id,
+                "agent_id": agent_ids[project][(i // len(projects)) % agents],
+                "project_id": project,
+                "role": role_values[i % 2],
+                "content": f"message {i} " + "lorem ipsum " * 20,
+                "is_truncated": False,
+                "created_at": T0 + timedelta(milliseconds=i),
+            })
+        with engine.begin() as conn:
+            conn.execute(ChatMessage.__table__.insert(), rows)
+    with engine.begin() as conn:
+        conn.execute(text("ANALYZE"))
+    return projects[0], agent_ids[projects[0]][0]
+
+
+def old_lookup(db: Session, project_id, current_agent_id, limit):
+    other_agents = db.execute(
+        select(Agent).where(and_(Agent.project_id == project_id, Agent.id != current_agent_id))
+    ).scalars().all()
+    rows = db.execute(
+        select(ChatMessage)
+        .where(ChatMessage.agent_id.in_([a.id for a in other_agents]))
+        .order_by(ChatMessage.created_at.desc())
+        .limit(limit)
+    ).scalars().all()
+    return [
+        (next((a for a in other_agents if a.id == m.agent_id), None).name, m.role, m.content[:200])
+        for m in rows
+    ]
+
+
+def new_lookup(db: Session, project_id, current_agent_id, limit):
+    return [row[2:] for row in db.execute(RecencyProvider.feed_query(project_id, current_agent_id, limit))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="Database URL (default: SQLite temp file)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--agents", type=int, default=25, help="Agents per project")
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    url = args.url or f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'recency_feed.db')}"
+    engine = make_engine(url)
+    print(f"{engine.dialect.name}, {args.agents} agents/project, limit {args.limit}")
+    print(f"{'messages/project':>16} {'old median':>11} {'old p95':>9} {'new median':>11} {'new p95':>9} {'speedup':>8}")
+    for size in args.sizes:
+        project_id, agent_id = seed(engine, size, args.agents)
+        with Session(engine) as db:
+            assert [r[0] for r in old_lookup(db, project_id, agent_id, args.limit)] == \
+                [r[0] for r in new_lookup(db, project_id, agent_id, args.limit)]
+            old = time_call(lambda: old_lookup(db, project_id, agent_id, args.limit), args.repeat)
+            new = time_call(lambda: new_lookup(db, project_id, agent_id, args.limit), args.repeat)
+        print(
+            f"{size:>16,} {old['median_ms']:>9.2f}ms {old['p95_ms']:>7.2f}ms "
+            f"{new['median_ms']:>9.2f}ms {new['p95_ms']:>7.2f}ms {old['median_ms'] / new['median_ms']:>7.1f}x"
+        )
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+HNSW recall and latency for the RAG similarity search.
+
+For each table size, loads clustered synthetic unit vectors into a scratch
+table, builds the HNSW index with the given m / ef_construction, and sweeps
+hnsw.ef_search. Ground truth is exact cosine top-k computed with NumPy, so
+recall@k is measured against the true neighbours, not against a sequential
+scan that may itself use the index.
+
+Reports per ef_search: recall@k, p50 and p99 query latency. Requires
+Postgres with pgvector >= 0.5.0 (HNSW); there is no SQLite mode.
+
+Usage:
+    python -m benchmarks.vector_recall --url postgresql://... \
+        --sizes 10000 100000 1000000 --ef-search 20 40 100 200
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.common import make_engine
+
+TABLE = "bench_vector_recall"
+BATCH = 5_000
+
+
+def synthetic_embeddings(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    """Unit vectors around `clusters` random centres; real embeddings are similarly clumpy"""
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centres[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def to_literal(vector: np.ndarray) -> str:
+    return "[" + ",".join(f"{x:.6f}" for x in vector) + "]"
+
+
+def load(engine, vectors: np.ndarray) -> None:
+    dim = vectors.shape[1]
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(f"CREATE TABLE {TABLE} (id integer PRIMARY KEY, embedding vector({dim}))"))
+    for start in range(0, len(vectors), BATCH):
+        rows = [
+            {"id": start + i, "embedding": to_literal(v)}
+            for i, v in enumerate(vectors[start:start + BATCH])
+        ]
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"INSERT INTO {TABLE} (id, embedding) VALUES (:id, CAST(:embedding AS vector))"),
+                rows
+            )
+
+
+def build_index(engine, m: int, ef_construction: int) -> float:
+    """Build the HNSW index the way migration 008 does; returns seconds"""
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE INDEX ON {TABLE} USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {m}, ef_construction = {ef_construction})"
+        ))
+        conn.execute(text(f"ANALYZE {TABLE}"))
+    return time.perf_counter() - start
+
+
+def exact_top_k(vectors: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    scores = queries @ vectors.T  # cosine similarity; all vectors are unit length
+    top = np.argpartition(-scores, k, axis=1)[:, :k]
+    return top
+
+
+def search(engine, queries: np.ndarray, truth: np.ndarray, k: int, ef_search: int):
+    """Returns (recall@k, p50 ms, p99 ms) for one ef_search setting"""
+    hits = 0
+    samples = []
+    with engine.connect() as conn:
+        conn.execute(text("SELECT set_config('hnsw.ef_search', :v, false)"), {"v": str(ef_search)})
+        statement = text(
+            f"SELECT id FROM {TABLE} ORDER BY embedding <=> CAST(:q AS vector) LIMIT :k"
+        )
+        for query, expected in zip(queries, truth):
+            literal = to_literal(query)
+            started = time.perf_counter()
+            ids = conn.execute(statement, {"q": literal, "k": k}).scalars().all()
+            samples.append((time.perf_counter() - started) * 1000)
+            hits += len(set(ids) & set(expected.tolist()))
+    samples.sort()
+    return (
+        hits / (len(queries) * k),
+        float(np.percentile(samples, 50)),
+        float(np.percentile(samples, 99)),
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Postgres URL with pgvector installed")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000])
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--clusters", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[10, 20, 40, 100, 200])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    engine = make_engine(args.url)
+    rng = np.random.default_rng(args.seed)
+
+    print(f"dim={args.dim}, k={args.k}, m={args.m}, ef_construction={args.ef_construction}, {args.queries} queries")
+    try:
+        for size in args.sizes:
+            vectors = synthetic_embeddings(size, args.dim, args.clusters, rng)
+            # Queries are perturbed corpus points, like a user asking about something already discussed
+            picks = rng.integers(0, size, size=args.queries)
+            queries = vectors[picks] + 0.2 * rng.standard_normal((args.queries, args.dim)).astype(np.float32)
+            queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+            truth = exact_top_k(vectors, queries, args.k)
+
+            load(engine, vectors)
+            build_seconds = build_index(engine, args.m, args.ef_construction)
+            print(f"\n{size:,} rows, index build {build_seconds:.1f}s")
+            print(f"{'ef_search':>9}  {'recall@' + str(args.k):>9}  {'p50':>8}  {'p99':>8}")
+            for ef_search in args.ef_search:
+                recall, p50, p99 = search(engine, queries, truth, args.k, ef_search)
+                print(f"{ef_search:>9}  {recall:>9.3f}  {p50:>6.2f}ms  {p99:>6.2f}ms")
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""
+Storage size, index build time and recall per embedding encoding.
+
+Each setting is DIMENSIONS with an optional "h" suffix for halfvec, e.g.
+1536, 1536h, 512h. Synthetic vectors have variance that decays along
+the dimensions, like text-embedding-3 output, so truncating to fewer
+dimensions keeps most of the neighbourhood structure. Every setting is
+loaded into a scratch table the way migration 009 encodes it:
+leading components, re-normalized, then cast to vector or halfvec.
+
+Recall@k is measured against exact top-k on the full float32 vectors, so
+it includes the loss from both the encoding and the HNSW index. Requires
+Postgres with pgvector >= 0.7.0 (halfvec); there is no SQLite mode.
+
+Usage:
+    python -m benchmarks.vector_storage --url postgresql://... --rows 100000 \
+        --settings 1536 1536h 768h 512h 256h
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.common import make_engine
+from benchmarks.vector_recall import exact_top_k, to_literal
+
+TABLE = "bench_vector_storage"
+BATCH = 5_000
+
+
+def matryoshka_like(n: int, dim: int, clusters: int, rng: np.random.Generator) -> np.ndarray:
+    scale = (1.0 / np.sqrt(np.arange(1, dim + 1))).astype(np.float32)
+    centres = rng.standard_normal((clusters, dim)).astype(np.float32) * scale
+    labels = rng.integers(0, clusters, size=n)
+    vectors = centres[labels] + 0.35 * rng.standard_normal((n, dim)).astype(np.float32) * scale
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def encode(vectors: np.ndarray, dimensions: int) -> np.ndarray:
+    reduced = vectors[:, :dimensions]
+    return reduced / np.linalg.norm(reduced, axis=1, keepdims=True)
+
+
+def parse_setting(setting: str):
+    half = setting.endswith("h")
+    return int(setting.rstrip("h")), half
+
+
+def load(engine, vectors: np.ndarray, kind: str, m: int, ef_construction: int):
+    """Returns (table bytes, index bytes, index build seconds)"""
+    dim = vectors.shape[1]
+    with engine.begin() as conn:
+        conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        conn.execute(text(f"CREATE TABLE {TABLE} (id integer PRIMARY KEY, embedding {kind}({dim}))"))
+    for start in range(0, len(vectors), BATCH):
+        rows = [
+            {"id": start + i, "embedding": to_literal(v)}
+            for i, v in enumerate(vectors[start:start + BATCH])
+        ]
+        with engine.begin() as conn:
+            conn.execute(
+                text(f"INSERT INTO {TABLE} VALUES (:id, CAST(:embedding AS {kind}))"),
+                rows
+            )
+    started = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(text(
+            f"CREATE INDEX bench_vector_storage_hnsw ON {TABLE} USING hnsw (embedding {kind}_cosine_ops) "
+            f"WITH (m = {m}, ef_construction = {ef_construction})"
+        ))
+        conn.execute(text(f"ANALYZE {TABLE}"))
+    build_seconds = time.perf_counter() - started
+    with engine.connect() as conn:
+        table_bytes = conn.execute(text(f"SELECT pg_table_size('{TABLE}')")).scalar_one()
+        index_bytes = conn.execute(text("SELECT pg_relation_size('bench_vector_storage_hnsw')")).scalar_one()
+    return table_bytes, index_bytes, build_seconds
+
+
+def recall(engine, queries: np.ndarray, truth: np.ndarray, kind: str, k: int, ef_search: int) -> float:
+    hits = 0
+    with engine.connect() as conn:
+        conn.execute(text("SELECT set_config('hnsw.ef_search', :v, false)"), {"v": str(ef_search)})
+        statement = text(f"SELECT id FROM {TABLE} ORDER BY embedding <=> CAST(:q AS {kind}) LIMIT :k")
+        for query, expected in zip(queries, truth):
+            ids = conn.execute(statement, {"q": to_literal(query), "k": k}).scalars().all()
+            hits += len(set(ids) & set(expected.tolist()))
+    return hits / (len(queries) * k)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", required=True, help="Postgres URL with pgvector >= 0.7.0")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--dim", type=int, default=1536, help="Full model dimension")
+    parser.add_argument("--settings", nargs="+", default=["1536", "1536h", "768h", "512h", "256h"])
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--ef-search", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    vectors = matryoshka_like(args.rows, args.dim, 200, rng)
+    picks = rng.integers(0, args.rows, size=args.queries)
+    queries = encode(vectors[picks] + 0.1 * rng.standard_normal((args.queries, args.dim)).astype(np.float32), args.dim)
+    truth = exact_top_k(vectors, queries, args.k)
+
+    engine = make_engine(args.url)
+    print(f"{args.rows:,} rows, k={args.k}, ef_search={args.ef_search}; recall vs exact float32 {args.dim}-dim top-k")
+    print(f"{'setting':>8} {'bytes/row':>10} {'table':>10} {'index':>10} {'build':>8} {'recall':>7}")
+    try:
+        for setting in args.settings:
+            dimensions, half = parse_setting(setting)
+            kind = "halfvec" if half else "vector"
+            table_bytes, index_bytes, build_seconds = load(
+                engine, encode(vectors, dimensions), kind, args.m, args.ef_construction
+            )
+            setting_recall = recall(engine, encode(queries, dimensions), truth, kind, args.k, args.ef_search)
+            print(
+                f"{setting:>8} {(table_bytes + index_bytes) / args.rows:>10,.0f} "
+                f"{table_bytes / 2**20:>8.1f}MB {index_bytes / 2**20:>8.1f}MB "
+                f"{build_seconds:>7.1f}s {setting_recall:>7.3f}"
+            )
+    finally:
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE IF EXISTS {TABLE}"))
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
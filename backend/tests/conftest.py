@@ -0,0 +1,59 @@
+"""
+Shared pytest configuration.
+
+The models use PostgreSQL column types (UUID, pgvector's Vector). Teach the
+SQLite compiler how to render them so model-level tests can run against a
+local SQLite database.
+"""
+
+import asyncio
+
+import pytest
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.orm import sessionmaker
+
+from app.database import Base
+
+
+@compiles(UUID, "sqlite")
+def _compile_uuid_sqlite(type_, compiler, **kw):
+    return "CHAR(32)"
+
+
+@compiles(Vector, "sqlite")
+def _compile_vector_sqlite(type_, compiler, **kw):
+    return "BLOB"
+
+
+@pytest.fixture
+def sqlite_sessions(tmp_path):
+    """
+    File-backed SQLite database with the full schema.
+
+    Yields (async_session_factory, sync_session_factory) bound to the same
+    database, for exercising the async chat path and seeding/inspecting
+    rows synchronously. The async engine enforces foreign keys, like Postgres.
+    """
+    db_path = tmp_path / "test.db"
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=sync_engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{db_path}")
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _enable_foreign_keys(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+    yield (
+        async_sessionmaker(bind=async_engine, class_=AsyncSession, expire_on_commit=False),
+        sessionmaker(bind=sync_engine, autoflush=False),
+    )
+
+    asyncio.run(async_engine.dispose())
+    Base.metadata.drop_all(bind=sync_engine)
+    sync_engine.dispose()
@@ -0,0 +1,128 @@
+"""
+Tests for the per-turn ChatContext snapshot and the query count of a chat turn
+"""
+
+import asyncio
+import json
+
+from sqlalchemy import event
+
+from app.api.v1 import chat
+from app.models import User, Project, Agent, AgentType, ChatMessage, MessageRole, ContextSource
+from app.services.chat_context import load_chat_context
+from app.services.stream_coalescer import FlushPolicy
+
+PER_TOKEN = FlushPolicy(interval_ms=0, max_bytes=512)
+
+
+def seed_project(sync_session_factory):
+    db = sync_session_factory()
+    user = User(email="context@example.com", password_hash="x", name="C")
+    db.add(user)
+    db.commit()
+    project = Project(
+        user_id=user.id,
+        name="Project",
+        has_prompt=True,
+        prompt_content="Project rules",
+        enable_context_sharing=True,
+        context_source=ContextSource.RECENT,
+    )
+    db.add(project)
+    db.commit()
+    agent = Agent(
+        user_id=user.id,
+        project_id=project.id,
+        agent_type=AgentType.PROJECT_AGENT,
+        name="Writer",
+        has_prompt=True,
+        prompt_content="Write well",
+    )
+    other = Agent(user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT, name="Researcher")
+    db.add_all([agent, other])
+    db.commit()
+    db.add(ChatMessage(
+        user_id=user.id, agent_id=other.id, project_id=project.id,
+        role=MessageRole.ASSISTANT, content="Found three papers"
+    ))
+    db.commit()
+    ids = (user.id, project.id, agent.id, other.id)
+    db.close()
+    return ids
+
+
+async def fake_llm(messages, model="gpt-4o-mini"):
+    for token in ["Hello", " there"]:
+        yield token
+
+
+class QueryCounter:
+    def __init__(self, session_factory):
+        self.statements = []
+        self.engine = session_factory.kw["bind"].sync_engine
+        event.listen(self.engine, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        self.statements.append(statement)
+
+    def close(self):
+        event.remove(self.engine, "before_cursor_execute", self._record)
+
+
+def test_load_chat_context_snapshot(sqlite_sessions):
+    """Agent, project prompts and the project's other agents come back in one query"""
+    session_factory, sync_session_factory = sqlite_sessions
+    user_id, project_id, agent_id, other_id = seed_project(sync_session_factory)
+    counter = QueryCounter(session_factory)
+
+    async def run():
+        async with session_factory() as db:
+            return await load_chat_context(db, agent_id)
+
+    try:
+        ctx = asyncio.run(run())
+    finally:
+        counter.close()
+
+    assert len(counter.statements) == 1
+    assert ctx.user_id == user_id
+    assert ctx.project_id == project_id
+    assert ctx.shares_context
+    assert ctx.other_agents == {other_id: "Researcher"}
+    assert ctx.system_prompt == "PROJECT CONTEXT:\nProject rules\n\nAGENT ROLE:\nWrite well"
+
+
+def test_chat_turn_query_count(sqlite_sessions, monkeypatch):
+    """
+    A project chat turn with recency sharing issues exactly five statements:
+    context load, history, shared-context messages, user insert, assistant insert.
+    """
+    session_factory, sync_session_factory = sqlite_sessions
+    user_id, _, agent_id, _ = seed_project(sync_session_factory)
+    monkeypatch.setattr(chat, "stream_openai_response", fake_llm)
+
+    async def run():
+        return [
+            json.loads(frame[len("data: "):])
+            async for frame in chat.create_sse_generator(
+                agent_id=agent_id,
+                user_id=user_id,
+                message="hello",
+                session_factory=session_factory,
+                flush_policy=PER_TOKEN,
+            )
+        ]
+
+    counter = QueryCounter(session_factory)
+    try:
+        frames = asyncio.run(run())
+    finally:
+        counter.close()
+
+    assert frames[-1] == {"type": "done"}
+    assert [s.split()[0] for s in counter.statements] == ["SELECT", "SELECT", "SELECT", "INSERT", "INSERT"]
+
+    db = sync_session_factory()
+    rows = db.query(ChatMessage).filter(ChatMessage.agent_id == agent_id).all()
+    db.close()
+    assert sorted(r.content for r in rows) == ["Hello there", "hello"]
@@ -0,0 +1,202 @@
+"""
+Tests for rolling conversation summaries: incremental folding, rate-limited
+background updates, and their use in the chat prompt
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.config import settings
+from app.models import User, Agent, AgentType, ChatMessage, ConversationSummary, MessageRole
+from app.services.context_budget import MESSAGE_OVERHEAD_TOKENS
+from app.services.context_manager import ContextManager
+from app.services.conversation_summarizer import SUMMARY_HEADER, ConversationSummarizer, update_summary
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+TOKENS = 10  # stored token count of every seeded message
+
+
+class FakeLLM:
+    """Summaries list the messages they have seen, e.g. 'm0 m1 m2'"""
+
+    def __init__(self, delay=0.0):
+        self.prompts = []
+        self.delay = delay
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, messages):
+        self.prompts.append(messages)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        body = messages[-1]["content"]
+        previous = body.split("EXISTING SUMMARY:\n")[1].split("\n\n")[0]
+        seen = [] if previous == "(none)" else previous.split()
+        new = [line.split(": ", 1)[1] for line in body.split("NEW MESSAGES:\n")[1].splitlines()]
+        return " ".join(seen + new)
+
+
+def seed_agents(sync_session_factory, messages_per_agent, agents=1):
+    db = sync_session_factory()
+    user = User(email="summary@example.com", password_hash="x", name="S")
+    db.add(user)
+    db.commit()
+    agent_rows = [
+        Agent(user_id=user.id, agent_type=AgentType.STANDALONE, name=f"Agent {i}") for i in range(agents)
+    ]
+    db.add_all(agent_rows)
+    db.commit()
+    for agent in agent_rows:
+        add_messages(db, user.id, agent.id, range(messages_per_agent))
+    ids = user.id, [agent.id for agent in agent_rows]
+    db.close()
+    return ids
+
+
+def add_messages(db, user_id, agent_id, numbers):
+    db.add_all([
+        ChatMessage(
+            user_id=user_id, agent_id=agent_id, role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+            content=f"m{i}", token_count=TOKENS, created_at=T0 + timedelta(seconds=i)
+        )
+        for i in numbers
+    ])
+    db.commit()
+
+
+def summary_of(sync_session_factory, agent_id):
+    db = sync_session_factory()
+    row = db.get(ConversationSummary, agent_id)
+    db.close()
+    return row
+
+
+def keep_recent(messages):
+    return messages * (TOKENS + MESSAGE_OVERHEAD_TOKENS)
+
+
+def test_messages_leaving_the_window_are_folded_in_incrementally(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    monkeypatch.setattr(settings, "SUMMARY_KEEP_RECENT_TOKENS", keep_recent(4))
+    user_id, (agent_id,) = seed_agents(sync_session_factory, 10)
+    llm = FakeLLM()
+
+    async def update():
+        async with session_factory() as db:
+            return await update_summary(db, agent_id, llm)
+
+    outcome = asyncio.run(update())
+    assert (outcome.folded, outcome.more) == (6, False)
+    row = summary_of(sync_session_factory, agent_id)
+    assert row.content == "m0 m1 m2 m3 m4 m5"
+    assert row.summarized_count == 6 and row.version == 1
+
+    assert asyncio.run(update()).folded == 0  # the newest four stay verbatim
+    assert len(llm.prompts) == 1
+
+    db = sync_session_factory()
+    add_messages(db, user_id, agent_id, range(10, 13))
+    db.close()
+    assert asyncio.run(update()).folded == 3
+    row = summary_of(sync_session_factory, agent_id)
+    assert row.content == "m0 m1 m2 m3 m4 m5 m6 m7 m8"  # only the new messages were sent
+    assert "m5" not in llm.prompts[-1][-1]["content"].split("NEW MESSAGES:")[1]
+    assert row.summarized_count == 9 and row.version == 2
+
+
+def test_long_backlogs_are_folded_in_bounded_batches(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    monkeypatch.setattr(settings, "SUMMARY_KEEP_RECENT_TOKENS", keep_recent(2))
+    monkeypatch.setattr(settings, "SUMMARY_BATCH_TOKENS", keep_recent(5))
+    _, (agent_id,) = seed_agents(sync_session_factory, 14)
+    llm = FakeLLM()
+
+    async def update():
+        async with session_factory() as db:
+            return await update_summary(db, agent_id, llm)
+
+    assert [(o.folded, o.more) for o in [asyncio.run(update()) for _ in range(3)]] == [
+        (5, True), (5, True), (2, False)
+    ]
+    assert summary_of(sync_session_factory, agent_id).content == " ".join(f"m{i}" for i in range(12))
+
+
+def test_backlogs_longer_than_the_row_limit_are_not_reported_done(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    monkeypatch.setattr(settings, "SUMMARY_KEEP_RECENT_TOKENS", keep_recent(2))
+    monkeypatch.setattr(settings, "SUMMARY_BATCH_TOKENS", keep_recent(100))  # short messages: rows are the limit
+    monkeypatch.setattr(settings, "HISTORY_MAX_MESSAGES", 5)
+    _, (agent_id,) = seed_agents(sync_session_factory, 13)
+    llm = FakeLLM()
+
+    async def update():
+        async with session_factory() as db:
+            return await update_summary(db, agent_id, llm)
+
+    assert [(o.folded, o.more) for o in [asyncio.run(update()) for _ in range(3)]] == [
+        (5, True), (5, True), (1, False)
+    ]
+    assert summary_of(sync_session_factory, agent_id).content == " ".join(f"m{i}" for i in range(11))
+
+
+def test_summarizer_is_rate_limited_and_bounded(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    monkeypatch.setattr(settings, "SUMMARY_KEEP_RECENT_TOKENS", keep_recent(2))
+    monkeypatch.setattr(settings, "SUMMARY_BATCH_TOKENS", keep_recent(3))
+    _, agent_ids = seed_agents(sync_session_factory, 8, agents=3)
+    llm = FakeLLM(delay=0.01)
+    now = [0.0]
+    summarizer = ConversationSummarizer(
+        session_factory=session_factory, complete=llm, min_interval=60,
+        agents_per_poll=2, concurrency=1, clock=lambda: now[0]
+    )
+    for agent_id in agent_ids + agent_ids:
+        summarizer.request(agent_id)  # repeated requests collapse
+    assert summarizer.pending == 3
+
+    assert asyncio.run(summarizer.run_once()) == 6  # two agents, one batch of three each
+    assert llm.max_in_flight == 1
+    # The third agent, plus the first two again (more history left), are pending
+    assert summarizer.pending == 3
+    assert asyncio.run(summarizer.run_once()) == 3  # only the third agent is due
+    now[0] = 61
+    assert asyncio.run(summarizer.run_once()) == 6
+    assert [summary_of(sync_session_factory, a).summarized_count for a in agent_ids] == [6, 6, 3]
+
+
+def test_prompt_carries_the_summary_instead_of_summarized_messages(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    monkeypatch.setattr(settings, "SUMMARY_KEEP_RECENT_TOKENS", keep_recent(2))
+    _, (agent_id,) = seed_agents(sync_session_factory, 5)
+
+    async def run():
+        async with session_factory() as db:
+            await update_summary(db, agent_id, FakeLLM())
+        async with session_factory() as db:
+            return await ContextManager(db).build_chat_messages("next question", agent_id=agent_id)
+
+    assert asyncio.run(run()) == [
+        {"role": "system", "content": f"{SUMMARY_HEADER}\nm0 m1 m2"},
+        {"role": "assistant", "content": "m3"},
+        {"role": "user", "content": "m4"},
+        {"role": "user", "content": "next question"},
+    ]
+
+
+def test_saving_a_reply_only_requests_an_update(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    user_id, (agent_id,) = seed_agents(sync_session_factory, 0)
+    summarizer = ConversationSummarizer(session_factory=session_factory, complete=FakeLLM())
+    monkeypatch.setattr("app.services.context_manager.conversation_summarizer", summarizer)
+
+    async def save(role):
+        async with session_factory() as db:
+            await ContextManager(db).save_message(user_id, role, "hello there", agent_id=agent_id)
+
+    asyncio.run(save(MessageRole.USER))
+    assert summarizer.pending == 0
+    asyncio.run(save(MessageRole.ASSISTANT))
+    assert summarizer.pending == 1
+    assert summary_of(sync_session_factory, agent_id) is None
@@ -0,0 +1,184 @@
+"""
+Tests for the resumable embedding backfill job
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import BackgroundTasks
+
+from app.api.v1 import projects
+from app.config import settings
+from app.services.embedding_client import content_hash
+from app.models import (
+    User, Project, Agent, AgentType, ChatMessage, MessageEmbedding, MessageRole, EmbeddingBackfill,
+)
+from app.schemas.project import ProjectUpdate
+from app.services.embedding_backfill import EmbeddingBackfillJob
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+class FakeEmbeddings:
+    def __init__(self, fail_on_call=None):
+        self.calls = []
+        self.fail_on_call = fail_on_call
+
+    def content_hash(self, text):
+        return content_hash(text, "fake", settings.EMBEDDING_DIMENSION)
+
+    async def embed_many(self, texts):
+        self.calls.append(list(texts))
+        if self.fail_on_call is not None and len(self.calls) >= self.fail_on_call:
+            raise RuntimeError("quota exceeded")
+        return [[0.5] * settings.EMBEDDING_DIMENSION for _ in texts]
+
+
+def seed(sync_session_factory, count):
+    db = sync_session_factory()
+    user = User(email="backfill@example.com", password_hash="x", name="B")
+    db.add(user)
+    db.commit()
+    project = Project(user_id=user.id, name="P")
+    db.add(project)
+    db.commit()
+    agent = Agent(user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT, name="A")
+    db.add(agent)
+    db.commit()
+    db.add_all([
+        ChatMessage(
+            user_id=user.id, agent_id=agent.id, project_id=project.id, role=MessageRole.USER,
+            content=f"message number {i}", created_at=T0 + timedelta(seconds=i // 2)  # ties on created_at
+        )
+        for i in range(count)
+    ])
+    db.commit()
+    ids = (user.id, project.id)
+    db.close()
+    return ids
+
+
+def indexed_count(sync_session_factory):
+    db = sync_session_factory()
+    count = db.query(MessageEmbedding).count()
+    db.close()
+    return count
+
+
+def backfill_row(sync_session_factory, project_id):
+    db = sync_session_factory()
+    row = db.get(EmbeddingBackfill, project_id)
+    db.close()
+    return row
+
+
+def test_backfill_indexes_history_in_bounded_batches(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    _, project_id = seed(sync_session_factory, 25)
+    fake = FakeEmbeddings()
+    reports = []
+    job = EmbeddingBackfillJob(
+        project_id, session_factory=session_factory, client=fake,
+        batch_size=4, concurrency=2, on_progress=reports.append
+    )
+
+    progress = asyncio.run(job.run())
+
+    assert indexed_count(sync_session_factory) == 25
+    assert max(len(call) for call in fake.calls) == 4
+    assert progress.indexed == progress.total == 25
+    assert [r.indexed for r in reports] == [8, 16, 24, 25]
+    assert reports[0].eta_seconds is not None and reports[-1].eta_seconds == 0
+    row = backfill_row(sync_session_factory, project_id)
+    assert row.status == EmbeddingBackfill.STATUS_COMPLETED
+    assert row.indexed_count == 25
+
+
+def test_backfill_resumes_from_checkpoint_after_crash(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    _, project_id = seed(sync_session_factory, 20)
+
+    crashing = FakeEmbeddings(fail_on_call=3)
+    job = EmbeddingBackfillJob(
+        project_id, session_factory=session_factory, client=crashing, batch_size=4, concurrency=1, max_retries=0
+    )
+    with pytest.raises(RuntimeError):
+        asyncio.run(job.run())
+    assert indexed_count(sync_session_factory) == 8
+    row = backfill_row(sync_session_factory, project_id)
+    assert row.status == EmbeddingBackfill.STATUS_FAILED and row.indexed_count == 8
+
+    healthy = FakeEmbeddings()
+    job = EmbeddingBackfillJob(project_id, session_factory=session_factory, client=healthy, batch_size=4, concurrency=1)
+    progress = asyncio.run(job.run())
+
+    assert progress.total == 12
+    assert sum(len(call) for call in healthy.calls) == 12  # nothing embedded twice
+    assert indexed_count(sync_session_factory) == 20
+    assert backfill_row(sync_session_factory, project_id).indexed_count == 20
+
+
+def test_rerun_after_completion_finds_messages_behind_the_cursor(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    user_id, project_id = seed(sync_session_factory, 6)
+    job = EmbeddingBackfillJob(project_id, session_factory=session_factory, client=FakeEmbeddings(), batch_size=4)
+    asyncio.run(job.run())
+
+    # The live indexer dropped an old message; padding is not content
+    db = sync_session_factory()
+    agent_id = db.query(Agent).filter(Agent.project_id == project_id).one().id
+    db.query(MessageEmbedding).filter(MessageEmbedding.content == "message number 0").delete()
+    db.add_all([
+        ChatMessage(
+            user_id=user_id, agent_id=agent_id, project_id=project_id, role=MessageRole.USER,
+            content=content, created_at=T0 - timedelta(seconds=1)
+        )
+        for content in ["\n\t\tthanks\t\t\t\n\n\n\n", "\tcontent after a tab\n"]
+    ])
+    db.commit()
+    db.close()
+
+    fake = FakeEmbeddings()
+    job = EmbeddingBackfillJob(project_id, session_factory=session_factory, client=fake, batch_size=4)
+    progress = asyncio.run(job.run())
+
+    assert sorted(text for call in fake.calls for text in call) == ["\tcontent after a tab\n", "message number 0"]
+    assert progress.indexed == progress.total == 2
+    assert indexed_count(sync_session_factory) == 7
+
+
+def test_running_job_holds_the_lease(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    _, project_id = seed(sync_session_factory, 3)
+    db = sync_session_factory()
+    db.add(EmbeddingBackfill(project_id=project_id, status=EmbeddingBackfill.STATUS_RUNNING))
+    db.commit()
+    db.close()
+
+    fake = FakeEmbeddings()
+    job = EmbeddingBackfillJob(project_id, session_factory=session_factory, client=fake)
+    assert asyncio.run(job.run()) is None
+    assert fake.calls == []
+
+    expired = EmbeddingBackfillJob(project_id, session_factory=session_factory, client=fake, lease_seconds=-1)
+    assert asyncio.run(expired.run()).indexed == 3
+
+
+def test_switching_project_to_rag_schedules_backfill(sqlite_sessions):
+    _, sync_session_factory = sqlite_sessions
+    user_id, project_id = seed(sync_session_factory, 1)
+    db = sync_session_factory()
+    user = db.get(User, user_id)
+
+    def update(source):
+        tasks = BackgroundTasks()
+        asyncio.run(projects.update_project(
+            project_id, ProjectUpdate(context_source=source), tasks, db=db, current_user=user
+        ))
+        return [(t.func, t.args) for t in tasks.tasks]
+
+    assert update("rag") == [(projects.start_backfill, (project_id,))]
+    assert update("rag") == []  # already RAG
+    assert update("recent") == []
+    db.close()
@@ -0,0 +1,134 @@
+"""
+Tests for the shared embeddings client and its query cache
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from app.services.embedding_client import (
+    EmbeddingCache,
+    EmbeddingClient,
+    LocalEmbedder,
+    cache_key,
+    embedding_cache_hits,
+    embedding_cache_misses,
+    embedding_latency,
+)
+
+
+class FakeOpenAI:
+    """Records embeddings.create calls; returns [len(text), call number] vectors"""
+
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = []
+        self.delay = delay
+        self.fail = fail
+        self.embeddings = SimpleNamespace(create=self._create)
+
+    async def _create(self, model, input, extra_body=None):
+        self.calls.append((model, list(input)))
+        self.extra_body = extra_body
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        data = [SimpleNamespace(index=i, embedding=[float(len(t)), float(len(self.calls))]) for i, t in enumerate(input)]
+        return SimpleNamespace(data=list(reversed(data)))  # order restored by index
+
+
+def make_client(model="m", **fake_kwargs):
+    fake = FakeOpenAI(**fake_kwargs)
+    return EmbeddingClient(model=model, client=fake, cache=EmbeddingCache(100, 60), dimensions=256), fake
+
+
+def test_normalized_queries_share_a_cache_entry():
+    client, fake = make_client()
+    hits, misses, latency = embedding_cache_hits.value, embedding_cache_misses.value, embedding_latency.count
+
+    async def run():
+        first = await client.embed_query("What is  the Plan?")
+        second = await client.embed_query("  what is the plan? ")
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert len(fake.calls) == 1
+    assert embedding_cache_hits.value - hits == 1
+    assert embedding_cache_misses.value - misses == 1
+    assert embedding_latency.count - latency == 1
+
+
+def test_cache_key_includes_model():
+    assert cache_key("hello", "small") != cache_key("hello", "large")
+    assert cache_key("Hello  world", "small") == cache_key("hello world", "small")
+
+
+def test_concurrent_misses_share_one_call():
+    client, fake = make_client(delay=0.01)
+
+    async def run():
+        return await asyncio.gather(*(client.embed_query("same question") for _ in range(10)))
+
+    results = asyncio.run(run())
+    assert len(fake.calls) == 1
+    assert all(r == results[0] for r in results)
+
+
+def test_failures_are_not_cached():
+    client, fake = make_client(fail=True)
+
+    async def run():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await client.embed_query("q")
+
+    asyncio.run(run())
+    assert len(fake.calls) == 2
+
+
+def test_ttl_and_lru_bounds():
+    now = [0.0]
+    cache = EmbeddingCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    cache.put("a", [1.0])
+    cache.put("b", [2.0])
+    cache.get("a")
+    cache.put("c", [3.0])  # evicts b
+    assert cache.get("b") is None
+    assert cache.get("a") == [1.0]
+
+    now[0] = 11
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_embed_many_preserves_input_order():
+    client, fake = make_client()
+    vectors = asyncio.run(client.embed_many(["a", "bbb", "cc"]))
+    assert [v[0] for v in vectors] == [1.0, 3.0, 2.0]
+    assert fake.calls == [("m", ["a", "bbb", "cc"])]
+
+
+def test_reduced_dimensions_are_requested_only_from_models_that_support_them():
+    client, fake = make_client(model="text-embedding-3-small")
+    asyncio.run(client.embed_many(["a"]))
+    assert fake.extra_body == {"dimensions": 256}
+
+    client, fake = make_client(model="text-embedding-ada-002")
+    asyncio.run(client.embed_many(["a"]))
+    assert fake.extra_body is None
+
+
+def test_local_embedder_is_deterministic_and_similarity_preserving():
+    embedder = LocalEmbedder(dimensions=256)
+    deploy, deploy_again, lunch = asyncio.run(embedder.embed_many([
+        "The deploy failed on the migration step",
+        "why did the deploy fail during the migration?",
+        "lunch menu for friday",
+    ]))
+
+    assert len(deploy) == 256
+    assert np.isclose(np.linalg.norm(deploy), 1.0)
+    assert asyncio.run(embedder.embed_query("The deploy failed on the migration step")) == deploy
+    assert np.dot(deploy, deploy_again) > np.dot(deploy, lunch) + 0.3
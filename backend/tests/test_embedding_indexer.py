@@ -0,0 +1,146 @@
+"""
+Tests for the background batched embedding indexer
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+from app.config import settings
+from app.services.embedding_client import content_hash
+from app.models import User, Project, Agent, AgentType, ChatMessage, MessageEmbedding, MessageRole
+from app.services.embedding_indexer import (
+    EmbeddingIndexer, IndexJob, dedup_calls_saved, dedup_hits, dedup_misses, index_dropped, index_skipped_short,
+)
+
+
+class FakeEmbeddings:
+    def __init__(self, failures=0):
+        self.calls = []
+        self.failures = failures
+
+    def content_hash(self, text):
+        return content_hash(text, "fake", settings.EMBEDDING_DIMENSION)
+
+    async def embed_many(self, texts):
+        self.calls.append(list(texts))
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("rate limited")
+        return [[float(len(t))] * settings.EMBEDDING_DIMENSION for t in texts]
+
+
+def seed_messages(sync_session_factory, count):
+    db = sync_session_factory()
+    user = User(email="indexer@example.com", password_hash="x", name="I")
+    db.add(user)
+    db.commit()
+    project = Project(user_id=user.id, name="P")
+    db.add(project)
+    db.commit()
+    agent = Agent(user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT, name="A")
+    db.add(agent)
+    db.commit()
+    messages = [
+        ChatMessage(user_id=user.id, agent_id=agent.id, project_id=project.id, role=MessageRole.USER, content=f"message number {i}")
+        for i in range(count)
+    ]
+    db.add_all(messages)
+    db.commit()
+    jobs = [IndexJob(m.id, agent.id, project.id, m.content) for m in messages]
+    db.close()
+    return jobs
+
+
+def indexed(sync_session_factory):
+    db = sync_session_factory()
+    rows = db.query(MessageEmbedding.message_id).all()
+    db.close()
+    return {r[0] for r in rows}
+
+
+def run_indexer(indexer, jobs):
+    async def run():
+        await indexer.start()
+        for job in jobs:
+            assert await indexer.enqueue(job)
+        await indexer.stop()
+
+    asyncio.run(run())
+
+
+def test_jobs_are_embedded_in_batches_and_bulk_inserted(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    jobs = seed_messages(sync_session_factory, 10)
+    fake = FakeEmbeddings()
+    indexer = EmbeddingIndexer(session_factory=session_factory, client=fake, batch_size=4, max_wait_ms=50)
+
+    run_indexer(indexer, jobs + jobs[:2])  # duplicates are embedded once
+
+    assert [len(call) for call in fake.calls] == [4, 4, 2]
+    assert indexed(sync_session_factory) == {job.message_id for job in jobs}
+
+
+def test_failed_batches_are_retried(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    jobs = seed_messages(sync_session_factory, 3)
+    fake = FakeEmbeddings(failures=2)
+    indexer = EmbeddingIndexer(
+        session_factory=session_factory, client=fake, max_wait_ms=20, max_retries=3, retry_base_delay=0.001
+    )
+
+    run_indexer(indexer, jobs)
+
+    assert len(fake.calls) == 3
+    assert indexed(sync_session_factory) == {job.message_id for job in jobs}
+
+
+def test_already_indexed_and_deleted_messages_are_skipped(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    jobs = seed_messages(sync_session_factory, 3)
+    indexer = EmbeddingIndexer(session_factory=session_factory, client=FakeEmbeddings(), max_wait_ms=20)
+    run_indexer(indexer, jobs[:1])
+
+    db = sync_session_factory()
+    db.query(ChatMessage).filter(ChatMessage.id == jobs[2].message_id).delete()
+    db.commit()
+    db.close()
+
+    run_indexer(indexer, jobs)
+
+    assert indexed(sync_session_factory) == {jobs[0].message_id, jobs[1].message_id}
+
+
+def test_full_queue_drops_instead_of_blocking():
+    indexer = EmbeddingIndexer(client=FakeEmbeddings(), queue_size=2, enqueue_timeout=0.01)
+    job = IndexJob(*([None] * 3), content="x")
+    dropped = index_dropped.value
+
+    async def run():
+        return [await indexer.enqueue(job) for _ in range(3)]
+
+    assert asyncio.run(run()) == [True, True, False]
+    assert index_dropped.value - dropped == 1
+
+
+def test_identical_content_reuses_stored_vectors_and_short_messages_are_skipped(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    jobs = seed_messages(sync_session_factory, 5)
+    fake = FakeEmbeddings()
+    indexer = EmbeddingIndexer(session_factory=session_factory, client=fake, batch_size=10, max_wait_ms=50)
+    hits, misses, saved, skipped = dedup_hits.value, dedup_misses.value, dedup_calls_saved.value, index_skipped_short.value
+
+    pasted = "Traceback: KeyError 'user_id'"
+    first = [IndexJob(job.message_id, job.agent_id, job.project_id, pasted) for job in jobs[:2]]
+    run_indexer(indexer, first)  # one API input for two identical messages
+    later = [
+        IndexJob(jobs[2].message_id, jobs[2].agent_id, jobs[2].project_id, "  traceback: KEYERROR 'user_id' "),
+        IndexJob(jobs[3].message_id, jobs[3].agent_id, jobs[3].project_id, "thanks"),
+    ]
+    run_indexer(indexer, later)  # normalized duplicate of stored content: no API call at all
+
+    assert fake.calls == [[pasted]]
+    assert indexed(sync_session_factory) == {jobs[0].message_id, jobs[1].message_id, jobs[2].message_id}
+    assert dedup_misses.value - misses == 1
+    assert dedup_hits.value - hits == 2
+    assert dedup_calls_saved.value - saved == 1
+    assert index_skipped_short.value - skipped == 1
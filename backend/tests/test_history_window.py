@@ -0,0 +1,165 @@
+"""
+Tests for token-budgeted history windows and stored per-message token counts
+"""
+
+import asyncio
+import math
+import threading
+from datetime import datetime, timedelta, timezone
+
+from app.config import settings
+from app.models import User, TemporaryChat, ChatMessage, MessageRole
+from app.services import context_manager as context_manager_module
+from app.services.context_budget import MESSAGE_OVERHEAD_TOKENS, context_window, history_token_budget
+from app.services.context_manager import ContextManager
+from app.services import token_counter
+from app.services.token_counter import count_tokens, count_tokens_async
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def seed_chat(sync_session_factory, contents, token_counts=None):
+    """Temporary chat with one message per content, oldest first"""
+    db = sync_session_factory()
+    user = User(email="history@example.com", password_hash="x", name="H")
+    db.add(user)
+    db.commit()
+    chat = TemporaryChat(user_id=user.id, session_id="history-session")
+    db.add(chat)
+    db.commit()
+    token_counts = token_counts or [count_tokens(content) for content in contents]
+    db.add_all([
+        ChatMessage(
+            user_id=user.id, temp_chat_id=chat.id, role=MessageRole.USER if i % 2 == 0 else MessageRole.ASSISTANT,
+            content=content, token_count=tokens, created_at=T0 + timedelta(seconds=i)
+        )
+        for i, (content, tokens) in enumerate(zip(contents, token_counts))
+    ])
+    db.commit()
+    ids = user.id, chat.id
+    db.close()
+    return ids
+
+
+def test_context_windows_match_model_families():
+    assert context_window("gpt-4o-mini") == 128000
+    assert context_window("gpt-4o-2024-08-06") == 128000
+    assert context_window("gpt-4-0613") == 8192
+    assert context_window("some-new-model") == 8192
+
+
+def test_budget_reserves_prompt_shared_context_and_reply(monkeypatch):
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 100000)
+    prompt = [
+        {"role": "system", "content": "system rules " * 100},
+        {"role": "system", "content": "shared context " * 200},
+        {"role": "user", "content": "hi"},
+    ]
+    reserved = sum(count_tokens(m["content"]) + MESSAGE_OVERHEAD_TOKENS for m in prompt) + 3 + 1000
+    assert history_token_budget(prompt, model="gpt-4", max_tokens=1000) == 8192 - reserved
+    assert history_token_budget(prompt, model="gpt-4o", max_tokens=1000) == 100000
+    assert history_token_budget(prompt, model="gpt-4", max_tokens=8192) == 0
+
+
+def test_window_takes_newest_messages_that_fit_without_retokenizing(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    contents = ["old question", "LOG " * 2000, "recent question", "recent answer", "newest question"]
+    _, chat_id = seed_chat(sync_session_factory, contents, token_counts=[3, 2000, 3, 3, None])
+
+    def no_tokenizing(text):
+        raise AssertionError("history must not be re-tokenized")
+
+    monkeypatch.setattr(context_manager_module, "count_tokens_async", no_tokenizing)
+
+    async def window(budget):
+        async with session_factory() as db:
+            history = await ContextManager(db).get_history_window(budget, temp_chat_id=chat_id)
+        return [message.content for message in history]
+
+    per_message = 3 + MESSAGE_OVERHEAD_TOKENS
+    newest = math.ceil(len("newest question") / 4) + MESSAGE_OVERHEAD_TOKENS  # no stored count: estimated
+    assert asyncio.run(window(newest + 2 * per_message)) == ["recent question", "recent answer", "newest question"]
+    # The pasted log does not fit, and the window does not skip past it to older messages
+    assert asyncio.run(window(newest + 2 * per_message + 1000)) == contents[2:]
+    assert asyncio.run(window(100000)) == contents
+    assert asyncio.run(window(0)) == []
+
+
+def test_saved_messages_store_their_token_count(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    user_id, chat_id = seed_chat(sync_session_factory, [])
+
+    async def run():
+        async with session_factory() as db:
+            message = await ContextManager(db).save_message(
+                user_id, MessageRole.USER, "how many tokens is this?", temp_chat_id=chat_id
+            )
+        return message.token_count
+
+    assert asyncio.run(run()) == count_tokens("how many tokens is this?")
+
+
+class FlakyTiktoken:
+    """tiktoken whose BPE download fails until `available` is set"""
+
+    def __init__(self):
+        self.available = False
+        self.loads = 0
+
+    def get_encoding(self, name):
+        self.loads += 1
+        if not self.available:
+            raise OSError("network unreachable")
+        return WordEncoding()
+
+
+class WordEncoding:
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+def test_a_failed_encoding_load_is_retried_after_a_while(monkeypatch):
+    flaky = FlakyTiktoken()
+    monkeypatch.setattr(token_counter, "tiktoken", flaky)
+    monkeypatch.setattr(token_counter, "_encoding_value", None)
+    monkeypatch.setattr(token_counter, "_encoding_failed_at", None)
+
+    assert asyncio.run(token_counter.load_encoding()) is False
+    assert count_tokens("one two three four five six") == 7  # estimated, no new download attempt
+    assert flaky.loads == 1
+
+    flaky.available = True
+    monkeypatch.setattr(token_counter, "ENCODING_RETRY_SECONDS", 0)
+    assert count_tokens("one two three four five six") == 6
+    assert flaky.loads == 2
+
+
+def test_long_texts_are_counted_off_the_event_loop(monkeypatch):
+    threads = []
+    counted = count_tokens
+
+    def recording(text):
+        threads.append(threading.current_thread())
+        return counted(text)
+
+    monkeypatch.setattr(token_counter, "count_tokens", recording)
+    asyncio.run(count_tokens_async("short"))
+    asyncio.run(count_tokens_async("x" * (token_counter.INLINE_COUNT_CHARS + 1)))
+    assert threads[0] is threading.main_thread()
+    assert threads[1] is not threading.main_thread()
+
+
+def test_chat_messages_put_budgeted_history_before_the_new_message(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    _, chat_id = seed_chat(sync_session_factory, ["show me the log", "LOG " * 2000, "short question", "short answer"])
+    monkeypatch.setattr(settings, "HISTORY_TOKEN_BUDGET", 100)
+
+    async def run():
+        async with session_factory() as db:
+            return await ContextManager(db).build_chat_messages("follow-up", temp_chat_id=chat_id)
+
+    assert asyncio.run(run()) == [
+        {"role": "user", "content": "short question"},
+        {"role": "assistant", "content": "short answer"},
+        {"role": "user", "content": "follow-up"},
+    ]
@@ -0,0 +1,129 @@
+"""
+Tests for the hybrid (full-text + vector) shared context provider
+"""
+
+import asyncio
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from app.config import settings
+from app.models import ContextSource
+from app.services.context_providers import hybrid_provider
+from app.services.context_providers.hybrid_provider import (
+    HybridProvider,
+    fulltext_query,
+    fulltext_vector,
+    hybrid_lexical_only,
+    reciprocal_rank_fusion,
+)
+
+AGENT_A, AGENT_B = uuid.uuid4(), uuid.uuid4()
+M1, M2, M3 = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+
+
+class FakeEmbeddings:
+    def __init__(self, delay=0.0, fail=False):
+        self.calls = 0
+        self.delay = delay
+        self.fail = fail
+
+    async def embed_query(self, text):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise RuntimeError("embeddings API down")
+        return [0.1] * settings.EMBEDDING_DIMENSION
+
+
+def make_provider(monkeypatch, embeddings):
+    monkeypatch.setattr(hybrid_provider, "embedding_client", embeddings)
+    monkeypatch.setattr(HybridProvider, "_embeddings_down_until", 0.0)
+    provider = HybridProvider(db=None)
+
+    async def other_agents(project_id, current_agent_id, chat_context=None):
+        return {AGENT_A: "Researcher", AGENT_B: "Writer"}
+
+    async def lexical(project_id, agent_ids, query, limit):
+        return [(M1, AGENT_A, "deploy failed: KeyError user_id"), (M2, AGENT_B, "the deploy checklist")]
+
+    async def semantic(project_id, agent_ids, query_embedding, limit):
+        return [
+            (SimpleNamespace(message_id=M3, agent_id=AGENT_B, content="rollout went wrong"), 0.1),
+            (SimpleNamespace(message_id=M2, agent_id=AGENT_B, content="the deploy checklist"), 0.2),
+        ]
+
+    provider._get_other_agents = other_agents
+    provider._lexical_search = lexical
+    provider._vector.search = semantic
+    return provider
+
+
+def search(provider):
+    return asyncio.run(provider.get_shared_context(uuid.uuid4(), uuid.uuid4(), query="why did the deploy fail?"))
+
+
+def test_rank_fusion_rewards_agreement():
+    a, b, c = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    fused = reciprocal_rank_fusion([[a, b], [c, b]], k=60)
+    assert [item for item, _ in fused] == [b, a, c]
+    assert fused[0][1] == pytest.approx(1 / 62 + 1 / 62)
+
+
+def test_results_from_both_retrievers_are_fused(monkeypatch):
+    provider = make_provider(monkeypatch, FakeEmbeddings())
+
+    context = search(provider)
+
+    assert context.splitlines() == [
+        "SHARED CONTEXT FROM OTHER AGENTS IN PROJECT (hybrid search):",
+        "[Writer]: the deploy checklist",  # found by both
+        "[Researcher]: deploy failed: KeyError user_id",
+        "[Writer]: rollout went wrong",
+    ]
+
+
+def test_embedding_errors_fall_back_to_full_text_and_cool_down(monkeypatch):
+    embeddings = FakeEmbeddings(fail=True)
+    provider = make_provider(monkeypatch, embeddings)
+    fallbacks = hybrid_lexical_only.value
+
+    first = search(provider)
+    second = search(provider)
+
+    assert first.splitlines()[0] == "SHARED CONTEXT FROM OTHER AGENTS IN PROJECT (keyword search):"
+    assert "rollout went wrong" not in first
+    assert second == first
+    assert embeddings.calls == 1  # second search skipped the API during the cooldown
+    assert hybrid_lexical_only.value - fallbacks == 2
+
+
+def test_slow_embeddings_do_not_delay_the_answer(monkeypatch):
+    monkeypatch.setattr(settings, "HYBRID_EMBEDDING_TIMEOUT_SECONDS", 0.05)
+    provider = make_provider(monkeypatch, FakeEmbeddings(delay=1.0))
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        context = await provider.get_shared_context(uuid.uuid4(), uuid.uuid4(), query="deploy")
+        return context, loop.time() - start
+
+    context, elapsed = asyncio.run(run())
+    assert "(keyword search)" in context
+    assert elapsed < 0.5
+
+
+def test_full_text_expressions_match_the_gin_index():
+    statement = select(fulltext_vector().op("@@")(fulltext_query("deploy failed")))
+    sql = str(statement.compile(dialect=postgresql.dialect()))
+    # Same expression as migration 011, so the planner can use the index
+    assert f"to_tsvector('{settings.FULLTEXT_CONFIG}'::regconfig, chat_messages.content)" in sql
+
+
+def test_hybrid_projects_are_indexed_for_vector_search():
+    assert ContextSource.HYBRID.uses_embeddings
+    assert ContextSource.RAG.uses_embeddings
+    assert not ContextSource.RECENT.uses_embeddings
@@ -0,0 +1,167 @@
+"""
+Tests for the LISTEN/NOTIFY cache invalidation bus
+
+The two-process test needs a real Postgres; set TEST_POSTGRES_URL to run it.
+"""
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import textwrap
+import time
+from uuid import uuid4
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.invalidation import FLUSH, Invalidation, InvalidationBus, listener_dsn
+
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+def test_publish_applies_after_commit_only(sqlite_sessions):
+    _, sync_session_factory = sqlite_sessions
+    bus = InvalidationBus(dsn=None)
+    seen = []
+    bus.subscribe(seen.append)
+
+    db = sync_session_factory()
+    entity_id = uuid4()
+    bus.publish(db, "project", entity_id)
+    assert seen == []  # nothing until the transaction commits
+    db.commit()
+    assert [(i.kind, i.entity_id) for i in seen] == [("project", entity_id)]
+
+    bus.publish(db, "agent", uuid4())
+    db.rollback()
+    db.commit()
+    assert len(seen) == 1  # rolled back writes invalidate nothing
+    db.close()
+
+
+def test_listener_dsn():
+    assert listener_dsn("postgresql+psycopg2://u:p@db:5432/app") == "postgresql://u:p@db:5432/app"
+    assert listener_dsn("postgres://u:p@db/app") == "postgresql://u:p@db/app"
+    assert listener_dsn("sqlite:///./test.db") is None
+
+
+class FakeConnection:
+    def __init__(self, drop_after=None):
+        self.drop_after = drop_after
+        self.terminated = False
+        self._on_lost = None
+        self.notify = None
+
+    def add_termination_listener(self, callback):
+        self._on_lost = callback
+
+    async def add_listener(self, channel, callback):
+        self.notify = callback
+        if self.drop_after is not None:
+            asyncio.get_running_loop().call_later(self.drop_after, self._on_lost, self)
+
+    async def fetchval(self, query):
+        return 1
+
+    def terminate(self):
+        self.terminated = True
+
+
+def test_reconnect_degrades_to_full_flush(monkeypatch):
+    """Losing the listener connection flushes, and so does getting it back"""
+    import asyncpg
+
+    connections = [FakeConnection(drop_after=0.01), FakeConnection()]
+
+    async def connect(dsn):
+        return connections.pop(0)
+
+    monkeypatch.setattr(asyncpg, "connect", connect)
+
+    async def run():
+        bus = InvalidationBus(dsn="postgresql://fake/db", keepalive_seconds=0.01)
+        seen = []
+        bus.subscribe(seen.append)
+        await bus.start()
+        for _ in range(500):
+            if not connections and bus.listening.is_set():
+                break
+            await asyncio.sleep(0.01)
+        await bus.stop()
+        return bus, seen
+
+    bus, seen = asyncio.run(run())
+    # connect, lost, reconnect, and the final stop
+    assert [i.kind for i in seen][:3] == [FLUSH, FLUSH, FLUSH]
+
+
+def test_remote_notification_is_dispatched_and_own_is_skipped():
+    bus = InvalidationBus(dsn=None)
+    seen = []
+    bus.subscribe(seen.append)
+    entity_id = uuid4()
+
+    own = Invalidation("agent", entity_id, origin=bus.worker_id)
+    remote = Invalidation("agent", entity_id, origin="other-worker")
+    bus._on_notify(None, 1, bus.channel, own.to_payload())
+    bus._on_notify(None, 1, bus.channel, remote.to_payload())
+    bus._on_notify(None, 1, bus.channel, "not json")
+
+    assert seen == [remote]
+
+
+LISTENER_SCRIPT = textwrap.dedent("""
+    import asyncio, json, sys, time
+    from app.core.invalidation import InvalidationBus, listener_dsn
+
+    async def main():
+        bus = InvalidationBus(dsn=listener_dsn(sys.argv[1]))
+        received = asyncio.Queue()
+        bus.subscribe(lambda inv: inv.kind == "project" and received.put_nowait(time.time() - inv.sent_at))
+        await bus.start()
+        await bus.listening.wait()
+        print("ready", flush=True)
+        latencies = [await received.get() for _ in range(int(sys.argv[2]))]
+        print(json.dumps(latencies), flush=True)
+        await bus.stop()
+
+    asyncio.run(main())
+""")
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+def test_two_process_invalidation_latency():
+    """A commit in this process invalidates a cache in another worker process"""
+    rounds = 20
+    listener = subprocess.Popen(
+        [sys.executable, "-c", LISTENER_SCRIPT, TEST_POSTGRES_URL, str(rounds)],
+        stdout=subprocess.PIPE,
+        text=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    )
+    try:
+        assert listener.stdout.readline().strip() == "ready"
+
+        engine = create_engine(TEST_POSTGRES_URL)
+        Session = sessionmaker(bind=engine)
+        bus = InvalidationBus(dsn=listener_dsn(TEST_POSTGRES_URL))
+        for _ in range(rounds):
+            with Session() as db:
+                bus.publish(db, "project", uuid4())
+                db.commit()
+            time.sleep(0.01)
+        engine.dispose()
+
+        latencies = sorted(json.loads(listener.stdout.readline()))
+        listener.wait(timeout=10)
+    finally:
+        listener.kill()
+
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[-1]
+    print(f"\ninvalidation latency over {rounds} commits: p50={p50 * 1000:.1f}ms max={p99 * 1000:.1f}ms")
+    assert len(latencies) == rounds
+    assert p99 < 0.5
@@ -0,0 +1,212 @@
+"""
+Tests for latency-aware LLM provider routing and hedged requests, against
+local fake streaming servers with injected latency
+"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from app.config import settings
+from app.services.chat_service import ChatService
+from app.services.llm_router import LatencyTracker, LLMRouter, hedge_losers_cancelled, hedge_wins, hedged_requests
+from app.services.openai_clients import OpenAIClientRegistry, Provider
+from benchmarks.mock_upstream import MockUpstream
+
+
+@pytest.fixture(autouse=True)
+def http1(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_HTTP2", False)
+
+
+def make_router(upstreams, **kwargs):
+    """Router over one provider per (name, MockUpstream), in the given order"""
+    registry = OpenAIClientRegistry(providers={
+        name: Provider(name, "sk-test", upstream.base_url, model_prefix=f"{name}/")
+        for name, upstream in upstreams.items()
+    })
+    router = LLMRouter(
+        list(upstreams), clients=registry.get, provider_configs=lambda: registry.providers,
+        explore_rate=0, **kwargs
+    )
+    return router, registry
+
+
+async def reply(router, model="gpt-4o-mini"):
+    stream = await router.open_stream([{"role": "user", "content": "hi"}], model=model)
+    tokens = [chunk.choices[0].delta.content async for chunk in stream if chunk.choices]
+    return stream.provider, "".join(tokens)
+
+
+async def eventually(condition, timeout=1.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition() and asyncio.get_running_loop().time() < deadline:
+        await asyncio.sleep(0.01)
+    return condition()
+
+
+def test_requests_go_to_the_provider_with_the_lowest_moving_average_ttft():
+    async def run():
+        async with MockUpstream(first_token_ms=150, tokens=["slow"]) as slow, \
+                MockUpstream(first_token_ms=5, tokens=["fast"]) as fast:
+            router, registry = make_router({"slow": slow, "fast": fast}, hedge_after_ms=0)
+            replies = [await reply(router) for _ in range(4)]
+            await registry.aclose()
+            return replies, router.tracker
+
+    replies, tracker = asyncio.run(run())
+    # Each provider is sampled once, then the faster one takes the traffic
+    assert replies == [("slow", "slow"), ("fast", "fast"), ("fast", "fast"), ("fast", "fast")]
+    assert tracker.estimate("fast") < 100 < tracker.estimate("slow")
+
+
+def test_late_first_token_is_hedged_and_the_loser_cancelled():
+    async def run():
+        async with MockUpstream(first_token_ms=2000, tokens=["slow"]) as slow, \
+                MockUpstream(first_token_ms=5, tokens=["fa", "st"]) as fast:
+            tracker = LatencyTracker()
+            tracker.observe("slow", 10)  # looked fast so far
+            tracker.observe("fast", 20)
+            router, registry = make_router({"slow": slow, "fast": fast}, tracker=tracker, hedge_after_ms=50)
+            service = ChatService(router=router)
+            start = asyncio.get_running_loop().time()
+            tokens = [token async for token in service.stream_chat_response([{"role": "user", "content": "hi"}])]
+            elapsed = asyncio.get_running_loop().time() - start
+            cancelled = await eventually(lambda: slow.streams_cancelled == 1)
+            await registry.aclose()
+            return tokens, elapsed, cancelled, slow, fast
+
+    hedged, wins, losers = hedged_requests.value, hedge_wins.value, hedge_losers_cancelled.value
+    tokens, elapsed, cancelled, slow, fast = asyncio.run(run())
+    assert tokens == ["fa", "st"]
+    assert elapsed < 1.0
+    assert cancelled and slow.streams_completed == 0
+    assert fast.streams_completed == 1
+    assert (hedged_requests.value - hedged, hedge_wins.value - wins) == (1, 1)
+    assert hedge_losers_cancelled.value - losers == 1
+
+
+def test_no_hedge_when_the_first_token_is_on_time():
+    async def run():
+        async with MockUpstream(first_token_ms=5, tokens=["one"]) as one, \
+                MockUpstream(first_token_ms=5, tokens=["two"]) as two:
+            router, registry = make_router({"one": one, "two": two}, hedge_after_ms=500)
+            result = await reply(router)
+            await registry.aclose()
+            return result, two.requests
+
+    hedged = hedged_requests.value
+    assert asyncio.run(run()) == (("one", "one"), 0)
+    assert hedged_requests.value == hedged
+
+
+def test_failed_provider_falls_over_and_is_ranked_last():
+    async def run():
+        async with MockUpstream(status=500) as broken, MockUpstream(tokens=["ok"]) as healthy:
+            router, registry = make_router({"broken": broken, "healthy": healthy}, hedge_after_ms=0)
+            first = await reply(router)
+            order = router.order()
+            await registry.aclose()
+            return first, order, broken.requests
+
+    first, order, broken_requests = asyncio.run(run())
+    assert first == ("healthy", "ok")
+    assert order == ["healthy", "broken"]
+    assert broken_requests == 1  # no SDK retries while another provider is available
+
+
+class GatedProvider:
+    """Fake client whose stream yields its first token once `gate` is set"""
+
+    def __init__(self, token):
+        self.token = token
+        self.gate = asyncio.Event()
+        self.closed = False
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self.response = SimpleNamespace(aclose=self._close)
+
+    def with_options(self, **kwargs):
+        return self
+
+    async def _close(self):
+        self.closed = True
+
+    async def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        return self
+
+    async def __aiter__(self):
+        await self.gate.wait()
+        yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.token))])
+
+
+def gated_router(providers):
+    return LLMRouter(
+        list(providers), clients=providers.get, provider_configs=dict, explore_rate=0, hedge_after_ms=10
+    )
+
+
+def test_a_loser_finishing_with_the_winner_is_closed():
+    async def run():
+        providers = {"one": GatedProvider("one"), "two": GatedProvider("two")}
+        opening = asyncio.create_task(gated_router(providers).open_stream([{"role": "user", "content": "hi"}]))
+        await asyncio.sleep(0.05)  # past the hedge deadline: both requests are in flight
+        for provider in providers.values():
+            provider.gate.set()  # first tokens arrive in the same loop iteration
+        winner = await opening
+        return winner.provider, {name: p.closed for name, p in providers.items()}
+
+    cancelled = hedge_losers_cancelled.value
+    winner, closed = asyncio.run(run())
+    assert closed == {"one": winner != "one", "two": winner != "two"}
+    assert hedge_losers_cancelled.value == cancelled  # nothing left to cancel
+
+
+def test_first_token_arriving_as_the_caller_leaves_is_closed():
+    async def run():
+        provider = GatedProvider("late")
+        router = LLMRouter(["late"], clients={"late": provider}.get, provider_configs=dict, hedge_after_ms=0)
+        opening = asyncio.create_task(router.open_stream([{"role": "user", "content": "hi"}]))
+        await asyncio.sleep(0.01)
+        provider.gate.set()
+        opening.cancel()  # the attempt finishes before open_stream sees the cancellation
+        with pytest.raises(asyncio.CancelledError):
+            await opening
+        return provider.closed
+
+    cancelled = hedge_losers_cancelled.value
+    assert asyncio.run(run()) is True
+    assert hedge_losers_cancelled.value == cancelled
+
+
+def test_stream_usage_is_only_requested_from_providers_that_accept_it():
+    async def run():
+        providers = {"openai": GatedProvider("a"), "compatible": GatedProvider("b")}
+        configs = {"openai": Provider("openai", "k", stream_usage=True), "compatible": Provider("compatible", "k")}
+        for name, provider in providers.items():
+            provider.gate.set()
+            router = LLMRouter([name], clients=providers.get, provider_configs=lambda: configs)
+            await router.open_stream([{"role": "user", "content": "hi"}], include_usage=True, max_tokens=5)
+        return providers
+
+    providers = asyncio.run(run())
+    assert providers["openai"].requests[0]["extra_body"] == {"stream_options": {"include_usage": True}}
+    assert "extra_body" not in providers["compatible"].requests[0]
+    assert providers["compatible"].requests[0]["max_tokens"] == 5
+
+
+def test_models_are_mapped_per_provider():
+    openrouter = Provider("openrouter", "k", model_prefix="openai/")
+    assert openrouter.model_for("gpt-4o-mini") == "openai/gpt-4o-mini"
+    assert openrouter.model_for("anthropic/some-model") == "anthropic/some-model"
+    assert Provider("compatible", "k", model="llama-3").model_for("gpt-4o-mini") == "llama-3"
+    assert Provider("openai", "k").model_for("gpt-4o-mini") == "gpt-4o-mini"
+
+
+def test_no_configured_provider_is_an_error():
+    router = LLMRouter(["openai"], clients=lambda name: None)
+
+    with pytest.raises(ValueError):
+        asyncio.run(router.open_stream([{"role": "user", "content": "hi"}]))
@@ -0,0 +1,78 @@
+"""
+Tests for the shared OpenAI client registry against a local mock upstream
+"""
+
+import asyncio
+
+import pytest
+
+from app.config import settings
+from app.services.chat_service import ChatService
+from app.services.embedding_client import EmbeddingCache, EmbeddingClient
+from app.services.openai_clients import OpenAIClientRegistry, Provider, connections_opened, http_requests
+from benchmarks.mock_upstream import MockUpstream
+
+
+@pytest.fixture(autouse=True)
+def http1(monkeypatch):
+    monkeypatch.setattr(settings, "OPENAI_HTTP2", False)
+
+
+def registry_for(base_url):
+    return OpenAIClientRegistry(providers={
+        "openai": Provider("openai", "sk-test", base_url),
+        "openrouter": Provider("openrouter", None, base_url),
+    })
+
+
+def test_warmed_connections_are_reused_by_every_service():
+    async def run():
+        async with MockUpstream(tokens=["a", "b"]) as upstream:
+            registry = registry_for(upstream.base_url)
+            opened, requests = connections_opened.value, http_requests.value
+            await registry.start(warmup_connections=3)
+            warmed = upstream.connections
+
+            chat = ChatService(client=registry.get())
+            embeddings = EmbeddingClient(
+                model="text-embedding-3-small", client=registry.get(), cache=EmbeddingCache(10, 60), dimensions=4
+            )
+
+            async def reply():
+                return "".join([token async for token in chat.stream_chat_response([{"role": "user", "content": "hi"}])])
+
+            results = await asyncio.gather(reply(), reply(), embeddings.embed_many(["abc"]))
+            await registry.aclose()
+            return warmed, upstream.connections, results, connections_opened.value - opened, http_requests.value - requests
+
+    warmed, connections, results, opened, requests = asyncio.run(run())
+    assert warmed == 3
+    assert connections == 3  # no new connection after warmup
+    assert results == ["ab", "ab", [[3.0, 0.0, 0.0, 0.0]]]
+    assert (opened, requests) == (3, 6)
+
+
+def test_one_client_per_provider_and_none_without_a_key():
+    registry = registry_for("http://127.0.0.1:9/v1")
+    client = registry.get()
+    assert registry.get("openai") is client
+    assert registry.get("openrouter") is None
+    assert registry.get("unknown") is None
+    with pytest.raises(ValueError):
+        registry.require("openrouter")
+
+    asyncio.run(registry.aclose())
+    assert registry.get() is not client  # recreated after shutdown
+    asyncio.run(registry.aclose())
+
+
+def test_warmup_failures_do_not_block_startup():
+    async def run():
+        async with MockUpstream(status=500) as upstream:
+            registry = registry_for(upstream.base_url)
+            succeeded = await registry.warmup("openai", 2)
+            await registry.start(warmup_connections=2)
+            await registry.aclose()
+            return succeeded
+
+    assert asyncio.run(run()) == 0
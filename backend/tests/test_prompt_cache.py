@@ -0,0 +1,122 @@
+"""
+Tests for the compiled system-prompt cache
+"""
+
+import asyncio
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+from fastapi import BackgroundTasks
+from sqlalchemy import event
+
+from app.api.v1 import projects
+from app.models import User, Project, Agent, AgentType
+from app.schemas.project import ProjectUpdate
+from app.services.chat_context import ChatContext
+from app.services.context_manager import ContextManager
+from app.services.prompt_cache import (
+    SystemPromptCache,
+    prompt_cache_hits,
+    prompt_cache_misses,
+    system_prompt_cache,
+)
+
+NOW = datetime(2026, 1, 1)
+
+
+def make_context(agent_id=None, project_id=None, prompt="Role", updated_at=NOW):
+    return ChatContext(
+        agent_id=agent_id or uuid4(),
+        user_id=uuid4(),
+        agent_name="Agent",
+        agent_prompt=prompt,
+        agent_updated_at=updated_at,
+        project_id=project_id,
+        project_prompt="Rules" if project_id else None,
+        project_updated_at=updated_at if project_id else None,
+    )
+
+
+def test_lru_eviction_and_counters():
+    cache = SystemPromptCache(max_entries=2)
+    a, b, c = make_context(), make_context(), make_context()
+    hits, misses = prompt_cache_hits.value, prompt_cache_misses.value
+
+    assert cache.get(a.agent_id) is None
+    cache.put(a)
+    cache.put(b)
+    assert cache.get(a.agent_id).prompt == "AGENT ROLE:\nRole"  # a is now most recent
+    cache.put(c)  # evicts b
+
+    assert cache.get(b.agent_id) is None
+    assert cache.get(c.agent_id) is not None
+    assert len(cache) == 2
+    assert prompt_cache_hits.value - hits == 2
+    assert prompt_cache_misses.value - misses == 2
+
+
+def test_version_mismatch_is_a_miss():
+    cache = SystemPromptCache(max_entries=10)
+    old = make_context()
+    cache.put(old)
+    newer = make_context(agent_id=old.agent_id, prompt="New role", updated_at=NOW + timedelta(seconds=1))
+
+    assert cache.get(old.agent_id, old) is not None
+    assert cache.get(old.agent_id, newer) is None
+
+
+def test_invalidate_project_drops_only_its_agents():
+    cache = SystemPromptCache(max_entries=10)
+    project_id = uuid4()
+    in_project = [make_context(project_id=project_id) for _ in range(3)]
+    standalone = make_context()
+    for ctx in in_project + [standalone]:
+        cache.put(ctx)
+
+    cache.invalidate_project(project_id)
+
+    assert len(cache) == 1
+    assert cache.get(standalone.agent_id) is not None
+    cache.invalidate_agent(standalone.agent_id)
+    assert len(cache) == 0
+
+
+def test_hot_path_skips_queries_and_update_route_invalidates(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    db = sync_session_factory()
+    user = User(email="prompt@example.com", password_hash="x", name="P")
+    db.add(user)
+    db.commit()
+    project = Project(user_id=user.id, name="P", has_prompt=True, prompt_content="Old rules")
+    db.add(project)
+    db.commit()
+    agent = Agent(user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT, name="A")
+    db.add(agent)
+    db.commit()
+
+    statements = []
+    engine = session_factory.kw["bind"].sync_engine
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    async def build():
+        async with session_factory() as async_db:
+            return await ContextManager(async_db).build_system_prompt(agent.id)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert asyncio.run(build()) == "PROJECT CONTEXT:\nOld rules"
+        assert len(statements) == 1
+        assert asyncio.run(build()) == "PROJECT CONTEXT:\nOld rules"
+        assert len(statements) == 1  # served from cache
+
+        asyncio.run(projects.update_project(
+            project.id, ProjectUpdate(prompt_content="New rules"), BackgroundTasks(), db=db, current_user=user
+        ))
+        assert asyncio.run(build()) == "PROJECT CONTEXT:\nNew rules"
+        assert len(statements) == 2
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        system_prompt_cache.invalidate_agent(agent.id)
+        db.close()
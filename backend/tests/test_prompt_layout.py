@@ -0,0 +1,144 @@
+"""
+Tests for cache-friendly prompt ordering and prompt-cache usage accounting
+"""
+
+import asyncio
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from app.config import settings
+from app.core.metrics import metrics
+from app.models import User, Project, Agent, AgentType, ChatMessage, MessageRole, ContextSource
+from app.services.chat_service import ChatService
+from app.services.context_manager import ContextManager
+from app.services.prompt_layout import CLASSIC, STABLE_PREFIX, assemble_prompt, record_prompt_usage
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def seed_project(sync_session_factory):
+    db = sync_session_factory()
+    user = User(email="layout@example.com", password_hash="x", name="L")
+    db.add(user)
+    db.commit()
+    project = Project(
+        user_id=user.id, name="Project", has_prompt=True, prompt_content="Project rules",
+        enable_context_sharing=True, context_source=ContextSource.RECENT,
+    )
+    db.add(project)
+    db.commit()
+    agent = Agent(
+        user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT,
+        name="Writer", has_prompt=True, prompt_content="Write well",
+    )
+    other = Agent(user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT, name="Researcher")
+    db.add_all([agent, other])
+    db.commit()
+    ids = user.id, agent.id, other.id
+    db.close()
+    return ids
+
+
+def run_turns(session_factory, sync_session_factory, user_id, agent_id, other_id):
+    """Two turns of the agent, with the other agent posting before each one"""
+
+    async def build(turn):
+        async with session_factory() as db:
+            manager = ContextManager(db)
+            await manager.save_message(user_id, MessageRole.ASSISTANT, f"finding {turn}", agent_id=other_id)
+            return await manager.build_chat_messages(f"question {turn}", agent_id=agent_id)
+
+    prompts = []
+    for turn in range(2):
+        prompts.append(asyncio.run(build(turn)))
+        # Saved with distinct timestamps (SQLite's now() has one-second resolution)
+        db = sync_session_factory()
+        db.add_all([
+            ChatMessage(
+                user_id=user_id, agent_id=agent_id, role=role, content=f"{text} {turn}",
+                created_at=T0 + timedelta(seconds=2 * turn + offset)
+            )
+            for offset, (role, text) in enumerate([(MessageRole.USER, "question"), (MessageRole.ASSISTANT, "answer")])
+        ])
+        db.commit()
+        db.close()
+    return prompts
+
+
+def encoded(messages):
+    return json.dumps(messages, ensure_ascii=False).encode()
+
+
+def test_consecutive_turns_share_a_byte_identical_prefix(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    monkeypatch.setattr(settings, "PROMPT_LAYOUT", STABLE_PREFIX)
+    first, second = run_turns(session_factory, sync_session_factory, *seed_project(sync_session_factory))
+
+    assert "finding 0" in first[-2]["content"] and "finding 1" in second[-2]["content"]
+    # Everything before the shared context and the new message is replayed verbatim
+    prefix = first[:-2]
+    assert encoded(second[:len(prefix)]) == encoded(prefix)
+    assert second[len(prefix):] == [
+        {"role": "user", "content": "question 0"},
+        {"role": "assistant", "content": "answer 0"},
+        second[-2],
+        {"role": "user", "content": "question 1"},
+    ]
+
+
+def test_classic_layout_puts_shared_context_after_the_system_prompt(sqlite_sessions, monkeypatch):
+    session_factory, sync_session_factory = sqlite_sessions
+    monkeypatch.setattr(settings, "PROMPT_LAYOUT", CLASSIC)
+    first, second = run_turns(session_factory, sync_session_factory, *seed_project(sync_session_factory))
+
+    assert "finding 0" in first[1]["content"]
+    assert first[0] == second[0] and first[1] != second[1]  # the prefix breaks after one message
+    assert second[2:] == [
+        {"role": "user", "content": "question 0"},
+        {"role": "assistant", "content": "answer 0"},
+        {"role": "user", "content": "question 1"},
+    ]
+
+
+def test_assemble_prompt_places_shared_context_by_layout():
+    prefix = [{"role": "system", "content": "rules"}]
+    conversation = [{"role": "user", "content": "hi"}]
+    shared = {"role": "system", "content": "shared"}
+    assert assemble_prompt(prefix, conversation, None, STABLE_PREFIX) == prefix + conversation
+    assert assemble_prompt(prefix, conversation, None, CLASSIC) == prefix + conversation
+    assert assemble_prompt(prefix, conversation, shared, STABLE_PREFIX) == prefix + [shared] + conversation
+    assert assemble_prompt(prefix, [], shared, STABLE_PREFIX) == prefix + [shared]
+
+
+def test_cached_prompt_tokens_are_recorded_from_stream_usage():
+    prompt_before = metrics.counter("llm_prompt_tokens_total").value
+    cached_before = metrics.counter("llm_prompt_cached_tokens_total").value
+    requests = []
+
+    async def stream():
+        for token in ["Hi", "!"]:
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))], usage=None)
+        # Fields the SDK does not model arrive as plain dicts
+        yield SimpleNamespace(choices=[], usage={
+            "prompt_tokens": 2048, "completion_tokens": 2, "prompt_tokens_details": {"cached_tokens": 1536}
+        })
+
+    async def create(**kwargs):
+        requests.append(kwargs)
+        return stream()
+
+    service = ChatService()
+    service.client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    async def run():
+        return [token async for token in service.stream_chat_response([{"role": "user", "content": "hi"}])]
+
+    assert asyncio.run(run()) == ["Hi", "!"]
+    assert requests[0]["extra_body"] == {"stream_options": {"include_usage": True}}
+    assert metrics.counter("llm_prompt_tokens_total").value == prompt_before + 2048
+    assert metrics.counter("llm_prompt_cached_tokens_total").value == cached_before + 1536
+
+    usage = SimpleNamespace(prompt_tokens=1000, prompt_tokens_details=None)
+    assert record_prompt_usage(usage) == 0.0
+    assert record_prompt_usage(SimpleNamespace(prompt_tokens=0)) is None
@@ -0,0 +1,253 @@
+"""
+RAG search: exact scans for small projects, per-transaction
+hnsw.ef_search / ivfflat.probes / iterative scan settings, and chunk
+selection (distance cutoff, MMR, token budget).
+
+The Postgres test needs a real database; set TEST_POSTGRES_URL to run it.
+"""
+
+import asyncio
+import os
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.config import settings
+from app.models import User, Project, Agent, AgentType, ChatMessage, MessageEmbedding, MessageRole
+from app.models.message_embedding import embedding_type
+from app.services.context_providers.rag_provider import (
+    Chunk, RAGProvider, fit_to_budget, maximal_marginal_relevance, select_chunks,
+)
+from app.services.vector_stores import PgVectorStore, ProjectSizeCache, project_sizes
+from app.services.token_counter import count_tokens
+
+TEST_POSTGRES_URL = os.environ.get("TEST_POSTGRES_URL")
+
+
+def seed_embeddings(sync_session_factory, count):
+    db = sync_session_factory()
+    user = User(email="rag@example.com", password_hash="x", name="R")
+    db.add(user)
+    db.commit()
+    project = Project(user_id=user.id, name="P")
+    db.add(project)
+    db.commit()
+    agent = Agent(user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT, name="A")
+    db.add(agent)
+    db.commit()
+    messages = [
+        ChatMessage(user_id=user.id, agent_id=agent.id, project_id=project.id, role=MessageRole.USER, content=f"m{i}")
+        for i in range(count)
+    ]
+    db.add_all(messages)
+    db.commit()
+    db.add_all([
+        MessageEmbedding(
+            project_id=project.id, message_id=m.id, agent_id=agent.id, content=m.content,
+            embedding=[0.5] * settings.EMBEDDING_DIMENSION
+        )
+        for m in messages
+    ])
+    db.commit()
+    project_id = project.id
+    db.close()
+    return project_id
+
+
+def test_embedding_column_type_follows_settings(monkeypatch):
+    monkeypatch.setattr(settings, "EMBEDDING_DIMENSION", 512)
+    monkeypatch.setattr(settings, "EMBEDDING_HALF_PRECISION", True)
+    assert embedding_type().compile(dialect=postgresql.dialect()) == "HALFVEC(512)"
+    monkeypatch.setattr(settings, "EMBEDDING_HALF_PRECISION", False)
+    assert embedding_type().compile(dialect=postgresql.dialect()) == "VECTOR(512)"
+
+
+def test_project_size_cache_expires_entries():
+    now = [0.0]
+    cache = ProjectSizeCache(max_entries=2, ttl_seconds=10, clock=lambda: now[0])
+    a, b, c = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    cache.put(a, 1)
+    cache.put(b, 2)
+    cache.put(c, 3)
+    assert cache.get(a) is None  # evicted (LRU)
+    assert cache.get(c) == 3
+    now[0] = 11
+    assert cache.get(c) is None
+
+
+def test_small_projects_are_scanned_exactly_and_sizes_are_cached(sqlite_sessions, monkeypatch):
+    async_session_factory, sync_session_factory = sqlite_sessions
+    monkeypatch.setattr(settings, "VECTOR_EXACT_SCAN_MAX_ROWS", 3)
+    project_sizes.clear()
+    small = seed_embeddings(sync_session_factory, 3)
+    statements = []
+    event.listen(
+        async_session_factory.kw["bind"].sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+
+    async def run():
+        async with async_session_factory() as db:
+            store = PgVectorStore()
+            first = await store._use_exact_scan(db, small)
+            queries_after_first = len(statements)
+            second = await store._use_exact_scan(db, small)
+            return first, second, queries_after_first
+
+    first, second, queries_after_first = asyncio.run(run())
+    assert first and second
+    assert len(statements) == queries_after_first  # second answer came from the cache
+
+    monkeypatch.setattr(settings, "VECTOR_EXACT_SCAN_MAX_ROWS", 2)
+    project_sizes.clear()
+
+    async def large():
+        async with async_session_factory() as db:
+            return await PgVectorStore()._use_exact_scan(db, small)
+
+    assert not asyncio.run(large())
+    project_sizes.clear()
+
+
+def test_search_settings_are_skipped_off_postgres(sqlite_sessions):
+    async_session_factory, _ = sqlite_sessions
+    statements = []
+    event.listen(
+        async_session_factory.kw["bind"].sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+
+    async def run():
+        async with async_session_factory() as db:
+            await PgVectorStore()._apply_search_settings(db, limit=10)
+
+    asyncio.run(run())
+    assert not any("set_config" in statement for statement in statements)
+
+
+class FakePostgresSession:
+    """Records statements; pg_extension reports `pgvector_version`"""
+
+    def __init__(self, pgvector_version):
+        self.pgvector_version = pgvector_version
+        self.statements = []
+
+    async def connection(self):
+        return SimpleNamespace(dialect=SimpleNamespace(name="postgresql"))
+
+    async def execute(self, statement, params=None):
+        self.statements.append(str(statement))
+        return SimpleNamespace(scalar=lambda: self.pgvector_version)
+
+
+def test_iterative_scan_settings_need_pgvector_0_8(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_ITERATIVE_SCAN", "relaxed_order")
+
+    async def search_settings(store, version):
+        db = FakePostgresSession(version)
+        for _ in range(2):
+            await store._apply_search_settings(db, limit=10)
+        return db.statements
+
+    for version, supported in [("0.7.4", False), ("0.8.0", True), ("0.10.1", True)]:
+        statements = asyncio.run(search_settings(PgVectorStore(), version))
+        assert sum("pg_extension" in statement for statement in statements) == 1  # checked once
+        assert any("hnsw.iterative_scan" in statement for statement in statements) == supported
+        assert sum("hnsw.ef_search" in statement for statement in statements) == 2
+
+
+@pytest.mark.skipif(not TEST_POSTGRES_URL, reason="TEST_POSTGRES_URL not set")
+def test_search_settings_are_local_to_the_transaction(monkeypatch):
+    monkeypatch.setattr(settings, "VECTOR_HNSW_EF_SEARCH", 40)
+    monkeypatch.setattr(settings, "VECTOR_IVFFLAT_PROBES", 7)
+    monkeypatch.setattr(settings, "VECTOR_ITERATIVE_SCAN", "relaxed_order")
+    url = TEST_POSTGRES_URL.replace("postgresql://", "postgresql+asyncpg://", 1)
+
+    async def run():
+        engine = create_async_engine(url)
+        session_factory = async_sessionmaker(bind=engine, class_=AsyncSession)
+        try:
+            async with session_factory() as db:
+                # ef_search is raised to the LIMIT so the index can return enough rows
+                await PgVectorStore()._apply_search_settings(db, limit=100)
+                ef_search = (await db.execute(text("SHOW hnsw.ef_search"))).scalar()
+                probes = (await db.execute(text("SHOW ivfflat.probes"))).scalar()
+                iterative = (await db.execute(text("SHOW hnsw.iterative_scan"))).scalar()
+                await db.commit()
+                after = (await db.execute(text("SHOW hnsw.ef_search"))).scalar()
+        finally:
+            await engine.dispose()
+        return ef_search, probes, iterative, after
+
+    ef_search, probes, iterative, after = asyncio.run(run())
+    assert (ef_search, probes, iterative) == ("100", "7", "relaxed_order")
+    assert after != "100"
+
+
+def chunk(content, distance, embedding, agent_id=None):
+    return Chunk(agent_id or uuid.uuid4(), content, distance, embedding)
+
+
+def test_mmr_prefers_new_information_over_near_duplicates():
+    first = chunk("deploy failed on step 3", 0.20, [1.0, 0.0, 0.0])
+    duplicate = chunk("deploy failed on step 3 (again)", 0.21, [0.99, 0.01, 0.0])
+    different = chunk("the rollback worked", 0.30, [0.5, 0.8, 0.0])
+
+    picked = maximal_marginal_relevance([first, duplicate, different], k=2, mmr_lambda=0.5)
+    assert picked == [first, different]
+
+    # lambda = 1 is plain relevance order
+    assert maximal_marginal_relevance([first, duplicate, different], k=2, mmr_lambda=1.0) == [first, duplicate]
+
+
+def test_weak_matches_are_cut_off():
+    close = chunk("close", 0.3, [1.0, 0.0])
+    far = chunk("far", 0.9, [0.0, 1.0])
+    assert select_chunks([close, far], limit=5, max_distance=0.6, mmr_lambda=1.0) == [close]
+
+
+def test_lines_over_the_token_budget_are_left_out():
+    header, short, long = "HEADER", "short line", "long line " * 50
+    budget = count_tokens(header) + count_tokens(short) + 1 + count_tokens("other") + 1
+    assert fit_to_budget(header, [short, long, "other"], budget) == [short, "other"]
+
+
+def test_shared_context_is_filtered_reranked_and_annotated(monkeypatch):
+    monkeypatch.setattr(settings, "RAG_MAX_DISTANCE", 0.6)
+    monkeypatch.setattr(settings, "RAG_MMR_LAMBDA", 0.5)
+    monkeypatch.setattr(settings, "RAG_DEBUG_DISTANCES", True)
+    agent = uuid.uuid4()
+    provider = RAGProvider(db=None)
+    rows = [
+        (SimpleNamespace(agent_id=agent, content="deploy failed on step 3", embedding=[1.0, 0.0]), 0.2),
+        (SimpleNamespace(agent_id=agent, content="deploy failed on step 3!", embedding=[1.0, 0.01]), 0.21),
+        (SimpleNamespace(agent_id=agent, content="rollback worked", embedding=[0.6, 0.8]), 0.3),
+        (SimpleNamespace(agent_id=agent, content="lunch menu", embedding=[0.0, 1.0]), 0.95),
+    ]
+
+    async def embedding(text):
+        return [1.0, 0.0]
+
+    async def other_agents(project_id, current_agent_id, chat_context=None):
+        return {agent: "Ops"}
+
+    async def search(project_id, agent_ids, query_embedding, limit):
+        assert limit == max(settings.RAG_CANDIDATES, 2)
+        return rows
+
+    provider._get_embedding = embedding
+    provider._get_other_agents = other_agents
+    provider.search = search
+
+    context = asyncio.run(provider.get_shared_context(uuid.uuid4(), uuid.uuid4(), query="deploy?", limit=2))
+    assert context.splitlines() == [
+        "SHARED CONTEXT FROM OTHER AGENTS IN PROJECT (semantic search):",
+        "[Ops] (distance 0.200): deploy failed on step 3",
+        "[Ops] (distance 0.300): rollback worked",
+    ]
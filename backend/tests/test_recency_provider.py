@@ -0,0 +1,78 @@
+"""
+Tests for the recency shared-context provider (project activity feed)
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from app.models import User, Project, Agent, AgentType, ChatMessage, MessageRole
+from app.services.context_providers import RecencyProvider
+
+T0 = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+
+def seed(sync_session_factory):
+    db = sync_session_factory()
+    user = User(email="recency@example.com", password_hash="x", name="R")
+    db.add(user)
+    db.commit()
+    project, elsewhere = Project(user_id=user.id, name="P"), Project(user_id=user.id, name="Q")
+    db.add_all([project, elsewhere])
+    db.commit()
+    me, alice, bob, stranger = (
+        Agent(user_id=user.id, project_id=p.id, agent_type=AgentType.PROJECT_AGENT, name=name)
+        for p, name in [(project, "Me"), (project, "Alice"), (project, "Bob"), (elsewhere, "Stranger")]
+    )
+    db.add_all([me, alice, bob, stranger])
+    db.commit()
+
+    rows = [
+        (alice, MessageRole.USER, "a1"),
+        (me, MessageRole.USER, "mine"),
+        (bob, MessageRole.ASSISTANT, "b" * 300),
+        (stranger, MessageRole.USER, "other project"),
+        (alice, MessageRole.ASSISTANT, "a2"),
+    ]
+    for i, (agent, role, content) in enumerate(rows):
+        db.add(ChatMessage(
+            user_id=user.id, agent_id=agent.id, project_id=agent.project_id,
+            role=role, content=content, created_at=T0 + timedelta(seconds=i)
+        ))
+    db.commit()
+    ids = (project.id, me.id)
+    db.close()
+    return ids
+
+
+def test_feed_returns_other_agents_newest_first_in_order(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    project_id, me_id = seed(sync_session_factory)
+
+    async def run(limit):
+        async with session_factory() as db:
+            return await RecencyProvider(db).get_shared_context(project_id, me_id, limit=limit)
+
+    assert asyncio.run(run(20)).split("\n") == [
+        "SHARED CONTEXT FROM OTHER AGENTS IN PROJECT:",
+        "[Alice - User]: a1",
+        "[Bob - Assistant]: " + "b" * 200,
+        "[Alice - Assistant]: a2",
+    ]
+    assert asyncio.run(run(1)).split("\n")[1:] == ["[Alice - Assistant]: a2"]
+
+
+def test_save_message_denormalizes_project_id(sqlite_sessions):
+    """Messages saved through ContextManager land in their project's feed"""
+    from app.services.context_manager import ContextManager
+
+    session_factory, sync_session_factory = sqlite_sessions
+    project_id, me_id = seed(sync_session_factory)
+
+    async def run():
+        async with session_factory() as db:
+            manager = ContextManager(db)
+            user_id = (await manager.load_chat_context(me_id)).user_id
+            message = await manager.save_message(user_id, MessageRole.USER, "hello", agent_id=me_id)
+            return message.project_id
+
+    assert asyncio.run(run()) == project_id
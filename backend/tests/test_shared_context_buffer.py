@@ -0,0 +1,131 @@
+"""
+Tests for the per-project in-memory shared context buffer
+"""
+
+import asyncio
+from uuid import uuid4
+
+from sqlalchemy import event
+
+from app.core.invalidation import FLUSH, Invalidation
+from app.models import User, Project, Agent, AgentType, MessageRole
+from app.services.context_manager import ContextManager
+from app.services.context_providers import RecencyProvider
+from app.services.shared_context_buffer import (
+    ENTRY_OVERHEAD_BYTES,
+    FeedEntry,
+    SharedContextBuffer,
+    shared_context_buffer,
+)
+
+
+def entry(agent_id=None, preview="x"):
+    return FeedEntry(uuid4(), agent_id or uuid4(), "Agent", MessageRole.USER, preview)
+
+
+def test_ring_buffer_keeps_last_n():
+    buffer = SharedContextBuffer(capacity=3, max_bytes=10**6)
+    project_id = uuid4()
+    buffer.begin_warm(project_id)
+    buffer.finish_warm(project_id, [])
+    entries = [entry(preview=str(i)) for i in range(5)]
+    for e in entries:
+        buffer.append(project_id, e)
+
+    feed = buffer.get(project_id)
+    assert list(feed.entries) == entries[2:]
+    assert buffer.size_bytes == sum(e.size_bytes for e in entries[2:])
+
+
+def test_global_cap_evicts_least_recently_used_project():
+    per_entry = ENTRY_OVERHEAD_BYTES + len("Agent") + 1
+    buffer = SharedContextBuffer(capacity=10, max_bytes=per_entry * 4)
+    a, b, c = uuid4(), uuid4(), uuid4()
+    for project_id in (a, b):
+        buffer.begin_warm(project_id)
+        buffer.finish_warm(project_id, [entry(), entry()])
+    buffer.get(a)  # b is now the coldest
+
+    buffer.begin_warm(c)
+    buffer.finish_warm(c, [entry()])
+
+    assert buffer.get(b) is None
+    assert buffer.get(a) is not None and buffer.get(c) is not None
+    assert buffer.size_bytes <= buffer.max_bytes
+
+
+def test_append_during_warm_is_merged_and_invalidation_cancels_caching():
+    buffer = SharedContextBuffer(capacity=10, max_bytes=10**6)
+    project_id = uuid4()
+    from_db, concurrent = entry(), entry()
+
+    buffer.begin_warm(project_id)
+    buffer.append(project_id, from_db)  # saved before the warm query read it
+    buffer.append(project_id, concurrent)  # saved after
+    feed = buffer.finish_warm(project_id, [from_db])
+    assert list(feed.entries) == [from_db, concurrent]
+
+    other = uuid4()
+    buffer.begin_warm(other)
+    buffer.on_invalidation(Invalidation("agent", uuid4()))
+    buffer.finish_warm(other, [entry()])
+    assert buffer.get(other) is None  # served, but not cached
+
+    buffer.on_invalidation(Invalidation(FLUSH))
+    assert len(buffer) == 0 and buffer.size_bytes == 0
+
+
+def test_provider_serves_from_buffer_with_zero_queries(sqlite_sessions):
+    session_factory, sync_session_factory = sqlite_sessions
+    db = sync_session_factory()
+    user = User(email="buffer@example.com", password_hash="x", name="B")
+    db.add(user)
+    db.commit()
+    project = Project(user_id=user.id, name="P")
+    db.add(project)
+    db.commit()
+    me = Agent(user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT, name="Me")
+    other = Agent(user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT, name="Other")
+    db.add_all([me, other])
+    db.commit()
+    ids = (user.id, project.id, me.id, other.id)
+    db.close()
+    user_id, project_id, me_id, other_id = ids
+
+    statements = []
+    engine = session_factory.kw["bind"].sync_engine
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    async def shared():
+        async with session_factory() as session:
+            return await RecencyProvider(session).get_shared_context(project_id, me_id)
+
+    async def save(agent_id, content):
+        async with session_factory() as session:
+            await ContextManager(session).save_message(user_id, MessageRole.USER, content, agent_id=agent_id)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        assert asyncio.run(shared()) is None  # warms an empty feed
+        warm_queries = len(statements)
+        asyncio.run(save(other_id, "first"))
+        asyncio.run(save(me_id, "mine"))
+
+        statements.clear()
+        assert asyncio.run(shared()) == "SHARED CONTEXT FROM OTHER AGENTS IN PROJECT:\n[Other - User]: first"
+        assert statements == []
+
+        # Clearing a history drops the affected feed; the next read warms it again
+        async def clear():
+            async with session_factory() as session:
+                await ContextManager(session).clear_agent_history(other_id)
+
+        asyncio.run(clear())
+        statements.clear()
+        assert asyncio.run(shared()) is None
+        assert len(statements) == warm_queries
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+        shared_context_buffer.discard_project(project_id)
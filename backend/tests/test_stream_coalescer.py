@@ -0,0 +1,74 @@
+"""
+Tests for SSE token coalescing (app.services.stream_coalescer)
+"""
+
+import asyncio
+import time
+
+from app.services.stream_coalescer import FlushPolicy, coalesce_tokens
+
+
+async def token_stream(tokens, delay=0.0):
+    for token in tokens:
+        if delay:
+            await asyncio.sleep(delay)
+        yield token
+
+
+def collect(chunks, policy):
+    async def run():
+        return [frame async for frame in coalesce_tokens(chunks, policy)]
+    return asyncio.run(run())
+
+
+def test_per_token_policy_passes_deltas_through():
+    """interval_ms=0 writes one frame per delta"""
+    tokens = ["Hel", "lo", " wor", "ld"]
+    frames = collect(token_stream(tokens), FlushPolicy(interval_ms=0, max_bytes=512))
+    assert frames == tokens
+
+
+def test_flushes_on_byte_threshold():
+    """A frame is written as soon as the buffer reaches max_bytes"""
+    tokens = ["abcd"] * 10
+    frames = collect(token_stream(tokens), FlushPolicy(interval_ms=10_000, max_bytes=8))
+    assert frames == ["abcdabcd"] * 5
+
+
+def test_flushes_on_time_window_while_upstream_is_silent():
+    """A buffered delta is not held back past the window by a slow upstream"""
+    async def slow_stream():
+        yield "first"
+        await asyncio.sleep(0.2)
+        yield "second"
+
+    async def run():
+        started = time.monotonic()
+        arrivals = []
+        async for frame in coalesce_tokens(slow_stream(), FlushPolicy(interval_ms=20, max_bytes=4096)):
+            arrivals.append((frame, time.monotonic() - started))
+        return arrivals
+
+    arrivals = asyncio.run(run())
+    assert [frame for frame, _ in arrivals] == ["first", "second"]
+    assert arrivals[0][1] < 0.15
+
+
+def test_batches_fast_stream_and_preserves_content():
+    """Many small deltas collapse into fewer frames with identical text"""
+    tokens = [f"t{i} " for i in range(500)]
+    frames = collect(token_stream(tokens), FlushPolicy(interval_ms=50, max_bytes=256))
+    assert "".join(frames) == "".join(tokens)
+    assert len(frames) < len(tokens) / 10
+
+
+def test_policy_from_settings_applies_overrides(monkeypatch):
+    """Per-request values win over Settings defaults"""
+    from app.config import settings
+    monkeypatch.setattr(settings, "SSE_FLUSH_INTERVAL_MS", 30)
+    monkeypatch.setattr(settings, "SSE_FLUSH_MAX_BYTES", 512)
+
+    assert FlushPolicy.from_settings() == FlushPolicy(30, 512)
+    assert FlushPolicy.from_settings(interval_ms=0) == FlushPolicy(0, 512)
+    assert FlushPolicy.from_settings(max_bytes=64) == FlushPolicy(30, 64)
+    assert FlushPolicy.from_settings(interval_ms=0).per_token
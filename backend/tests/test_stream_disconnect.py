@@ -0,0 +1,166 @@
+"""
+Tests for aborting the LLM stream when the SSE client disconnects
+"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app.api.v1 import chat
+from app.core.metrics import metrics
+from app.models import User, Agent, AgentType, ChatMessage, MessageRole
+from app.services.chat_service import ChatService
+from app.services.stream_coalescer import FlushPolicy
+from app.services.token_counter import count_tokens
+
+PER_TOKEN = FlushPolicy(interval_ms=0, max_bytes=512)
+
+
+def seed_agent(sync_session_factory):
+    db = sync_session_factory()
+    user = User(email="disconnect@example.com", password_hash="x", name="D")
+    db.add(user)
+    db.commit()
+    agent = Agent(user_id=user.id, agent_type=AgentType.STANDALONE, name="Agent")
+    db.add(agent)
+    db.commit()
+    ids = (user.id, agent.id)
+    db.close()
+    return ids
+
+
+def assistant_messages(sync_session_factory):
+    db = sync_session_factory()
+    rows = db.query(ChatMessage).filter(ChatMessage.role == MessageRole.ASSISTANT).all()
+    db.close()
+    return rows
+
+
+class FakeLLM:
+    """Endless token stream that records whether it was closed early"""
+
+    def __init__(self):
+        self.closed = False
+
+    async def __call__(self, messages, model="gpt-4o-mini"):
+        try:
+            i = 0
+            while True:
+                await asyncio.sleep(0.001)
+                yield f"t{i} "
+                i += 1
+        finally:
+            self.closed = True
+
+
+def test_disconnect_check_aborts_upstream_and_saves_partial(sqlite_sessions, monkeypatch):
+    """Request.is_disconnected turning true stops the stream and keeps a truncated reply"""
+    session_factory, sync_session_factory = sqlite_sessions
+    user_id, agent_id = seed_agent(sync_session_factory)
+    llm = FakeLLM()
+    monkeypatch.setattr(chat, "stream_openai_response", llm)
+
+    sent = []
+
+    async def is_disconnected():
+        return len(sent) >= 3
+
+    async def run():
+        async for frame in chat.create_sse_generator(
+            agent_id=agent_id,
+            user_id=user_id,
+            message="hello",
+            session_factory=session_factory,
+            flush_policy=PER_TOKEN,
+            is_disconnected=is_disconnected,
+        ):
+            sent.append(json.loads(frame[len("data: "):]))
+
+    asyncio.run(run())
+
+    assert llm.closed
+    assert [f["type"] for f in sent] == ["token"] * 3
+    [reply] = assistant_messages(sync_session_factory)
+    assert reply.is_truncated is True
+    assert reply.content.startswith("t0 t1 t2 ")
+
+
+def test_cancelled_response_task_aborts_upstream_and_saves_partial(sqlite_sessions, monkeypatch):
+    """Cancelling the task that drives the generator (Starlette on disconnect) aborts upstream"""
+    session_factory, sync_session_factory = sqlite_sessions
+    user_id, agent_id = seed_agent(sync_session_factory)
+    llm = FakeLLM()
+    monkeypatch.setattr(chat, "stream_openai_response", llm)
+
+    async def consume(received):
+        async for frame in chat.create_sse_generator(
+            agent_id=agent_id,
+            user_id=user_id,
+            message="hello",
+            session_factory=session_factory,
+            flush_policy=PER_TOKEN,
+        ):
+            received.append(frame)
+
+    async def run():
+        received = []
+        task = asyncio.create_task(consume(received))
+        while len(received) < 5:
+            await asyncio.sleep(0.001)
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+    asyncio.run(run())
+
+    assert llm.closed
+    [reply] = assistant_messages(sync_session_factory)
+    assert reply.is_truncated is True
+    assert reply.content
+
+
+class FakeOpenAIStream:
+    def __init__(self, tokens):
+        self.tokens = tokens
+        self.response = SimpleNamespace(closed=False)
+
+        async def aclose():
+            self.response.closed = True
+        self.response.aclose = aclose
+
+    async def __aiter__(self):
+        for token in self.tokens:
+            await asyncio.sleep(0)
+            delta = SimpleNamespace(content=token)
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)])
+
+
+def test_chat_service_closes_openai_response_and_counts_saved_tokens(monkeypatch):
+    """Closing stream_chat_response early closes the HTTP response and records the metric"""
+    from app.config import settings
+    monkeypatch.setattr(settings, "LLM_MAX_TOKENS", 100)
+
+    upstream = FakeOpenAIStream([f"t{i}" for i in range(50)])
+
+    async def create(**kwargs):
+        return upstream
+
+    service = ChatService()
+    service.client = SimpleNamespace(
+        chat=SimpleNamespace(completions=SimpleNamespace(create=create))
+    )
+    saved_before = metrics.counter("chat_stream_tokens_saved_total").value
+    aborted_before = metrics.counter("chat_streams_aborted_total").value
+
+    async def run():
+        stream = service.stream_chat_response([{"role": "user", "content": "hi"}])
+        received = [await stream.__anext__() for _ in range(3)]
+        await stream.aclose()
+        return received
+
+    assert asyncio.run(run()) == ["t0", "t1", "t2"]
+    assert upstream.response.closed
+    assert metrics.counter("chat_streams_aborted_total").value == aborted_before + 1
+    assert metrics.counter("chat_stream_tokens_saved_total").value == saved_before + 100 - count_tokens("t0t1t2")
@@ -0,0 +1,164 @@
+"""
+Load test: concurrent chat streams against a stubbed LLM.
+
+Verifies that the SSE pipeline only holds pooled database connections for
+short reads/writes, so a single worker can serve far more concurrent streams
+than the pool has connections, and that database work never stalls the
+event loop for the other streams.
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app.api.v1 import chat
+from app.database import Base
+from app.models import User, Agent, AgentType, ChatMessage, MessageRole
+
+CONCURRENT_STREAMS = 300
+TOKENS_PER_STREAM = 20
+POOL_SIZE = 10
+MAX_OVERFLOW = 20
+MAX_EVENT_LOOP_LAG_P99 = 0.05  # seconds
+
+
+@pytest.fixture
+def pooled_session_factory(tmp_path):
+    """File-backed SQLite (async driver) behind a pool sized like production."""
+    db_path = tmp_path / "load.db"
+    sync_engine = create_engine(f"sqlite:///{db_path}")
+    Base.metadata.create_all(bind=sync_engine)
+
+    engine = create_async_engine(
+        f"sqlite+aiosqlite:///{db_path}",
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=POOL_SIZE,
+        max_overflow=MAX_OVERFLOW,
+        pool_timeout=5,
+        connect_args={"timeout": 30},
+    )
+
+    @event.listens_for(engine.sync_engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Concurrent writers: let SQLite queue them instead of failing fast
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    stats = {"checked_out": 0}
+
+    @event.listens_for(engine.sync_engine, "checkout")
+    def on_checkout(*args):
+        stats["checked_out"] += 1
+
+    @event.listens_for(engine.sync_engine, "checkin")
+    def on_checkin(*args):
+        stats["checked_out"] -= 1
+
+    factory = async_sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    yield factory, sessionmaker(bind=sync_engine), stats
+
+    asyncio.run(engine.dispose())
+    Base.metadata.drop_all(bind=sync_engine)
+    sync_engine.dispose()
+
+
+class HeldLLM:
+    """
+    Stub LLM: a slow token stream that never touches the network. Every
+    stream stops after its first token until all of them have got there,
+    and the pooled connections checked out at that moment are recorded.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+        self.mid_stream = 0
+        self.checked_out_mid_stream = None
+        self.release = asyncio.Event()
+
+    async def __call__(self, messages, model="gpt-4o-mini"):
+        for i in range(TOKENS_PER_STREAM):
+            await asyncio.sleep(0.005)
+            yield f"tok{i} "
+            if i == 0:
+                self.mid_stream += 1
+                if self.mid_stream == CONCURRENT_STREAMS:
+                    self.checked_out_mid_stream = self.stats["checked_out"]
+                    self.release.set()
+                await self.release.wait()
+
+
+def test_hundreds_of_concurrent_streams(pooled_session_factory, monkeypatch):
+    """Streams far beyond pool capacity complete without exhausting the pool"""
+    print("\n=== Testing Concurrent Streams Against Stubbed LLM ===")
+    session_factory, sync_session_factory, stats = pooled_session_factory
+    llm = HeldLLM(stats)
+    monkeypatch.setattr(chat, "stream_openai_response", llm)
+
+    db = sync_session_factory()
+    user = User(email="load@example.com", password_hash="x", name="Load")
+    db.add(user)
+    db.commit()
+    agents = []
+    for i in range(CONCURRENT_STREAMS):
+        agent = Agent(user_id=user.id, agent_type=AgentType.STANDALONE, name=f"Agent {i}")
+        db.add(agent)
+        agents.append(agent)
+    db.commit()
+    user_id, agent_ids = user.id, [a.id for a in agents]
+    db.close()
+
+    async def run_stream(agent_id):
+        frames = []
+        async for frame in chat.create_sse_generator(
+            agent_id=agent_id,
+            user_id=user_id,
+            message="hello",
+            session_factory=session_factory,
+        ):
+            frames.append(json.loads(frame[len("data: "):]))
+        return frames
+
+    async def measure_loop_lag(stop: asyncio.Event, lags: list):
+        interval = 0.01
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - started - interval)
+
+    async def run_all():
+        stop, lags = asyncio.Event(), []
+        ticker = asyncio.create_task(measure_loop_lag(stop, lags))
+        results = await asyncio.gather(*(run_stream(a) for a in agent_ids))
+        stop.set()
+        await ticker
+        return results, lags
+
+    results, lags = asyncio.run(run_all())
+
+    for frames in results:
+        # A pool timeout (or any other failure) would end the stream with an error frame
+        assert not [f for f in frames if f["type"] == "error"], frames[-1]
+        assert frames[-1]["type"] == "done", frames[-1]
+        text = "".join(f["content"] for f in frames if f["type"] == "token")
+        assert text == "".join(f"tok{i} " for i in range(TOKENS_PER_STREAM))
+
+    # With all streams open mid-generation no connection is held (holding one
+    # per stream would have exhausted the pool long before), and database
+    # I/O does not block the loop serving the other streams
+    assert llm.checked_out_mid_stream == 0
+    assert stats["checked_out"] == 0
+    lags.sort()
+    lag_p99 = lags[int(len(lags) * 0.99)]
+    assert lag_p99 < MAX_EVENT_LOOP_LAG_P99
+
+    db = sync_session_factory()
+    assert db.query(ChatMessage).filter(ChatMessage.role == MessageRole.USER).count() == CONCURRENT_STREAMS
+    assert db.query(ChatMessage).filter(ChatMessage.role == MessageRole.ASSISTANT).count() == CONCURRENT_STREAMS
+    db.close()
+
+    print(f"✓ {CONCURRENT_STREAMS} concurrent streams completed")
@@ -0,0 +1,168 @@
+"""
+Tests for idempotent, resumable chat streams (app.services.stream_registry)
+"""
+
+import asyncio
+from uuid import uuid4
+
+from app.api.v1 import chat
+from app.services.stream_registry import EXPIRED_FRAME, StreamRegistry, TRUNCATED_FRAME
+
+
+def frame(n):
+    return f'data: {{"type": "token", "content": "t{n}"}}\n\n'
+
+
+class CountingFactory:
+    """Frame generator factory that counts how often generation starts"""
+
+    def __init__(self, count=5, delay=0.0):
+        self.count = count
+        self.delay = delay
+        self.calls = 0
+        self.cancelled = False
+
+    def __call__(self):
+        self.calls += 1
+        return self._frames()
+
+    async def _frames(self):
+        try:
+            for n in range(self.count):
+                await asyncio.sleep(self.delay)
+                yield frame(n)
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
+
+
+async def read_all(registry, record, last_event_id=0, limit=None):
+    frames = []
+    async for item in registry.follow(record, last_event_id):
+        frames.append(item)
+        if limit and len(frames) >= limit:
+            break
+    return frames
+
+
+def test_frames_are_numbered_and_replayed_without_regenerating():
+    """A retry with the same key replays from the buffer; the factory runs once"""
+    async def run():
+        registry = StreamRegistry(ttl=60, max_streams=10, max_bytes=10_000, resume_grace=1)
+        factory = CountingFactory()
+
+        record = registry.open_stream("k", factory)
+        first = await read_all(registry, record)
+        replay = await read_all(registry, registry.open_stream("k", factory), last_event_id=3)
+        return factory, first, replay
+
+    factory, first, replay = asyncio.run(run())
+    assert factory.calls == 1
+    assert first == [f"id: {n + 1}\n{frame(n)}" for n in range(5)]
+    assert replay == first[3:]
+
+
+def test_reconnect_mid_stream_resumes_live():
+    """A client that drops mid-stream resumes from Last-Event-ID while generation continues"""
+    async def run():
+        registry = StreamRegistry(ttl=60, max_streams=10, max_bytes=10_000, resume_grace=5)
+        factory = CountingFactory(count=10, delay=0.01)
+        record = registry.open_stream("k", factory)
+
+        partial = await read_all(registry, record, limit=3)
+        resumed = await read_all(registry, registry.open_stream("k", factory), last_event_id=3)
+        return factory, partial, resumed
+
+    factory, partial, resumed = asyncio.run(run())
+    assert factory.calls == 1
+    assert not factory.cancelled
+    assert [f.split("\n")[0] for f in partial + resumed] == [f"id: {n}" for n in range(1, 11)]
+
+
+def test_orphaned_stream_is_cancelled_after_grace():
+    """With no subscriber left, generation is cancelled and a truncated done frame recorded"""
+    async def run():
+        registry = StreamRegistry(ttl=60, max_streams=10, max_bytes=10_000, resume_grace=0.02)
+        factory = CountingFactory(count=1000, delay=0.01)
+        record = registry.open_stream("k", factory)
+        await read_all(registry, record, limit=2)
+        await asyncio.wait_for(record.task, timeout=2)
+        return factory, record
+
+    factory, record = asyncio.run(run())
+    assert factory.cancelled
+    assert record.done
+    assert record.frames[-1] == TRUNCATED_FRAME
+
+
+def test_reuse_false_starts_a_new_generation():
+    """A fresh request without key or Last-Event-ID regenerates"""
+    async def run():
+        registry = StreamRegistry(ttl=60, max_streams=10, max_bytes=10_000, resume_grace=1)
+        factory = CountingFactory()
+        await read_all(registry, registry.open_stream("k", factory))
+        await read_all(registry, registry.open_stream("k", factory, reuse=False))
+        return factory
+
+    assert asyncio.run(run()).calls == 2
+
+
+def test_retention_is_bounded_by_time_and_size():
+    """Finished streams expire after the TTL and the oldest are evicted over the limits"""
+    async def run():
+        registry = StreamRegistry(ttl=0.05, max_streams=3, max_bytes=10_000, resume_grace=1)
+        for n in range(5):
+            await read_all(registry, registry.open_stream(f"k{n}", CountingFactory()))
+        by_count = len(registry)
+
+        await asyncio.sleep(0.1)
+        registry.open_stream("fresh", CountingFactory())
+        by_ttl = len(registry)
+
+        sized = StreamRegistry(ttl=60, max_streams=100, max_bytes=200, resume_grace=1)
+        for n in range(5):
+            await read_all(sized, sized.open_stream(f"k{n}", CountingFactory()))
+        sized.open_stream("last", CountingFactory())
+        return by_count, by_ttl, sized
+
+    by_count, by_ttl, sized = asyncio.run(run())
+    assert by_count == 3
+    assert by_ttl == 1
+    assert sized.size_bytes <= 200 + len(frame(0)) * 5
+    assert "k0" not in sized._records
+
+
+class FakeRequest:
+    async def is_disconnected(self):
+        return False
+
+
+USER_ID = uuid4()
+
+
+async def chat_stream(idempotency_key=None, last_event_id=None):
+    response = chat._open_chat_stream(
+        FakeRequest(), USER_ID, chat_scope="temp:t", message="hi",
+        idempotency_key=idempotency_key, last_event_id=last_event_id
+    )
+    return [item async for item in response.body_iterator]
+
+
+def test_resume_never_starts_a_new_generation(monkeypatch):
+    """A Last-Event-ID reconnect for an unknown, evicted or keyless stream gets a terminal frame"""
+    factory = CountingFactory()
+    monkeypatch.setattr(chat, "stream_registry", StreamRegistry(ttl=60, max_streams=10, max_bytes=10_000))
+    monkeypatch.setattr(chat, "create_sse_generator", lambda **kwargs: factory())
+
+    async def run():
+        first = await chat_stream(idempotency_key="turn-1")
+        resumed = await chat_stream(idempotency_key="turn-1", last_event_id="3")
+        unknown = await chat_stream(idempotency_key="turn-2", last_event_id="3")
+        await chat_stream()  # no key: never attachable
+        keyless = await chat_stream(last_event_id="3")
+        return first, resumed, unknown, keyless
+
+    first, resumed, unknown, keyless = asyncio.run(run())
+    assert factory.calls == 2
+    assert resumed == first[3:]
+    assert unknown == keyless == [EXPIRED_FRAME]
@@ -0,0 +1,226 @@
+"""
+Tests for the in-memory vector store and the RAG pipeline running fully
+offline on SQLite (local embedder + in-memory store)
+"""
+
+import asyncio
+import uuid
+
+import numpy as np
+from sqlalchemy import event
+
+from app.config import settings
+from app.core.invalidation import FLUSH, Invalidation
+from app.models import User, Project, Agent, AgentType, ChatMessage, MessageEmbedding, MessageRole
+from app.services.context_providers import rag_provider
+from app.services.context_providers.rag_provider import EmbeddingService, RAGProvider
+from app.services.embedding_client import LocalEmbedder
+from app.services.vector_stores import InMemoryVectorStore, ProjectIndex, VectorRecord, VectorStore
+
+DIM = settings.EMBEDDING_DIMENSION
+
+
+def unit(index):
+    vector = [0.0] * DIM
+    vector[index] = 1.0
+    return vector
+
+
+def seed(sync_session_factory, embeddings):
+    """Project with agents A and B; `embeddings` is a list of (agent name, content, vector or None)"""
+    db = sync_session_factory()
+    user = User(email="vectors@example.com", password_hash="x", name="V")
+    db.add(user)
+    db.commit()
+    project = Project(user_id=user.id, name="P", context_source="rag")
+    db.add(project)
+    db.commit()
+    agents = {
+        name: Agent(user_id=user.id, project_id=project.id, agent_type=AgentType.PROJECT_AGENT, name=name)
+        for name in ("A", "B")
+    }
+    db.add_all(agents.values())
+    db.commit()
+    messages = []
+    for name, content, vector in embeddings:
+        message = ChatMessage(
+            user_id=user.id, agent_id=agents[name].id, project_id=project.id, role=MessageRole.USER, content=content
+        )
+        db.add(message)
+        db.commit()
+        if vector is not None:
+            db.add(MessageEmbedding(
+                project_id=project.id, message_id=message.id, agent_id=agents[name].id,
+                content=content, embedding=vector
+            ))
+            db.commit()
+        messages.append(message.id)
+    ids = project.id, {name: agent.id for name, agent in agents.items()}, messages
+    db.close()
+    return ids
+
+
+def count_queries(async_session_factory):
+    statements = []
+    event.listen(
+        async_session_factory.kw["bind"].sync_engine,
+        "before_cursor_execute",
+        lambda conn, cursor, statement, *args: statements.append(statement)
+    )
+    return statements
+
+
+def test_project_index_matches_brute_force_and_filters_agents():
+    rng = np.random.default_rng(0)
+    project_id, a, b = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    vectors = rng.normal(size=(200, 16))
+    records = [
+        VectorRecord(uuid.uuid4(), project_id, a if i % 2 else b, f"message {i}", vectors[i])
+        for i in range(200)
+    ]
+    index = ProjectIndex(project_id, 16, records)  # grows past INITIAL_CAPACITY
+    query = rng.normal(size=16)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    distances = 1 - normalized @ (query / np.linalg.norm(query))
+    expected = [records[i].message_id for i in np.argsort(distances)[:5]]
+    results = index.search([a, b], query, 5)
+    assert [record.message_id for record, _ in results] == expected
+    assert np.allclose([distance for _, distance in results], np.sort(distances)[:5], atol=1e-5)
+
+    only_a = index.search([a], query, 5)
+    assert len(only_a) == 5 and all(record.agent_id == a for record, _ in only_a)
+
+    removed = expected[0]
+    assert index.remove(removed)
+    assert removed not in [record.message_id for record, _ in index.search([a, b], query, 5)]
+    assert len(index) == 199
+
+
+def test_projects_are_loaded_once_and_kept_current(sqlite_sessions):
+    async_session_factory, sync_session_factory = sqlite_sessions
+    project_id, agents, messages = seed(sync_session_factory, [
+        ("A", "deploy failed", unit(0)),
+        ("B", "rollback worked", unit(1)),
+        ("A", "lunch menu", unit(2)),
+    ])
+    store = InMemoryVectorStore(refresh_seconds=3600)
+    statements = count_queries(async_session_factory)
+
+    async def search(query, agent_ids=None):
+        async with async_session_factory() as db:
+            results = await store.search(db, project_id, agent_ids or list(agents.values()), query, 2)
+        return [(record.content, round(distance, 3)) for record, distance in results]
+
+    assert asyncio.run(search(unit(0))) == [("deploy failed", 0.0), ("rollback worked", 1.0)]
+    loaded_with = len(statements)
+    assert asyncio.run(search(unit(1), [agents["B"]])) == [("rollback worked", 0.0)]
+    assert len(statements) == loaded_with  # served from memory
+
+    new_message = uuid.uuid4()
+    store.added([VectorRecord(new_message, project_id, agents["B"], "deploy retried", unit(0))])
+    assert asyncio.run(search(unit(0), [agents["B"]]))[0] == ("deploy retried", 0.0)
+
+    store.discard_message(new_message)
+    assert asyncio.run(search(unit(0), [agents["B"]]))[0] == ("rollback worked", 1.0)
+
+    store.on_invalidation(Invalidation("agent", agents["A"]))
+    assert len(store) == 0
+    asyncio.run(search(unit(0)))
+    assert len(statements) > loaded_with  # reloaded
+    store.on_invalidation(Invalidation(FLUSH))
+    assert len(store) == 0
+
+
+def test_other_workers_writes_are_picked_up_on_refresh(sqlite_sessions):
+    async_session_factory, sync_session_factory = sqlite_sessions
+    project_id, agents, _ = seed(sync_session_factory, [("A", "deploy failed", unit(0))])
+    now = [0.0]
+    store = InMemoryVectorStore(refresh_seconds=5, clock=lambda: now[0])
+
+    async def search():
+        async with async_session_factory() as db:
+            results = await store.search(db, project_id, [agents["A"]], unit(3), 5)
+        return [record.content for record, _ in results]
+
+    assert asyncio.run(search()) == ["deploy failed"]
+    db = sync_session_factory()
+    message = ChatMessage(
+        user_id=db.get(Project, project_id).user_id, agent_id=agents["A"], project_id=project_id,
+        role=MessageRole.USER, content="written elsewhere"
+    )
+    db.add(message)
+    db.commit()
+    db.add(MessageEmbedding(
+        project_id=project_id, message_id=message.id, agent_id=agents["A"], content=message.content, embedding=unit(3)
+    ))
+    db.commit()
+    db.close()
+
+    assert asyncio.run(search()) == ["deploy failed"]  # within refresh_seconds
+    now[0] = 6
+    assert asyncio.run(search()) == ["written elsewhere", "deploy failed"]
+
+
+class RecordingStore(VectorStore):
+    def __init__(self):
+        self.searches = 0
+
+    async def search(self, db, project_id, agent_ids, query_embedding, limit):
+        self.searches += 1
+        return []
+
+
+def test_projects_over_the_row_cap_go_to_the_fallback(sqlite_sessions):
+    async_session_factory, sync_session_factory = sqlite_sessions
+    project_id, agents, _ = seed(sync_session_factory, [("A", f"message {i}", unit(i)) for i in range(3)])
+    fallback = RecordingStore()
+    store = InMemoryVectorStore(fallback=fallback, max_project_rows=2)
+
+    async def search():
+        async with async_session_factory() as db:
+            return await store.search(db, project_id, list(agents.values()), unit(0), 5)
+
+    assert asyncio.run(search()) == [] and asyncio.run(search()) == []
+    assert fallback.searches == 2
+    assert len(store) == 0
+
+
+def test_memory_cap_evicts_least_recently_used_projects():
+    store = InMemoryVectorStore(max_bytes=1, dimensions=4)
+    first, second = uuid.uuid4(), uuid.uuid4()
+    for project_id in (first, second):
+        store._projects[project_id] = ProjectIndex(project_id, 4)
+        store.added([VectorRecord(uuid.uuid4(), project_id, uuid.uuid4(), "x", [1.0, 0, 0, 0])])
+    assert list(store._projects) == [second]
+
+
+def test_rag_pipeline_runs_offline_on_sqlite(sqlite_sessions, monkeypatch):
+    async_session_factory, sync_session_factory = sqlite_sessions
+    monkeypatch.setattr(settings, "RAG_MAX_DISTANCE", 0.8)
+    monkeypatch.setattr(rag_provider, "embedding_client", LocalEmbedder())
+    contents = [
+        ("B", "The production deploy failed because the database migration timed out"),
+        ("B", "Team lunch is pizza on friday at noon"),
+        ("B", "Rolling back the migration fixed the production deploy"),
+        ("A", "I am agent A and my own messages are never shared back to me"),
+    ]
+    project_id, agents, messages = seed(sync_session_factory, [(name, text, None) for name, text in contents])
+    store = InMemoryVectorStore()
+
+    async def run():
+        async with async_session_factory() as db:
+            service = EmbeddingService(db, store=store)
+            for message_id, (name, text) in zip(messages, contents):
+                assert await service.index_message(message_id, agents[name], project_id, text) is not None
+            return await RAGProvider(db, store=store).get_shared_context(
+                project_id, agents["A"], query="why did the production deploy fail?", limit=2
+            )
+
+    context = asyncio.run(run())
+    lines = context.splitlines()
+    assert lines[0].startswith("SHARED CONTEXT FROM OTHER AGENTS")
+    assert sorted(lines[1:]) == [
+        "[B]: Rolling back the migration fixed the production deploy",
+        "[B]: The production deploy failed because the database migration timed out",
+    ]
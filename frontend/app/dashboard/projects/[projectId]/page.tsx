@@ -208,7 +208,7 @@ export default function ProjectPage() {
               {currentProject.enable_context_sharing && (
                 <span
                   className="hidden sm:flex items-center gap-2 px-3 py-1.5 rounded-lg bg-primary/10 text-primary border border-primary/20 text-xs font-medium"
-                  title={`Context sharing: ${currentProject.context_source === 'rag' ? 'RAG (Semantic Search)' : 'Recent Messages'}`}
+                  title={`Context sharing: ${currentProject.context_source === 'rag' ? 'RAG (Semantic Search)' : currentProject.context_source === 'hybrid' ? 'Hybrid (Keyword + Semantic)' : 'Recent Messages'}`}
                   aria-label="Context sharing is on"
                 >
                   <span className="w-2 h-2 rounded-full bg-green-500 shrink-0" aria-hidden />
@@ -381,6 +381,22 @@ export default function ProjectPage() {
                         </p>
                       </div>
                     </label>
+                    <label className="flex items-start gap-3 cursor-pointer p-3 rounded-lg border border-border hover:bg-muted/50 transition-colors">
+                      <input
+                        type="radio"
+                        name="editContextSource"
+                        value="hybrid"
+                        checked={editContextSource === 'hybrid'}
+                        onChange={() => setEditContextSource('hybrid')}
+                        className="mt-0.5 w-4 h-4 text-primary focus:ring-2 focus:ring-ring"
+                      />
+                      <div>
+                        <span className="font-medium">Hybrid (Keyword + Semantic)</span>
+                        <p className="text-xs text-muted-foreground mt-1">
+                          Combines keyword and semantic search; finds exact terms like error codes and keeps working if semantic search is unavailable
+                        </p>
+                      </div>
+                    </label>
                   </div>
                 </div>
               )}
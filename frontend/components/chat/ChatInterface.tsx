@@ -145,10 +145,12 @@ export default function ChatInterface({ chatType, chatId }: ChatInterfaceProps)
 
     // Auth via httpOnly cookie (sent automatically with same-site request when using proxy)
     const baseUrl = process.env.NEXT_PUBLIC_API_URL ?? '';
+    // Idempotency key lets EventSource auto-reconnects resume (via Last-Event-ID) instead of regenerating
+    const query = `message=${encodeURIComponent(content)}&idempotency_key=${crypto.randomUUID()}`;
     const url =
       chatType === 'agent'
-        ? `${baseUrl}/api/v1/chat/agent/${chatId}/stream?message=${encodeURIComponent(content)}`
-        : `${baseUrl}/api/v1/chat/temp/${chatId}/stream?message=${encodeURIComponent(content)}`;
+        ? `${baseUrl}/api/v1/chat/agent/${chatId}/stream?${query}`
+        : `${baseUrl}/api/v1/chat/temp/${chatId}/stream?${query}`;
 
     const eventSource = new EventSource(url, { withCredentials: true });
 
@@ -183,6 +185,11 @@ export default function ChatInterface({ chatType, chatId }: ChatInterfaceProps)
     };
 
     eventSource.onerror = (error) => {
+      if (eventSource.readyState === EventSource.CONNECTING) {
+        // Browser is reconnecting; the server resumes from the last received event
+        console.warn('EventSource reconnecting...');
+        return;
+      }
       console.error('EventSource error:', error);
       console.error('EventSource readyState:', eventSource.readyState);
       setError('Connection error. Please try again.');
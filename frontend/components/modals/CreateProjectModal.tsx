@@ -219,6 +219,22 @@ export default function CreateProjectModal({ isOpen, onClose, onSubmit }: Create
                     </p>
                   </div>
                 </label>
+                <label className="flex items-start gap-3 cursor-pointer p-3 rounded-lg border border-border hover:bg-muted/50 transition-colors">
+                  <input
+                    type="radio"
+                    name="contextSource"
+                    value="hybrid"
+                    checked={contextSource === 'hybrid'}
+                    onChange={() => setContextSource('hybrid')}
+                    className="mt-0.5 w-4 h-4 text-primary focus:ring-2 focus:ring-ring"
+                  />
+                  <div>
+                    <span className="font-medium">Hybrid (Keyword + Semantic)</span>
+                    <p className="text-xs text-muted-foreground mt-1">
+                      Combines keyword and semantic search; finds exact terms like error codes and keeps working if semantic search is unavailable
+                    </p>
+                  </div>
+                </label>
               </div>
             </div>
           )}
@@ -1,7 +1,7 @@
 import { create } from 'zustand';
 import api from '@/lib/api';
 
-export type ContextSource = 'recent' | 'rag';
+export type ContextSource = 'recent' | 'rag' | 'hybrid';
 
 export interface Project {
   id: string;